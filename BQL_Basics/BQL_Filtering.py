@@ -73,3 +73,48 @@ response = bq.execute(request)
 
 # Display the response in a DataFrame
 response[0].df()
+
+
+
+#Example C: Screening Locally
+# Import the BQL library
+import bql
+
+# Make the shared bql_toolkit package in the project root importable from this notebook
+import os
+import sys
+sys.path.append(os.path.abspath('..'))
+
+# Import the local screening engine from the project's bql_toolkit
+from bql_toolkit.screening import ScreeningEngine
+
+# Instantiate an object to interface with the BQL service
+bq = bql.Service()
+
+# Define the screening engine for the starting universe. The fields used by
+# the criteria are fetched once; the criteria are then evaluated locally.
+# The engine reads the criteria from their BQL text, and raises a TypeError
+# for criteria whose text it cannot parse, before any request is sent
+screen = ScreeningEngine(bq, bql.Request, bq.univ.members('MXWO Index'))
+
+# Define the criteria of Example A
+sector = bq.data.gics_sector_name()
+pe_ratio = bq.data.pe_ratio()
+criteria_3 = pe_ratio < pe_ratio.groupavg(sector)
+criteria_list = bq.func.and_(bq.data.cur_mkt_cap(currency='USD') >= 50*10**9,
+                             bq.data.cur_mkt_cap(currency='USD') <= 60*10**9).and_(criteria_3)
+
+# Screen the universe; this first screen requests the market cap, P/E ratio and sector
+filtered_univ = screen.screen(criteria_list)
+
+# Try a wider market cap range; the fields are already held locally, so no request is sent
+criteria_list = bq.func.and_(bq.data.cur_mkt_cap(currency='USD') >= 40*10**9,
+                             bq.data.cur_mkt_cap(currency='USD') <= 70*10**9).and_(criteria_3)
+filtered_univ = screen.screen(criteria_list)
+
+# Use the filtered list of securities as the universe of a follow-up request
+request = bql.Request(filtered_univ, bq.data.cur_mkt_cap(currency='USD'))
+response = bq.execute(request)
+
+# Display the response in a DataFrame
+response[0].df()
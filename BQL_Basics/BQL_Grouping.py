@@ -111,3 +111,42 @@ response = bq.execute(request)
 
 # Display the response in a DataFrame
 response[0].df()
+
+
+
+#Example D: Grouping Locally
+# Import the BQL library
+import bql
+
+# Make the shared bql_toolkit package in the project root importable from this notebook
+import os
+import sys
+sys.path.append(os.path.abspath('..'))
+
+# Import the local grouping engine from the project's bql_toolkit
+from bql_toolkit.grouping import GroupingEngine
+
+# Instantiate an object to interface with the BQL service
+bq = bql.Service()
+
+# Define a variable for the security universe
+univ = bq.univ.members('BE500 Index')
+
+# Fetch the market cap and both grouping fields for every member once.
+# Each grouping below is computed locally, without a new request
+engine = GroupingEngine(bq, bql.Request, univ,
+                        values={'Market Cap': bq.data.cur_mkt_cap(currency='EUR')},
+                        keys={'Sector': bq.data.gics_sector_name(),
+                              'Country': bq.data.country_full_name()})
+
+# Sum the market cap by sector, as in group(grouping_item).sum()
+engine.aggregate('Market Cap', by='Sector', how='sum')
+
+
+# Regroup by sector and country, as in Example C, and lay the result out as a table
+engine.pivot('Market Cap', rows='Sector', columns='Country', how='sum')
+
+
+# Return the sector average for every member, as in groupavg(grouping_item) in Example B,
+# and the difference between each member and its sector average
+engine.broadcast('Market Cap', by='Sector', how='avg'), engine.relative('Market Cap', by='Sector')
@@ -118,3 +118,50 @@ response = bq.execute(request)
 # the three returned values in a single DataFrame
 # To verify the output, use tail(3) to show the last three rows of the response
 bql.combined_df(response).tail(3)
+
+
+
+#Example E: Parsing Requests Generated from a Template
+#=============================================================================
+import bql
+
+# Make the shared bql_toolkit package in the project root importable from this notebook
+import os
+import sys
+sys.path.append(os.path.abspath('..'))
+
+# Import the string parser and the request batcher from the project's bql_toolkit
+from bql_toolkit.string_interface import QueryParser
+from bql_toolkit.batching import BatchingExecutor
+
+# Instantiate an object to interface with the BQL service
+bq = bql.Service()
+
+# Define the parser. Requests that differ only in their strings, numbers and dates
+# share one parsed plan, so the template below is parsed once
+parser = QueryParser(bq, bql.Request)
+
+# Define the request template; {start} and {end} are filled in for each week. Every
+# request is for the same securities, so their data items can be sent together
+template = """
+let(
+    #date_range = RANGE({start}, {end});
+    )
+get(
+    PX_LAST(dates=#date_range),
+    PX_HIGH(dates=#date_range) - PX_LOW(dates=#date_range)
+    )
+for(
+    ['AAPL US Equity', 'AMZN US Equity', 'TSLA US Equity']
+    )
+"""
+
+# Parse the requests into object model universes and data items. They share one
+# universe, so the batcher merges them into a single request and splits the response
+# back to each week
+executor = BatchingExecutor(bq, bql.Request)
+weeks = [('2017-06-05', '2017-06-09'), ('2017-06-12', '2017-06-16'), ('2017-06-19', '2017-06-23')]
+responses = executor.execute_many([parser.parts(template, start=start, end=end) for start, end in weeks])
+
+# Display the last prices of the first week in a DataFrame
+responses[0][0].df()
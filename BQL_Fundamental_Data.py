@@ -93,12 +93,17 @@ PERIOD_END_DATE: The date associated with the accounting period for a given valu
 '''
 
 #Example: Point-In-Time Historical Revenue
-# Import the BQL library
+# Import the BQL library and the on-disk response store from the project's bql_toolkit
 import bql
+from bql_toolkit.response_store import ResponseStore
 
 # Instantiate an object to interface with the BQL service
 bq = bql.Service()
 
+# Instantiate a store that keeps responses with fixed dates on disk, so that
+# point-in-time data is only requested once, even across kernel restarts
+store = ResponseStore(bq, bql.Request)
+
 # Define a variable for the query security
 security = 'IBM US Equity'
 
@@ -107,10 +112,10 @@ sales = bq.data.sales_rev_turn(fa_period_reference='2014',
                                fa_period_type='A',
                                as_of_date='2016-06-30') / 1000000000
 
-# Generate the BQL request using security variable and data item
-request = bql.Request(security, {"Sales in Billions" : sales})
-# Execute the request
-response = bq.execute(request)
+# Execute the request for the security variable and data item through the store.
+# The store reads the as_of_date from the BQL text of the data item; it is in the past,
+# so the response is read from disk after the first run
+response = store.execute(security, {"Sales in Billions" : sales})
 # Convert the response to a DataFrame
 response[0].df()
 
@@ -279,3 +284,45 @@ request = bql.Request(security, currency_fields)
 response = bq.execute(request)
 # Convert the response to a DataFrame
 bql.combined_df(response)
+
+
+
+#*************Running Independent Requests Concurrently*************
+
+# Import the BQL library and the concurrent executor from the project's bql_toolkit
+import bql
+from bql_toolkit.concurrency import AsyncExecutor
+
+# Instantiate an object to interface with the BQL service
+bq = bql.Service()
+
+# Define a variable for the query security
+security = 'IBM US Equity'
+
+# Define the point-in-time revenue, the forward sales estimates
+# and the calendar-year sales used in the examples above
+point_in_time_sales = bq.data.sales_rev_turn(fa_period_reference='2014',
+                                             fa_period_type='A',
+                                             as_of_date='2016-06-30') / 1000000000
+estimated_sales = bq.data.sales_rev_turn(fa_period_reference='2015-12-31',
+                                         fa_period_type='A',
+                                         fill='prev',
+                                         as_of_date=bq.func.range('2014-01-01','2015-12-31')) / 1000000000
+calendar_year_sales = bq.data.sales_rev_turn(fa_period_year_end='C',
+                                             fa_period_type='A',
+                                             fa_period_reference=bq.func.range('2014', '2015')) / 1000000000
+
+# Generate one BQL request for each of the independent queries
+requests = [bql.Request(security, {"Sales in Billions" : point_in_time_sales}),
+            bql.Request(security, {"Sales in Billions" : estimated_sales}),
+            bql.Request(security, {"Sales Calendar in Billions" : calendar_year_sales})]
+
+# Execute the requests concurrently, with at most 4 requests in flight at once.
+# The responses are returned in the same order as the requests.
+# In an async notebook cell you can also use: responses = await executor.gather(requests)
+executor = AsyncExecutor(bq, max_concurrency=4)
+responses = executor.execute_all(requests)
+
+# Convert each response to a DataFrame
+point_in_time_df, estimates_df, calendar_df = [response[0].df() for response in responses]
+point_in_time_df
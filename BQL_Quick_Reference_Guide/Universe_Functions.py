@@ -92,3 +92,41 @@ response = bq.execute(request)
 
 # Display the response in a DataFrame
 response[0].df()
+
+
+
+#Object Model Example (Cached Index Members)
+
+# Import the BQL library
+import bql
+
+# Make the shared bql_toolkit package in the project root importable from this notebook
+import os
+import sys
+sys.path.append(os.path.abspath('..'))
+
+# Import the membership cache from the project's bql_toolkit
+from bql_toolkit.membership import MembershipCache
+
+# Instantiate an object to interface with the BQL service
+bq = bql.Service()
+
+# Define the membership cache. Constituent lists are kept in memory and on disk,
+# so later requests and later sessions reuse them instead of expanding the index again
+memberships = MembershipCache(bq, bql.Request)
+
+# Resolve the current members of the INDU Index, and the members as of the end of 2015.
+# The as-of date is applied to the BQL text of members(); a list dated in the past never
+# changes, so it does not expire and is never requested again. The current list is
+# requested again once it is older than a day
+univ = memberships.securities(bq.univ.members('INDU Index'))
+univ_2015 = memberships.securities(bq.univ.members('INDU Index'), as_of='2015-12-31')
+
+# Define the request on the known list of securities
+request = bql.Request(univ, bq.data.px_last())
+
+# Execute the request
+response = bq.execute(request)
+
+# Display the response in a DataFrame
+response[0].df()
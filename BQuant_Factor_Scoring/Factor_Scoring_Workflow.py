@@ -21,7 +21,31 @@ import bql
 import pandas as pd
 import numpy as np
 from functools import partial
-from collections import OrderedDict
+
+# Make the shared bql_toolkit package in the project root importable from this notebook
+import os
+import sys
+sys.path.append(os.path.abspath('..'))
+
+# Import the local scoring engine, which fetches a model's factors and computes their zscore,
+# winsorize, composite score and percent rank in a single vectorized pass
+from bql_toolkit.batch_scoring import score_model
+
+# Import the factor cache, which fetches each raw factor once and shares it across models
+from bql_toolkit.factor_cache import FactorCache
+
+# Import the paged grid data source, which sends only the visible rows to the DataGrid
+from bql_toolkit.grid import PagedGridSource
+
+# Import the scatter helpers, which calculate axis bounds and downsample large universes
+from bql_toolkit.plotting import axis_bounds, downsample_points
+
+# Import the refresh controller, which debounces clicks and scores on a background worker
+from bql_toolkit.refresh import RefreshController
+
+# Import the stage timer. To profile the workflow, call timer.enable() before generating
+# scores and timer.summary() afterwards to see the wall time, rows and bytes of each stage
+from bql_toolkit.timing import size_of, timer
 
 # Import bqplot, bwidgets, and ipywidgets, which are used for visualizing results
 from bqplot import Axis, LinearScale, OrdinalScale, Scatter, Figure, Tooltip
@@ -32,6 +56,10 @@ from IPython.display import display
 # Instantiate an object to interface with the BQL service
 bq = bql.Service()
 
+# Instantiate a cache for the raw factor data, so that factors shared by several models
+# are only requested once. Cached factors expire after 15 minutes.
+factor_cache = FactorCache(bq, bql.Request, ttl=15 * 60)
+
 
 '''
 1.2 Defining Factors
@@ -40,24 +68,13 @@ The factors are defined in dictionaries in the cell below, and each factor has 2
 
 Expression: The BQL data item or custom expression for the factor
 Weight: The weight of the factor in the composite score
-In addition, we will define analytical functions to control outliers or transform data into a standardized analytic, like a zscore.
+In addition, we will apply analytical functions to control outliers or transform data into a standardized analytic, like a zscore.
+The zscore and winsorize are calculated locally by the scoring engine, so only the raw factor expressions are sent to BQL.
 '''
 
-# Define analytical functions to control the BQL data that is downloaded
-
-# analytics: zscore
-def zscore(factor):
-    grouped_factor = bq.func.group(factor)
-    avg = bq.func.ungroup(bq.func.avg(bq.func.dropna(grouped_factor)),ungroupOrder='current')
-    std = bq.func.ungroup(bq.func.std(bq.func.dropna(grouped_factor)),ungroupOrder='current')
-    return (factor - avg) / std
-
-# analytics: winsorize
-def winsorize(factor, limit):
-    lower_bound = -1 * limit
-    upper_bound = limit
-    return bq.func.if_(factor >= upper_bound, upper_bound, 
-                bq.func.if_(factor <= lower_bound, lower_bound, factor))
+# Define the limit used to winsorize each factor after the scoring engine
+# has calculated its zscore across the universe
+winsorize_limit = 3
 
 # Define parameters for the factors
 params ={'dates':'-1Y','fill':'PREV','Currency':'USD'}
@@ -66,37 +83,37 @@ params ={'dates':'-1Y','fill':'PREV','Currency':'USD'}
 factor_model = {
     "Value Model": {
         "FCF Yield": {
-                "expression":winsorize(zscore(bq.data.cf_free_cash_flow()/bq.data.px_last()),3), 
+                "expression":bq.data.cf_free_cash_flow()/bq.data.px_last(), 
                 "weights": 0.2
             },
          "Earnings Yield": {
-                "expression":winsorize(zscore(bq.data.is_eps()/bq.data.px_last()),3), 
+                "expression":bq.data.is_eps()/bq.data.px_last(), 
                 "weights": 0.3
             },
          "Leverage": {
-                "expression":winsorize(zscore(1/bq.data.tot_debt_to_ebitda()),3), 
+                "expression":1/bq.data.tot_debt_to_ebitda(), 
                 "weights": 0.3
             },
          "Profitability": {
-                "expression":winsorize(zscore(bq.data.net_income()/bq.data.sales_rev_turn()),3),  
+                "expression":bq.data.net_income()/bq.data.sales_rev_turn(),  
                 "weights": 0.2
             }
     },
     "Growth Model": {
         "EBITDA Growth": {
-                "expression":winsorize(zscore(bq.data.ebitda_growth()),3), 
+                "expression":bq.data.ebitda_growth(), 
                 "weights": 0.2
             },
          "Sales Growth": {
-                "expression":winsorize(zscore(bq.data.sales_growth()),3), 
+                "expression":bq.data.sales_growth(), 
                 "weights": 0.3
             },
          "Leverage": {
-                "expression":winsorize(zscore(1/bq.data.tot_debt_to_ebitda()),3), 
+                "expression":1/bq.data.tot_debt_to_ebitda(), 
                 "weights": 0.3
             },
          "Profitability": {
-                "expression":winsorize(zscore(bq.data.net_income()/bq.data.sales_rev_turn()),3), 
+                "expression":bq.data.net_income()/bq.data.sales_rev_turn(), 
                 "weights": 0.2
             }
     }
@@ -134,37 +151,38 @@ create a create an interactive table of the companies.
 '''
 
 # Define a function to extract data for the scoring model using the Factors create above
-# This function contains the business logic to calculate an aggregate score for the factors
+# This function contains the business logic to calculate an aggregate score for the factors.
+# The scores keep the standardized factors, so that new weights can be applied without a new request
+def get_scores(analysis_universe, factors, parameters):
+    # Fetch the raw factors, requesting only the factors that are not already cached, then
+    # calculate the standardized factors, aggregate score and percent rank in one pass
+    return score_model(factor_cache, universe.get(analysis_universe), factor_model[factors], parameters,
+                       winsorize_limit)
+
+# Define a function to return the scores as a DataFrame with the factors, 'Factor Score' and '% Rank'
 def get_data(analysis_universe, factors, parameters):
-    factor_dict = OrderedDict()
-    weights_df = pd.DataFrame()
-    for x,y in factor_model[factors].items():
-        factor_dict[x] = y['expression']
-        weights_df = weights_df.append(pd.DataFrame({'name':[x],'weights':[y['weights']]}))
-     # Create the request
-    weights_df = weights_df.set_index('name')
-    request = bql.Request(universe.get(analysis_universe), factor_dict, with_params=parameters)
-    # Execute the request object.
-    response = bq.execute(request)
-    # Return a combined DataFrame.
-    response_df_concat = pd.concat([item.df() for item in response],axis=1)
-    # Calculate aggregate score and then create a percent rank
-    output_df = response_df_concat[list(factor_dict)].fillna(value=0)
-    output_df['Factor Score'] = output_df.dot(weights_df)
-    output_df['% Rank'] = output_df['Factor Score'].rank(pct=True).fillna(value=0)
-
-    return output_df
+    return get_scores(analysis_universe, factors, parameters).to_frame()
     
     
 #2.2 Visualization Class    
 
 # Define a class to control the visualization and user interface
 class FactorVisualization:
-    def __init__(self):
+    def __init__(self, point_budget=2000, animation_points=500):
         # Initialize the chart with a default ticker
         self.data_chart = pd.DataFrame()
+        # Above point_budget points the scatter is downsampled, and above
+        # animation_points points the chart is redrawn without animation
+        self.point_budget = point_budget
+        self.animation_points = animation_points
+        self.plotted_names = np.array([])
         self.chart_dropdown_x = Dropdown(description='X-Axis',layout=Layout(width='380px'))
         self.chart_dropdown_y = Dropdown(description='Y-Axis',layout=Layout(width='380px'))
+        # Observe the axis dropdowns once; on_change ignores the changes made while
+        # populate_default_chart is updating the dropdowns
+        self.updating = False
+        self.chart_dropdown_x.observe(self.on_change, names='value')
+        self.chart_dropdown_y.observe(self.on_change, names='value')
         
         self.x_sc = LinearScale()
         self.y_sc = LinearScale()  
@@ -174,11 +192,14 @@ class FactorVisualization:
 
         self.ax_x = Axis(scale=self.x_sc)
         self.ax_y = Axis(scale=self.y_sc, orientation='vertical', tick_format='0.2f')        
-        self.fig = Figure(marks=[], axes=[self.ax_x, self.ax_y],
+        # The scatter mark is added once and its data is updated in place
+        self.fig = Figure(marks=[self.scatter], axes=[self.ax_x, self.ax_y],
                           animation_duration=1000,
                           padding_x=0,layout = {'width':"100%",'height':"500px"})
         
-        self.data_grid = DataGrid(layout = {'width':"720px",'height':"200px"})
+        # Create the grid once; new results update it in place, one page of rows at a time
+        self.data_grid = DataGrid(layout = Layout(width = '700px', height = '200px', margin = '25px 0px 0px 50px'))
+        self.grid_source = PagedGridSource(self.data_grid, page_size=100)
         
         self.box = VBox([HBox([self.fig]),
                          HBox([self.chart_dropdown_x,self.chart_dropdown_y])
@@ -188,43 +209,61 @@ class FactorVisualization:
     
     # Define a method to update scatter chart
     def plot_scatter(self, x_data, y_data, label_data,x_name,y_name):
-        distance_x = max(x_data) - min (x_data)
-        distance_y = max(y_data) - min (y_data)
-        self.x_sc.min = min (x_data) - (distance_x)/10
-        self.x_sc.max = max(x_data) + (distance_x)/10
-        self.y_sc.min = min (y_data) - (distance_y)/10
-        self.y_sc.max = max(y_data) + (distance_y)/10
         self.x_data = x_data
         self.y_data = y_data
         self.label_data = label_data
+        # Keep the selected companies in the chart when it is redrawn
+        selected = np.asarray(self.scatter.selected if self.scatter.selected is not None else [], dtype=int)
+        selected_names = self.plotted_names[selected]
+        keep = np.flatnonzero(np.isin(np.asarray(label_data), selected_names))
+        # Downsample large universes, keeping the outliers and the selected companies
+        points = downsample_points(x_data, y_data, self.point_budget, keep=keep)
+        names = np.asarray(label_data)[points]
+        self.fig.animation_duration = 1000 if len(points) <= self.animation_points else 0
+        self.x_sc.min, self.x_sc.max = axis_bounds(x_data)
+        self.y_sc.min, self.y_sc.max = axis_bounds(y_data)
         self.tt.labels=['Company',x_name,y_name]
-        self.scatter.x = x_data
-        self.scatter.y = y_data
-        self.scatter.names = label_data
+        # Send the new points to the existing scatter mark in one update
+        with self.scatter.hold_sync():
+            self.scatter.x = np.asarray(x_data)[points]
+            self.scatter.y = np.asarray(y_data)[points]
+            self.scatter.names = names
+            self.scatter.selected = np.flatnonzero(np.isin(names, selected_names)).tolist() or None
+        self.plotted_names = names
         self.fig.title = "Scatter Chart: " + x_name + "  v " + y_name
         self.ax_x.label = x_name
         self.ax_y.label = y_name
-        self.fig.marks = [self.scatter]
     
     # Define a method to control default chart state
     def populate_default_chart(self,df):
         self.data_chart = df
         options_list = list(df.columns)
         options_list.append(' ')
-        self.chart_dropdown_x.options = options_list
-        self.chart_dropdown_y.options = options_list
-        self.chart_dropdown_x.value =  options_list[0] 
-        self.chart_dropdown_y.value =  options_list[1]
+        self.updating = True
+        try:
+            self.chart_dropdown_x.options = options_list
+            self.chart_dropdown_y.options = options_list
+            self.chart_dropdown_x.value =  options_list[0] 
+            self.chart_dropdown_y.value =  options_list[1]
+        finally:
+            self.updating = False
         x_data = df[df.columns[0]].values
         y_data = df[df.columns[1]].values
         label_data = df[df.columns[0]].index
         self.plot_scatter(x_data,y_data,label_data,list(df.columns)[0],list(df.columns)[1])
-        self.chart_dropdown_x.observe(self.on_change)
-        self.chart_dropdown_y.observe(self.on_change)
+
+    # Define a method to show new scores in the chart and the grid
+    def show_scores(self, scores):
+        self.scores = scores
+        factor_score = scores.to_frame()
+        with timer.stage('render chart', rows=len(factor_score)):
+            self.populate_default_chart(factor_score)
+        with timer.stage('render grid', rows=len(factor_score), nbytes=size_of(factor_score)):
+            self.grid_source.set_data(factor_score)
     
     # Define a handler for axis changes on chart
     def on_change(self,change):
-        if change['type'] == 'change' and change['name'] == 'value':
+        if change['type'] == 'change' and change['name'] == 'value' and not self.updating:
             if self.chart_dropdown_x.value == ' ' or self.chart_dropdown_y.value == ' ':
                 pass
             else:
@@ -233,18 +272,16 @@ class FactorVisualization:
                 label_data = self.data_chart[self.data_chart.columns[0]].index
                 self.plot_scatter(x_data,y_data,label_data,self.chart_dropdown_x.value,self.chart_dropdown_y.value)
 
-# Define a handler for when the 'Generate Scores' button is clicked
-def handle_click(sender,vs): 
-    vs.chart_dropdown_x.value =  ' '
-    vs.chart_dropdown_y.value =  ' '
-    factor_score = get_data(dropdown_universe.value,dropdown_model.value,params)
-    vs.populate_default_chart(factor_score)
-    vs.data_grid.close()
-    factor_score_for_grid = factor_score.reset_index()
-    factor_score_for_grid.columns = [x.replace('.','_') for x in list(factor_score_for_grid.columns.values)]
-    vs.data_grid = DataGrid(data=factor_score_for_grid.round(2))
-    vs.data_grid.layout = Layout(width = '700px', height = '200px', margin = '25px 0px 0px 50px')
-    display(vs.data_grid)
+# Define a handler for when the 'Generate Scores' button is clicked.
+# The scores are calculated on a background worker; when the button is clicked again
+# before they are ready, only the scores for the latest click are shown
+def handle_click(sender,refresh): 
+    refresh.request(dropdown_universe.value,dropdown_model.value)
+
+# Define a function to apply new factor weights, e.g. from a slider, to the current scores.
+# Only the 'Factor Score' and '% Rank' are recalculated, without a new BQL request
+def handle_weights(weights, vs):
+    vs.show_scores(vs.scores.reweight(weights))
     
 
 
@@ -258,16 +295,35 @@ display(interface)
 
 # Initialize visualization class and populate the chart
 vs =  FactorVisualization()
-factor_score = get_data(dropdown_universe.value, dropdown_model.value, params)
-vs.populate_default_chart(factor_score)
-vs.data_grid.close()
-
-# Set up and populate the datagrid layout
-factor_score_for_grid = factor_score.reset_index()
-factor_score_for_grid.columns = [x.replace('.','_') for x in list(factor_score_for_grid.columns.values)]
-vs.data_grid = DataGrid(data=factor_score_for_grid.round(2))
-vs.data_grid.layout = Layout(width = '705px', height = '200px', margin = '25px 0px 0px 50px')
-display(vs.data_grid)
-
-button_update.on_click(partial(handle_click,vs=vs))
+vs.show_scores(get_scores(dropdown_universe.value, dropdown_model.value, params))
+
+# Display the datagrid, with the controls to page through the rows
+display(vs.grid_source.box)
+
+# Define a function to show on the button whether scores are being calculated
+def show_busy(busy):
+    button_update.description = "Generating..." if busy else "Generate Scores"
+
+# Set up the refresh controller, which waits 0.3 seconds for further clicks
+# and then fetches and scores the data on a background worker
+refresh = RefreshController(work=lambda analysis_universe, factors: get_scores(analysis_universe, factors, params),
+                            apply=vs.show_scores, delay=0.3, on_busy=show_busy)
+
+button_update.on_click(partial(handle_click,refresh=refresh))
+
+# To change the weights of the current model without requesting the data again, call e.g. the
+# line below with a weight for every factor of the model; other factor names raise a KeyError
+# handle_weights({'FCF Yield': 0.4, 'Earnings Yield': 0.2, 'Leverage': 0.2, 'Profitability': 0.2}, vs)
     
+
+
+#2.4 Scoring Every Model and Universe
+# For a nightly run, every model in factor_model can be scored against every universe in one pass.
+# The raw factors of all models are fetched once per universe, and all of the model scores are
+# calculated together. The result has one row per universe, model and security
+'''
+from bql_toolkit.batch_scoring import score_all
+
+all_scores = score_all(factor_cache, universe, factor_model, params, winsorize_limit)
+all_scores.head()
+'''
@@ -2,6 +2,8 @@
 import bql
 # Import the bqviz plotting library
 import bqviz as bqv
+# Import the price panel helper from the project's bql_toolkit
+from bql_toolkit.panel import price_panel
 
 
 # Instantiate an object to interface with the BQL service
@@ -17,8 +19,9 @@ date_range = bq.func.range('2015-01-01', '2015-12-31')
 # passing the date range and frequency parameters
 price = bq.data.px_last(dates=date_range, frq="D")
 
-# Generate the request using the security universe and data item
-request = bql.Request(universe, price)
+# Generate the request using the security universe and data item,
+# naming the data item so the response has a stable column name
+request = bql.Request(universe, {"Last Price": price})
 
 # Execute the request
 response = bq.execute(request)
@@ -29,33 +32,15 @@ dataframe = response[0].df()
 dataframe.head(5)
 
 
-# Pass a dictionary to the rename() function
-# to modify the default column names
-dataframe.rename(
-    columns={"DATE": "Date", 
-    "CURRENCY": "Currency", 
-    'PX_LAST(frq=PER.D,dates=RANGE(2015-01-01,2015-12-31))': "Last Price"}, 
-    inplace=True)
-
-# Display the first five rows of the DataFrame to check the results
-dataframe.head(5)
-
-
-# Reset the DataFrame index
-reset_index_dataframe = dataframe.reset_index()
-# Reindex the DataFrame
-reindexed_datafame = reset_index_dataframe.pivot('Date', 'ID', 'Last Price')
-# Drop N/A values from the DataFrame
-cleaned_dataframe = reindexed_datafame.dropna()
-# Display the first five rows of the DataFrame to check the results
+# Build a Date x Security panel directly from the response item.
+# The values are written straight into a float64 matrix, so no
+# rename(), reset_index(), pivot() or dropna() copies are needed
+panel = price_panel(response[0], dropna=True)
+# Convert the panel to a DataFrame and
+# display the first five rows to check the results
+cleaned_dataframe = panel.frame()
 cleaned_dataframe.head(5)
 
 
-# Reset the DataFrame index
-reset_index_dataframe = dataframe.reset_index()
-# Reindex the DataFrame
-reindexed_datafame = reset_index_dataframe.pivot('Date', 'ID', 'Last Price')
-# Drop N/A values from the DataFrame
-cleaned_dataframe = reindexed_datafame.dropna()
-# Display the first five rows of the DataFrame to check the results
-cleaned_dataframe.head(5)
+# The matrix and its index arrays can also be used directly with NumPy
+panel.values, panel.dates, panel.ids
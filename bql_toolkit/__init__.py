@@ -0,0 +1,5 @@
+'''
+BQL Toolkit
+Shared helpers used by the BQuant examples in this project to fetch, cache 
+and score Bloomberg Query Language (BQL) data with as few round trips as possible.
+'''
@@ -0,0 +1,85 @@
+'''
+Batch Scoring
+Scores the models of a factor model dictionary, in which every factor has an
+'expression' and a 'weights' entry. score_model scores one model against one
+universe and keeps the standardized factors, so the weights can be changed later.
+score_all scores every model against every universe in one pass: for each universe
+the union of the raw factors of all models is fetched once, the factors are
+standardized once, and all of the model scores are calculated together as the
+product of the factor matrix and a weights matrix with one column per model.
+
+Usage:
+    scores = score_model(factor_cache, bq.univ.members('INDU Index'), factor_model['Value Model'], params)
+    scores.to_frame()
+    scores = score_all(factor_cache, universe, factor_model, params)
+    scores.to_csv('nightly_scores.csv', index=False)
+'''
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from bql_toolkit.canonical import expression_key
+from bql_toolkit.scoring import FactorScores, factor_matrix, score_models, standardize
+from bql_toolkit.timing import size_of, timer
+
+
+# Define a function to score one model against one universe: the raw factors are fetched
+# through the cache, collected into one matrix and scored in one pass
+def score_model(factor_cache, universe, model_factors, params=None, limit=3):
+    factor_dict = OrderedDict((name, factor['expression']) for name, factor in model_factors.items())
+    names = list(factor_dict)
+    weights = np.array([factor['weights'] for factor in model_factors.values()], dtype=np.float64)
+    # Fetch the raw factors, requesting only the factors that are not already cached
+    columns = factor_cache.fetch(universe, factor_dict, params)
+    # Collect the raw factors into one matrix with securities as rows and factors as columns
+    with timer.stage('concat') as stage:
+        index, values = factor_matrix(columns, names)
+        stage.rows, stage.nbytes = len(index), size_of(values)
+    # Calculate the standardized factors, aggregate score and percent rank in one pass
+    with timer.stage('score/rank', rows=len(index)):
+        return FactorScores.from_matrix(index, names, values, weights, limit)
+
+
+# Define a function to merge the factors of all models, keeping one column per distinct
+# expression, and to build the weights matrix with one row per column and one column per model
+def model_weights(factor_model):
+    factors = OrderedDict()
+    positions = {}
+    entries = []
+    for model, model_factors in factor_model.items():
+        for name, factor in model_factors.items():
+            key = expression_key(factor['expression'])
+            if key not in positions:
+                positions[key] = len(factors)
+                # Factors that share an expression but not a name are kept apart by the model name
+                label = name if name not in factors else '%s (%s)' % (name, model)
+                factors[label] = factor['expression']
+            entries.append((positions[key], model, factor['weights']))
+    models = list(factor_model)
+    weights = np.zeros((len(factors), len(models)), dtype=np.float64)
+    for position, model, weight in entries:
+        weights[position, models.index(model)] += weight
+    return factors, models, weights
+
+
+# Define a function to score every model against every universe and return a long DataFrame
+# with one row per universe, model and security
+def score_all(factor_cache, universes, factor_model, params=None, limit=3):
+    factors, models, weights = model_weights(factor_model)
+    names = list(factors)
+    frames = []
+    for universe_name, universe in universes.items():
+        # Fetch the union of the raw factors once per universe
+        columns = factor_cache.fetch(universe, factors, params)
+        index, values = factor_matrix(columns, names)
+        composite, rank = score_models(standardize(values, limit), weights)
+        frames.append(pd.DataFrame({
+            'Universe': universe_name,
+            'Model': np.repeat(models, len(index)),
+            'ID': np.tile(np.asarray(index), len(models)),
+            'Factor Score': composite.ravel(order='F'),
+            '% Rank': rank.ravel(order='F'),
+        }))
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,166 @@
+'''
+Request Batching
+Collects the requests submitted within a short window, merges the requests for the
+same universe and parameters into one multi-field request, drops duplicate data
+items and splits the response back to each caller. If a merged request fails, every
+caller's request is executed on its own, so one bad data item cannot fail the others.
+
+Usage:
+    executor = BatchingExecutor(bq, bql.Request)
+    sales = executor.submit(security, {'Sales': bq.data.sales_rev_turn()})
+    assets = executor.submit(security, {'Assets': bq.data.bs_tot_asset()})
+    sales.result()[0].df()
+'''
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from bql_toolkit.canonical import expression_key, params_key, universe_key
+
+
+# Define a function to give every data item of a request a label,
+# using the item's BQL text when the caller did not name it
+def labelled_items(items):
+    if isinstance(items, dict):
+        return OrderedDict(items)
+    if isinstance(items, (list, tuple)):
+        return OrderedDict((str(item), item) for item in items)
+    return OrderedDict([(str(items), items)])
+
+
+class BatchedItem:
+    '''One response item of a merged request, renamed back to the caller's label.'''
+
+    def __init__(self, item, name):
+        self.item = item
+        self.name = name
+
+    def df(self):
+        frame = self.item.df()
+        if self.item.name != self.name:
+            frame = frame.rename(columns={self.item.name: self.name})
+        return frame
+
+
+class _Pending:
+    def __init__(self, universe, items, with_params):
+        self.universe = universe
+        self.items = items
+        self.with_params = with_params
+        self.future = Future()
+
+
+class BatchingExecutor:
+    def __init__(self, bq, request_class, window=0.05, max_items=200):
+        # Keep the BQL service and request class used to execute the merged requests
+        self.bq = bq
+        self.request_class = request_class
+        self.window = window
+        self.max_items = max_items
+        self.pending = []
+        self.lock = threading.Lock()
+        self.timer = None
+        # Count the requests submitted and the round trips actually sent to the service
+        self.submitted = 0
+        self.round_trips = 0
+
+    # Define a method to queue a request; the returned future resolves to the response items
+    def submit(self, universe, items, with_params=None):
+        pending = _Pending(universe, labelled_items(items), dict(with_params or {}))
+        with self.lock:
+            self.pending.append(pending)
+            self.submitted += 1
+            if self.timer is None and self.window is not None:
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        return pending.future
+
+    # Define a method to execute a request right away, merged with anything already queued
+    def execute(self, universe, items, with_params=None):
+        future = self.submit(universe, items, with_params)
+        self.flush()
+        return future.result()
+
+    # Define a method to execute a list of (universe, items, with_params) requests together
+    def execute_many(self, requests):
+        futures = [self.submit(*request) for request in requests]
+        self.flush()
+        return [future.result() for future in futures]
+
+    # Define a method to send every queued request, one merged request per universe and parameters
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        groups = OrderedDict()
+        for request in pending:
+            key = (universe_key(request.universe), params_key(request.with_params))
+            groups.setdefault(key, []).append(request)
+        for group in groups.values():
+            for chunk in self._chunks(group):
+                self._execute_group(chunk)
+
+    # Define a method to split a group of requests into chunks whose merged requests
+    # hold at most max_items distinct data items; a larger request is sent on its own
+    def _chunks(self, group):
+        chunk, keys = [], set()
+        for pending in group:
+            pending_keys = set(expression_key(item) for item in pending.items.values())
+            if chunk and len(keys | pending_keys) > self.max_items:
+                yield chunk
+                chunk, keys = [], set()
+            chunk.append(pending)
+            keys |= pending_keys
+        if chunk:
+            yield chunk
+
+    # Define a method to count a round trip; flush can run on the timer thread and the
+    # caller's thread at the same time
+    def _count_round_trip(self):
+        with self.lock:
+            self.round_trips += 1
+
+    def _request(self, universe, items, with_params):
+        if with_params:
+            return self.request_class(universe, items, with_params=with_params)
+        return self.request_class(universe, items)
+
+    def _execute_single(self, pending):
+        try:
+            self._count_round_trip()
+            response = self.bq.execute(self._request(pending.universe, pending.items, pending.with_params))
+            pending.future.set_result(list(response))
+        except Exception as error:
+            pending.future.set_exception(error)
+
+    def _execute_group(self, group):
+        if len(group) == 1:
+            self._execute_single(group[0])
+            return
+
+        # Merge the data items of the group, keeping one copy of each distinct expression
+        merged = OrderedDict()
+        labels = {}
+        for pending in group:
+            for item in pending.items.values():
+                key = expression_key(item)
+                if key not in labels:
+                    labels[key] = 'item_%d' % len(labels)
+                    merged[labels[key]] = item
+
+        try:
+            self._count_round_trip()
+            response = self.bq.execute(self._request(group[0].universe, merged, group[0].with_params))
+            by_label = dict((item.name, item) for item in response)
+            for pending in group:
+                pending.future.set_result([BatchedItem(by_label[labels[expression_key(item)]], name)
+                                           for name, item in pending.items.items()])
+        except Exception:
+            # Fall back to executing each request on its own
+            for pending in group:
+                if not pending.future.done():
+                    self._execute_single(pending)
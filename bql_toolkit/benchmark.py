@@ -0,0 +1,284 @@
+'''
+Workflow Benchmarks
+Runs the tutorial workflows end to end against the offline simulator in
+bql_toolkit.fake_bql, at several universe sizes and history lengths, and reports
+the wall time, throughput and peak memory of each run. Results can be saved as a
+baseline and later runs compared against it, so that regressions show up.
+
+The simulator has no latency by default, so the timings measure the client side:
+building requests, converting responses, and the pandas and NumPy work that follows.
+
+The workflows run the cells of the tutorial scripts themselves, read from the scripts
+with ast (see run_cell), with the bql package replaced by the simulator and the
+universe, or the date range, set by the benchmark:
+- factor_scoring: get_data() for every model and universe of
+  BQuant_Factor_Scoring/Factor_Scoring_Workflow.py, with its factor model and parameters
+- grouped_leverage: the Grouped Analysis cell of BQL_Fundamental_Data.py
+- calendarization: the Quarterly Sales and Reconciliation cells of BQL_Fundamental_Data.py,
+  for every member of the benchmark index
+- price_panel: the price panel cells of BQuant_Intro_and_Quick_Example.py
+- price_pivot: the same panel built with rename(), reset_index() and pivot(), as the
+  script did before price_panel(), kept as the reference for price_panel
+- universe_filter: Example A of BQL_Basics/BQL_Filtering.py
+
+A baseline for the default sizes is kept in benchmark_baseline.json next to this module;
+it was recorded on one machine, so it is only a rough guide for runs on other machines.
+
+Usage:
+    python -m bql_toolkit.benchmark --compare                  # against the saved baseline
+    python -m bql_toolkit.benchmark --sizes 30 500 --save baseline.json
+    python -m bql_toolkit.benchmark --sizes 30 500 --compare baseline.json
+'''
+
+import argparse
+import ast
+import datetime
+import functools
+import gc
+import json
+import os
+import platform
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.batch_scoring import score_model
+from bql_toolkit.factor_cache import FactorCache
+from bql_toolkit.panel import price_panel
+
+# Define the name of the synthetic index whose size is set by each benchmark, and the
+# indices used by the tutorial scripts, which are given the same size
+BENCHMARK_INDEX = 'BENCH Index'
+SCRIPT_INDICES = ('INDU Index', 'SPX Index', 'MXWO Index')
+SIZES = (30, 500, 3000, 10000)
+YEARS = (1, 5)
+
+# Define the project root, where the tutorial scripts are, and the modules the simulator replaces
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+SIMULATED_MODULES = ('bql', 'bqplot', 'bqviz', 'bqwidgets', 'ipywidgets', 'IPython')
+
+
+# Define a function to create a simulator whose indices have `size` members
+def make_service(size, **kwargs):
+    return bql.Service(index_sizes=dict((index, size) for index in (BENCHMARK_INDEX,) + SCRIPT_INDICES), **kwargs)
+
+
+def _simulated(statement):
+    if isinstance(statement, ast.Import):
+        modules = [alias.name for alias in statement.names]
+    elif isinstance(statement, ast.ImportFrom):
+        modules = [statement.module or '']
+    else:
+        return False
+    return any(module.split('.')[0] in SIMULATED_MODULES for module in modules)
+
+
+# Define a function to compile one cell of a tutorial script: the lines from the line that
+# starts with `start` up to the line that starts with `stop`. Imports of the modules the
+# simulator replaces are left out, as are the assignments to bq and to the names in
+# `overrides`, so that a benchmark can set the universe or the dates of the cell
+@functools.lru_cache(maxsize=None)
+def script_cell(path, start, stop=None, overrides=()):
+    with open(os.path.join(ROOT, path)) as source:
+        lines = source.read().splitlines()
+    first = next(number for number, line in enumerate(lines) if line.startswith(start))
+    last = next((number for number in range(first + 1, len(lines)) if stop and lines[number].startswith(stop)),
+                len(lines))
+    skipped = set(overrides) | {'bq'}
+    tree = ast.parse('\n'.join(lines[first:last]))
+    # Keep the line numbers of the script in tracebacks
+    ast.increment_lineno(tree, first)
+    body = [statement for statement in tree.body
+            if not _simulated(statement) and not (
+                isinstance(statement, ast.Assign) and
+                all(isinstance(target, ast.Name) and target.id in skipped for target in statement.targets))]
+    return compile(ast.Module(body=body, type_ignores=[]), path, 'exec')
+
+
+# Define a function to run a cell of a tutorial script against the simulator and return its
+# variables; passing the variables of an earlier cell as namespace continues from that cell
+def run_cell(bq, path, start, stop=None, namespace=None, **overrides):
+    namespace = namespace if namespace is not None else {'bql': bql, 'bq': bq}
+    namespace.update(overrides)
+    exec(script_cell(path, start, stop, tuple(sorted(overrides))), namespace)
+    return namespace
+
+
+# Each benchmark takes (bq, years) and returns the number of response rows it processed
+
+def factor_scoring(bq, years):
+    # Score every model of the workflow against every universe, through the workflow's get_data();
+    # a new cache per run, so that every run requests the factors
+    cell = run_cell(bq, 'BQuant_Factor_Scoring/Factor_Scoring_Workflow.py', '# Define the limit used to winsorize',
+                    '#2.2 Visualization Class', factor_cache=FactorCache(bq, bql.Request), score_model=score_model)
+    rows = 0
+    for analysis_universe in cell['univ_list']:
+        for factors in cell['model_list']:
+            rows += len(cell['get_data'](analysis_universe, factors, cell['params']))
+    return rows
+
+
+def grouped_leverage(bq, years):
+    cell = run_cell(bq, 'BQL_Fundamental_Data.py', '# Set the analysis universe', '# Use the pyplot API')
+    return len(cell['data'])
+
+
+def calendarization(bq, years):
+    # The quarterly sales and reconciliation cells, for every member of the index
+    cell = run_cell(bq, 'BQL_Fundamental_Data.py', '#Quarterly Sales', '#Reconciliation',
+                    security=bq.univ.members(BENCHMARK_INDEX))
+    # The reconciliation slices the quarters of one security by date; with many securities
+    # the quarters are sorted by date first
+    cell['df'] = cell['df'].sort_values('PERIOD_END_DATE', kind='mergesort')
+    cell = run_cell(bq, 'BQL_Fundamental_Data.py', '#Reconciliation', '#Fundamentals in Different Currencies',
+                    namespace=cell)
+    return len(cell['df'])
+
+
+def price_pivot(bq, years):
+    # The panel as BQuant_Intro_and_Quick_Example.py built it before price_panel(), kept as
+    # the reference for the price_panel benchmark
+    price = bq.data.px_last(dates=bq.func.range('-%dY' % years, '0D'), frq='D')
+    dataframe = bq.execute(bql.Request(bq.univ.members(BENCHMARK_INDEX), price))[0].df()
+    dataframe = dataframe.rename(columns={'DATE': 'Date', 'CURRENCY': 'Currency', str(price): 'Last Price'})
+    reindexed = dataframe.reset_index().pivot(index='Date', columns='ID', values='Last Price')
+    reindexed.dropna()
+    return len(dataframe)
+
+
+def price_panel_direct(bq, years):
+    cell = run_cell(bq, 'BQuant_Intro_and_Quick_Example.py', '# Define a list of securities',
+                    '# The matrix and its index arrays', universe=bq.univ.members(BENCHMARK_INDEX),
+                    date_range=bq.func.range('-%dY' % years, '0D'), price_panel=price_panel)
+    return len(cell['dataframe'])
+
+
+def universe_filter(bq, years):
+    cell = run_cell(bq, 'BQL_Basics/BQL_Filtering.py', '# Define a starting universe', '#Example B')
+    return len(cell['response'][0].df())
+
+
+# Define the benchmarks, and whether each one depends on the length of the history
+BENCHMARKS = OrderedDict([
+    ('factor_scoring', (factor_scoring, False)),
+    ('grouped_leverage', (grouped_leverage, False)),
+    ('calendarization', (calendarization, False)),
+    ('price_pivot', (price_pivot, True)),
+    ('price_panel', (price_panel_direct, True)),
+    ('universe_filter', (universe_filter, False)),
+])
+
+
+# Define a function to time one benchmark: the best and median of `repeat` runs,
+# and the peak memory traced during one further run
+def measure(benchmark, size, years, repeat=5):
+    bq = make_service(size)
+    benchmark(bq, years)
+    seconds = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        rows = benchmark(bq, years)
+        seconds.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        benchmark(bq, years)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    median = float(np.median(seconds))
+    return OrderedDict([('min', min(seconds)), ('median', median), ('rows', rows),
+                        ('rows_per_second', rows / median if median else np.nan),
+                        ('securities_per_second', size / median if median else np.nan), ('peak_bytes', peak)])
+
+
+# Define a function to run the benchmarks and return one row per benchmark, size and history length
+def run(names=None, sizes=SIZES, years=YEARS, repeat=5, report=print):
+    records = []
+    for name in names or list(BENCHMARKS):
+        benchmark, uses_history = BENCHMARKS[name]
+        for size in sizes:
+            for history in (years if uses_history else [None]):
+                result = measure(benchmark, size, history, repeat)
+                record = OrderedDict([('benchmark', name), ('size', size), ('years', history)])
+                record.update(result)
+                records.append(record)
+                if report is not None:
+                    report('%-18s size=%-6d years=%-4s %10.2f ms %12.0f rows/s %10.0f securities/s %8.1f MB' % (
+                        name, size, history if history is not None else '-', result['median'] * 1000,
+                        result['rows_per_second'], result['securities_per_second'], result['peak_bytes'] / 2 ** 20))
+    return pd.DataFrame(records)
+
+
+def _key(record):
+    # The years of benchmarks without a history are NaN once the results are in a DataFrame
+    years = record['years']
+    return '%s|%d|%s' % (record['benchmark'], record['size'], '-' if years is None or years != years else int(years))
+
+
+# Define a function to store the results as a JSON baseline
+def save_baseline(results, path):
+    baseline = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'machine': platform.node(), 'python': platform.python_version(),
+        'numpy': np.__version__, 'pandas': pd.__version__,
+        'results': dict((_key(record), {'min': record['min'], 'median': record['median'],
+                                        'peak_bytes': int(record['peak_bytes'])})
+                        for record in results.to_dict('records')),
+    }
+    with open(path, 'w') as output:
+        json.dump(baseline, output, indent=2, sort_keys=True)
+
+
+# Define a function to compare results with a baseline; a run is a regression when its
+# best time or peak memory grew by more than `tolerance`. The best time is used because
+# it is the least affected by other work on the machine
+def compare(results, path, tolerance=0.2):
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)['results']
+    rows = []
+    for record in results.to_dict('records'):
+        base = baseline.get(_key(record))
+        if base is None:
+            continue
+        time_ratio = record['min'] / base['min'] if base['min'] else np.nan
+        memory_ratio = record['peak_bytes'] / base['peak_bytes'] if base['peak_bytes'] else np.nan
+        rows.append(OrderedDict([
+            ('benchmark', record['benchmark']), ('size', record['size']), ('years', record['years']),
+            ('time_ratio', time_ratio), ('memory_ratio', memory_ratio),
+            ('regression', bool(time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance)),
+        ]))
+    return pd.DataFrame(rows, columns=['benchmark', 'size', 'years', 'time_ratio', 'memory_ratio', 'regression'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the BQL workflows against the offline simulator.')
+    parser.add_argument('--benchmarks', nargs='*', choices=list(BENCHMARKS), default=None)
+    parser.add_argument('--sizes', nargs='*', type=int, default=list(SIZES))
+    parser.add_argument('--years', nargs='*', type=int, default=list(YEARS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save', help='write the results to this baseline file')
+    parser.add_argument('--compare', nargs='?', const=BASELINE,
+                        help='compare the results with this baseline file, by default the saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = run(args.benchmarks, args.sizes, args.years, args.repeat)
+    if args.save:
+        save_baseline(results, args.save)
+    if args.compare:
+        comparison = compare(results, args.compare, args.tolerance)
+        print(comparison.to_string(index=False))
+        # Exit with a non-zero status on a regression, so the run can gate a build
+        return 1 if comparison['regression'].any() else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
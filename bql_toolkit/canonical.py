@@ -0,0 +1,101 @@
+'''
+Canonical Keys
+Turns BQL expressions, universes and parameters into stable, hashable keys, so that
+two requests for the same data can be recognized even when they were built separately.
+Object model expressions are keyed on their tree: names and options are lowercased,
+keyword arguments are sorted, dates are written as YYYY-MM-DD and numbers as floats,
+so px_last(dates=range('2017-6-5', '2017-06-09'), per='q') and
+px_last(per='Q', dates=range('2017-06-05', '2017-06-09')) have the same key.
+'''
+
+import datetime
+import numbers
+import re
+
+
+# Define a pattern that splits BQL text into quoted strings and everything else
+_QUOTED = re.compile(r"('[^']*'|\"[^\"]*\")")
+
+# Define patterns for absolute dates, e.g. '2017-6-5', and relative dates, e.g. '-1y'
+_ABSOLUTE_DATE = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})$')
+_RELATIVE_DATE = re.compile(r'^[-+]?\d+[dwmqsy]$', re.IGNORECASE)
+
+
+# Define a function to normalize BQL text: whitespace is dropped and names are
+# lowercased, while quoted strings such as security tickers are kept as written
+def normalize_text(text):
+    parts = []
+    for part in _QUOTED.split(str(text)):
+        if part[:1] in ('"', "'") and part[-1:] == part[:1] and len(part) > 1:
+            parts.append("'" + part[1:-1] + "'")
+        else:
+            parts.append(''.join(part.split()).lower())
+    return ''.join(parts)
+
+
+# Define a function to recognize a node of an object model expression tree, read through
+# its name/args/kwargs/kind attributes as in bql_toolkit.fake_bql
+def is_node(value):
+    return hasattr(value, 'kind') and hasattr(value, 'args') and hasattr(value, 'kwargs')
+
+
+# Define a function to render a value of an expression in canonical form; options, i.e.
+# keyword arguments such as per='Q', are case-insensitive, while positional strings such
+# as tickers are kept as written. key renders nested expressions
+def canonical_value(value, option=False, key=None):
+    if is_node(value):
+        return (key or expression_key)(value)
+    if isinstance(value, (list, tuple)):
+        return '[%s]' % ','.join(canonical_value(x, option, key) for x in value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, numbers.Number):
+        return repr(float(value))
+    if isinstance(value, datetime.datetime) and value.time() == datetime.time():
+        return "'%s'" % value.strftime('%Y-%m-%d')
+    if isinstance(value, datetime.date):
+        return "'%s'" % value.isoformat()
+    if isinstance(value, str):
+        text = value.strip()
+        date = _ABSOLUTE_DATE.match(text)
+        if date:
+            return "'%s-%02d-%02d'" % (date.group(1), int(date.group(2)), int(date.group(3)))
+        if _RELATIVE_DATE.match(text):
+            return "'%s'" % text.upper().lstrip('+')
+        return "'%s'" % (text.lower() if option else text)
+    return normalize_text(value)
+
+
+# Define a function to render one node of an expression tree in canonical form,
+# using key to render its child expressions
+def node_text(node, key=None):
+    if node.kind == 'attribute':
+        return '%s.%s' % (canonical_value(node.args[0], False, key), str(node.args[1]).lower())
+    parts = [canonical_value(x, False, key) for x in node.args]
+    parts += ['%s=%s' % (name, canonical_value(value, True, key))
+              for name, value in sorted((str(name).lower(), value) for name, value in node.kwargs.items())]
+    return '%s(%s)' % (str(node.name).lower(), ','.join(parts))
+
+
+# Define a function to build the key of a single data item or expression
+def expression_key(expression):
+    if is_node(expression):
+        return node_text(expression)
+    return normalize_text(expression)
+
+
+# Define a function to build the key of a universe: a security or a list of
+# securities keeps its IDs as written, any other universe uses its BQL text
+def universe_key(universe):
+    if isinstance(universe, str):
+        return ('securities', (universe.strip(),))
+    if isinstance(universe, (list, tuple)):
+        return ('securities', tuple(sorted(set(str(x).strip() for x in universe))))
+    return ('universe', expression_key(universe))
+
+
+# Define a function to build the key of the with_params dictionary of a request
+def params_key(params):
+    if not params:
+        return ()
+    return tuple(sorted((str(name).lower(), canonical_value(value, option=True)) for name, value in params.items()))
@@ -0,0 +1,64 @@
+'''
+Chunked Universe Execution
+Splits a large universe, such as the members of the MXWO Index, into fixed-size
+batches of securities and executes them with bounded parallelism. The partial
+DataFrames are yielded as they arrive, so results can be processed or written out
+straight away and only a few chunks are held in memory at any time.
+
+Usage:
+    securities = resolve_universe(bq, bql.Request, bq.univ.members('MXWO Index'))
+    for frame in execute_chunks(bq, bql.Request, securities, {'Market Cap': bq.data.cur_mkt_cap()}):
+        frame.to_csv('market_cap.csv', mode='a')
+'''
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+
+# Define a function to expand a universe into its list of security IDs with one request
+def resolve_universe(bq, request_class, universe):
+    if isinstance(universe, str):
+        return [universe]
+    if isinstance(universe, (list, tuple)):
+        return list(universe)
+    response = bq.execute(request_class(universe, {'ID': bq.data.id()}))
+    return list(response[0].df().index.unique())
+
+
+# Define a function to combine the items of one chunk's response into one DataFrame
+def combine_response(response):
+    frames = [item.df() for item in response]
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, axis=1)
+
+
+# Define a generator that executes the data items for the securities in chunks
+# and yields one DataFrame per chunk as soon as it is ready
+def execute_chunks(bq, request_class, securities, items, with_params=None,
+                   chunk_size=500, max_workers=4, combine=combine_response):
+    chunks = [list(securities[start:start + chunk_size]) for start in range(0, len(securities), chunk_size)]
+
+    def run(chunk):
+        if with_params:
+            request = request_class(chunk, items, with_params=with_params)
+        else:
+            request = request_class(chunk, items)
+        return combine(bq.execute(request))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bql-chunk') as pool:
+        remaining = iter(chunks)
+        in_flight = set()
+        # Keep at most max_workers chunks in flight, so memory stays bounded
+        for chunk in remaining:
+            in_flight.add(pool.submit(run, chunk))
+            if len(in_flight) >= max_workers:
+                break
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                next_chunk = next(remaining, None)
+                if next_chunk is not None:
+                    in_flight.add(pool.submit(run, next_chunk))
+                yield future.result()
@@ -0,0 +1,210 @@
+'''
+Columnar Responses
+A memory-compact container for BQL responses. Each response item is stored as
+plain NumPy columns instead of a pandas DataFrame:
+- text columns such as ID and CURRENCY are dictionary encoded as int32 codes
+- date columns such as DATE and PERIOD_END_DATE are stored as int64 nanoseconds
+- identical columns are stored once and shared, so the ID and date columns of the
+  fields of a multi-field request take the memory of a single field
+
+The values are exposed as read-only NumPy views, without copying, and items are
+converted to pandas only when df() is called.
+
+Usage:
+    response = ColumnarResponse.from_response(bq.execute(request))
+    response.nbytes                         # the memory held by the columns
+    response['Last Price'].values           # a zero-copy view of the values
+    response['Last Price'].df()             # a DataFrame, as returned by bql
+'''
+
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class Encoded:
+    '''A dictionary-encoded text column: int32 codes into an array of categories; -1 is missing.'''
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.categories.nbytes
+
+    def __len__(self):
+        return len(self.codes)
+
+    # Define a method to decode the column into an object array
+    def decode(self):
+        values = self.categories.take(np.maximum(self.codes, 0)) if len(self.categories) else \
+            np.full(len(self.codes), None, dtype=object)
+        missing = self.codes < 0
+        if missing.any():
+            values = values.astype(object)
+            values[missing] = None
+        return values
+
+    # Define a method to return the column as a pandas Categorical, without decoding it
+    def categorical(self):
+        return pd.Categorical.from_codes(self.codes, self.categories)
+
+
+# Define a function to make an array read-only, so that views can be shared safely
+def _frozen(array):
+    array.flags.writeable = False
+    return array
+
+
+# Define a function to encode one DataFrame column as a NumPy array or an Encoded column
+def encode_column(series):
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return _frozen(series.to_numpy(dtype='datetime64[ns]').view(np.int64))
+    if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_numeric_dtype(series.dtype):
+        return _frozen(np.ascontiguousarray(series.to_numpy(dtype=np.float64, na_value=np.nan)))
+    codes, categories = pd.factorize(series, use_na_sentinel=True)
+    return Encoded(_frozen(codes.astype(np.int32)), _frozen(np.asarray(categories, dtype=object)))
+
+
+class _Pool:
+    '''Keeps one copy of every distinct column, so identical columns are shared.'''
+
+    def __init__(self):
+        self.columns = {}
+        self.encoded = {}
+
+    def _key(self, array):
+        if array.dtype == object:
+            return ('object', len(array), hash(tuple(array)))
+        return (array.dtype.str, len(array), zlib.crc32(np.ascontiguousarray(array).view(np.uint8)))
+
+    def _intern_array(self, array):
+        key = self._key(array)
+        for existing in self.columns.get(key, ()):
+            if np.array_equal(existing, array):
+                return existing
+        self.columns.setdefault(key, []).append(array)
+        return array
+
+    def intern(self, column):
+        if isinstance(column, Encoded):
+            codes, categories = self._intern_array(column.codes), self._intern_array(column.categories)
+            return self.encoded.setdefault((id(codes), id(categories)), Encoded(codes, categories))
+        return self._intern_array(column)
+
+
+class ColumnarItem:
+    '''One response item: a shared ID column, key columns such as DATE, and the values.'''
+
+    def __init__(self, name, ids, columns, value_name):
+        self.name = name
+        # ids is an Encoded column; columns is an OrderedDict of the other columns,
+        # including the values under value_name
+        self.ids = ids
+        self.columns = columns
+        self.value_name = value_name
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def values(self):
+        value = self.columns[self.value_name]
+        return value.decode() if isinstance(value, Encoded) else value
+
+    # Define a method to return a date column, e.g. 'DATE', as a datetime64 view
+    def dates(self, name='DATE'):
+        return self.columns[name].view('datetime64[ns]')
+
+    # Define a method to return any column, decoding text columns
+    def column(self, name):
+        if name == 'ID':
+            return self.ids.decode()
+        column = self.columns[name]
+        if isinstance(column, Encoded):
+            return column.decode()
+        if column.dtype == np.int64:
+            return column.view('datetime64[ns]')
+        return column
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + sum(column.nbytes for column in self.columns.values())
+
+    # Define a method to convert the item to a DataFrame with the layout returned by bql;
+    # categorical=True keeps the text columns encoded as pandas Categoricals
+    def df(self, categorical=False):
+        data = OrderedDict()
+        for name, column in self.columns.items():
+            if isinstance(column, Encoded):
+                data[name] = column.categorical() if categorical else column.decode()
+            elif column.dtype == np.int64:
+                data[name] = column.view('datetime64[ns]')
+            else:
+                data[name] = column.copy()
+        if categorical:
+            index = pd.CategoricalIndex(self.ids.categorical(), name='ID')
+        else:
+            index = pd.Index(self.ids.decode(), name='ID')
+        return pd.DataFrame(data, index=index)
+
+
+class ColumnarResponse:
+    '''A list of ColumnarItem objects that share their identical columns.'''
+
+    def __init__(self, items):
+        self.items = OrderedDict((item.name, item) for item in items)
+
+    # Define a constructor that converts each response item in turn,
+    # so only one pandas DataFrame is held in memory at a time
+    @classmethod
+    def from_response(cls, response, names=None):
+        pool = _Pool()
+        items = []
+        for position, item in enumerate(response):
+            name = names[position] if names is not None else getattr(item, 'name', str(position))
+            items.append(cls._convert(name, item.df(), pool))
+        return cls(items)
+
+    # Define a constructor for DataFrames that are already in memory, keyed on their names
+    @classmethod
+    def from_frames(cls, frames):
+        pool = _Pool()
+        return cls([cls._convert(name, frame, pool) for name, frame in frames.items()])
+
+    @staticmethod
+    def _convert(name, frame, pool):
+        ids = pool.intern(encode_column(frame.index.to_series(index=None)))
+        columns = OrderedDict((column, pool.intern(encode_column(frame[column]))) for column in frame.columns)
+        value_name = frame.columns[-1] if len(frame.columns) else None
+        return ColumnarItem(name, ids, columns, value_name)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items.values())
+
+    # Define item access by position, as for a bql response, or by name
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return list(self.items.values())[key]
+        return self.items[key]
+
+    @property
+    def names(self):
+        return list(self.items)
+
+    # Define the memory held by the response, counting shared columns once
+    @property
+    def nbytes(self):
+        seen = {}
+        for item in self:
+            for column in [item.ids] + list(item.columns.values()):
+                arrays = [column.codes, column.categories] if isinstance(column, Encoded) else [column]
+                for array in arrays:
+                    seen[id(array)] = array.nbytes
+        return sum(seen.values())
@@ -0,0 +1,148 @@
+'''
+Combining Response Items
+A faster replacement for bql.combined_df(response) and pd.concat([item.df() for item in
+response], axis=1). Instead of aligning the index of each field in turn, the union of
+the (ID, DATE) keys of all of the fields is built once, and each field is scattered into
+its rows of a preallocated 2-D array. Fields of different lengths, such as PX_LAST,
+PX_HIGH and PX_LOW over a date range with missing days, line up on the same rows.
+
+The result can be wide, with one column per field and an (ID, DATE) index, or long,
+with one row per ID, DATE and field. Only the values are kept: attribute columns
+such as CURRENCY are dropped, so use bql.combined_df when they are needed.
+
+Usage:
+    response = bq.execute(bql.Request(universe, {'Last': last, 'High': high, 'Low': low}))
+    prices = combined_frame(response)                   # wide: (ID, DATE) x Last/High/Low
+    prices = combined_frame(response, layout='long')    # long: ID, DATE, FIELD, VALUE
+'''
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from bql_toolkit.columnar import ColumnarResponse, Encoded
+
+# Define the columns that can hold the date of a value, in order of preference
+DATE_COLUMNS = ('DATE', 'AS_OF_DATE', 'PERIOD_END_DATE')
+
+NAT = np.iinfo(np.int64).min
+
+
+# Define a function to return the sorted distinct values of an int64 array. Sorting is
+# faster than np.unique here, and the keys of a response are usually already in order
+def sorted_unique(values):
+    values = np.sort(values, kind='stable')
+    if len(values) == 0:
+        return values
+    distinct = np.empty(len(values), dtype=bool)
+    distinct[0] = True
+    np.not_equal(values[1:], values[:-1], out=distinct[1:])
+    return values[distinct]
+
+
+# Define a function to return the sorted union of the keys of every item and the row of
+# each key in the union, or None for an item with repeated keys. When the keys fill
+# most of the key space, a lookup table replaces the sort and the binary searches
+def union_rows(keys, space):
+    total = sum(len(key) for key in keys)
+    if space <= 4 * total:
+        present = np.zeros(space, dtype=bool)
+        positions = []
+        for key in keys:
+            mark = np.zeros(space, dtype=bool)
+            mark[key] = True
+            positions.append(key if np.count_nonzero(mark) == len(key) else None)
+            present |= mark
+        row_of = np.cumsum(present) - 1
+        union = np.flatnonzero(present)
+        return union, [row_of[key] if key is not None else None for key in positions]
+    union = sorted_unique(np.concatenate(keys)) if keys else np.array([], dtype=np.int64)
+    return union, [np.searchsorted(union, key) if len(sorted_unique(key)) == len(key) else None for key in keys]
+
+
+# Define a function to find the date column of a response item, if it has one
+def date_column(item):
+    for name in DATE_COLUMNS:
+        if name in item.columns and name != item.value_name:
+            return name
+    return None
+
+
+# Define a function to combine the items of a response into one DataFrame;
+# layout is 'wide' or 'long'
+def combined_frame(response, layout='wide', names=None):
+    if layout not in ('wide', 'long'):
+        raise ValueError("layout must be 'wide' or 'long'")
+    if not isinstance(response, ColumnarResponse):
+        response = ColumnarResponse.from_response(response, names)
+    items = list(response)
+    names = names or [item.name for item in items]
+    date_names = [date_column(item) for item in items]
+    used = set(name for name in date_names if name is not None)
+    date_name = used.pop() if len(used) == 1 else 'DATE'
+
+    # Map the IDs of every item onto one dictionary, in order of first appearance
+    categories = [item.ids.categories for item in items]
+    global_codes, ids = pd.factorize(np.concatenate(categories) if categories else np.array([], dtype=object))
+    offsets = np.cumsum([0] + [len(x) for x in categories])
+    id_codes = [global_codes[offsets[position]:offsets[position + 1]][item.ids.codes]
+                for position, item in enumerate(items)]
+
+    # Map the dates of every item onto the sorted union of the dates
+    item_dates = [item.columns[name] if name is not None else np.full(len(item), NAT, dtype=np.int64)
+                  for item, name in zip(items, date_names)]
+    dates = sorted_unique(np.concatenate(item_dates)) if items else np.array([], dtype=np.int64)
+    date_codes = [np.searchsorted(dates, values) for values in item_dates]
+
+    if layout == 'long':
+        return _long(items, names, ids, dates, id_codes, date_codes, date_name)
+
+    # Build the union of the (ID, DATE) keys once, as one int64 per row
+    width = max(len(dates), 1)
+    keys = [codes.astype(np.int64) * width + dates_ for codes, dates_ in zip(id_codes, date_codes)]
+    union, positions = union_rows(keys, len(ids) * width)
+    numeric = [not isinstance(item.columns[item.value_name], Encoded) for item in items]
+    block = np.full((len(union), sum(numeric)), np.nan)
+    columns = OrderedDict()
+    for position, (item, rows) in enumerate(zip(items, positions)):
+        if rows is None:
+            raise ValueError("%s has more than one value per ID and %s; use layout='long'" % (names[position], date_name))
+        if numeric[position]:
+            column = block[:, sum(numeric[:position])]
+            column[rows] = item.columns[item.value_name]
+            columns[names[position]] = column
+        else:
+            column = np.full(len(union), None, dtype=object)
+            column[rows] = item.values
+            columns[names[position]] = column
+
+    id_level, date_level = union // width, union % width
+    if all(name is None for name in date_names):
+        index = pd.Index(ids.take(id_level), name='ID')
+    else:
+        date_values = dates.view('datetime64[ns]')
+        missing = dates == NAT
+        # NaT cannot be a level of a MultiIndex, so rows without a date get the code -1
+        level_map = np.cumsum(~missing) - 1
+        codes = np.where(missing[date_level], -1, level_map[date_level])
+        index = pd.MultiIndex(levels=[ids, pd.DatetimeIndex(date_values[~missing])],
+                              codes=[id_level, codes], names=['ID', date_name])
+    if all(numeric):
+        return pd.DataFrame(block, index=index, columns=names)
+    return pd.DataFrame(columns, index=index)
+
+
+def _long(items, names, ids, dates, id_codes, date_codes, date_name):
+    fields = pd.Categorical.from_codes(
+        np.repeat(np.arange(len(items)), [len(item) for item in items]), categories=names)
+    numeric = all(not isinstance(item.columns[item.value_name], Encoded) for item in items)
+    values = np.concatenate([np.asarray(item.values, dtype=np.float64 if numeric else object) for item in items])
+    date_values = dates.view('datetime64[ns]').take(np.concatenate(date_codes)) if len(dates) else \
+        np.array([], dtype='datetime64[ns]')
+    return pd.DataFrame(OrderedDict([
+        ('ID', pd.Categorical.from_codes(np.concatenate(id_codes), categories=ids)),
+        (date_name, date_values),
+        ('FIELD', fields),
+        ('VALUE', values),
+    ]))
@@ -0,0 +1,50 @@
+'''
+Concurrent Execution
+Runs independent BQL requests at the same time, so that the wall-clock time of a
+group of requests approaches that of the slowest request instead of the sum of all
+of them. bq.execute is a blocking call, so each request runs on a worker thread and
+the number of workers bounds how many requests are in flight at once.
+
+Usage in a notebook cell:
+    executor = AsyncExecutor(bq, max_concurrency=4)
+    responses = await executor.gather([request_1, request_2, request_3])
+
+Or without asyncio:
+    responses = executor.execute_all([request_1, request_2, request_3])
+'''
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncExecutor:
+    def __init__(self, bq, max_concurrency=4):
+        # Keep the BQL service and a pool of worker threads that bounds the concurrency
+        self.bq = bq
+        self.max_concurrency = max_concurrency
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='bql')
+
+    # Define a coroutine that executes one request without blocking the event loop
+    async def execute_async(self, request):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, self.bq.execute, request)
+
+    # Define a coroutine that executes several requests concurrently and
+    # returns their responses in the order of the requests
+    async def gather(self, requests, return_exceptions=False):
+        return await asyncio.gather(*[self.execute_async(request) for request in requests],
+                                    return_exceptions=return_exceptions)
+
+    # Define a method with the same behaviour as gather for code that is not async
+    def execute_all(self, requests):
+        return list(self.pool.map(self.bq.execute, requests))
+
+    # Define a method to stop the worker threads once the executor is no longer needed
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,102 @@
+'''
+Factor Cache
+A fetch-once, score-many cache for raw factor columns. Columns are keyed on the
+universe, the canonical factor expression and the with_params of the request, so a
+factor shared by several models is only requested once. Entries expire after a time
+to live and the least recently used entries are evicted when the cache is full.
+'''
+
+import time
+from collections import OrderedDict
+
+from bql_toolkit.batching import BatchedItem
+from bql_toolkit.canonical import expression_key, params_key, universe_key
+from bql_toolkit.optimizer import request_text
+from bql_toolkit.scoring import response_columns
+from bql_toolkit.timing import size_of, timer
+
+
+class FactorCache:
+    def __init__(self, bq, request_class, ttl=15 * 60, max_entries=256, clock=time.monotonic,
+                 optimize=False):
+        # Keep the BQL service and request class used to fetch missing factors; with
+        # optimize, subexpressions shared by the factors are sent once as let() variables
+        self.bq = bq
+        self.request_class = request_class
+        self.optimize = optimize
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # Define a method to build the cache key of one factor
+    def key(self, universe, expression, params=None):
+        return (universe_key(universe), expression_key(expression), params_key(params))
+
+    # Define a method to look up a cached column, dropping it if it has expired
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_at, column = entry
+        if self.ttl is not None and self.clock() - stored_at > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return column
+
+    # Define a method to store a column and evict the least recently used entries
+    def put(self, key, column):
+        self.entries[key] = (self.clock(), column)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    # Define a method to empty the cache, e.g. before a forced refresh
+    def clear(self):
+        self.entries.clear()
+
+    # Define a method to return the raw factor columns for a universe, requesting
+    # only the factors that are not already cached
+    def fetch(self, universe, factor_dict, params=None):
+        columns = OrderedDict()
+        missing = OrderedDict()
+        for name, expression in factor_dict.items():
+            key = self.key(universe, expression, params)
+            column = self.get(key)
+            if column is None:
+                # Identical expressions under different names are fetched once
+                missing.setdefault(key, []).append(name)
+            else:
+                columns[name] = column.rename(name)
+        self.hits += len(factor_dict) - sum(len(names) for names in missing.values())
+        self.misses += len(missing)
+
+        if missing:
+            with timer.stage('request build', rows=len(missing)):
+                request_items = OrderedDict((names[0], factor_dict[names[0]]) for names in missing.values())
+                if self.optimize:
+                    request = request_text(universe, request_items, params)
+                elif params:
+                    request = self.request_class(universe, request_items, with_params=params)
+                else:
+                    request = self.request_class(universe, request_items)
+            with timer.stage('bq.execute'):
+                response = self.bq.execute(request)
+                if self.optimize:
+                    # Name the items of the string request after the factors
+                    response = [BatchedItem(item, name) for item, name in zip(response, request_items)]
+            with timer.stage('df conversion') as stage:
+                fetched = response_columns(response, list(request_items))
+                stage.rows = max(len(column) for column in fetched.values())
+                stage.nbytes = sum(size_of(column) for column in fetched.values())
+            for key, names in missing.items():
+                column = fetched[names[0]]
+                self.put(key, column)
+                for name in names:
+                    columns[name] = column.rename(name)
+
+        # Return the columns in the order of the factor dictionary
+        return OrderedDict((name, columns[name]) for name in factor_dict)
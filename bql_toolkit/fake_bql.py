@@ -0,0 +1,786 @@
+'''
+Fake BQL Service
+A local, offline simulator of the bql module, so that the examples and the helpers
+in this package can be run, tested and benchmarked without a connection to the
+Bloomberg Query Language service. It mirrors the parts of the object model used in
+the examples: bq.data, bq.func, bq.univ, bql.Request, bq.execute, response[i].df()
+and bql.combined_df. String interface requests are parsed into the object model with
+bql_toolkit.string_interface.
+
+The data is synthetic but deterministic, so the same request always returns the same
+values, and it has realistic shapes:
+- index members, e.g. 30 for INDU, 500 for SPX and BE500, about 1,650 for MXWO
+- daily prices over date ranges, with DATE and CURRENCY columns
+- annual and quarterly fundamentals with PERIOD_END_DATE, and estimate
+  histories with AS_OF_DATE
+- group(), groupavg() and filter() evaluated across the universe
+
+Latency and failures can be injected to exercise caching, batching and retries.
+
+Usage:
+    from bql_toolkit import fake_bql as bql
+    bq = bql.Service(latency=0.2)
+    request = bql.Request(bq.univ.members('INDU Index'), bq.data.px_last())
+    bq.execute(request)[0].df()
+'''
+
+import re
+import threading
+import time
+import warnings
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from bql_toolkit.string_interface import QueryParser
+
+
+# Define the data items that return text instead of numbers, with their possible values
+TEXT_FIELDS = {
+    'gics_sector_name': ['Communication Services', 'Consumer Discretionary', 'Consumer Staples',
+                         'Energy', 'Financials', 'Health Care', 'Industrials',
+                         'Information Technology', 'Materials', 'Real Estate', 'Utilities'],
+    'country_full_name': ['France', 'Germany', 'Italy', 'Netherlands', 'Spain',
+                          'Switzerland', 'United Kingdom'],
+    'cpn_typ': ['FIXED', 'FLOATING', 'ZERO COUPON'],
+    'payment_rank': ['Sr Unsecured', 'Secured', 'Subordinated'],
+    'id': None,
+    'name': None,
+}
+
+# Define the price fields, which are simulated as daily time series, with their offset from px_last
+PRICE_FIELDS = {
+    'px_last': 0.0, 'px_open': 0.002, 'px_high': 0.01, 'px_low': -0.01,
+    'px_bid': -0.0005, 'px_ask': 0.0005, 'best_target_price': 0.1,
+}
+
+# Define the typical size and spread of the other numeric fields; the sign says
+# whether a field can be negative. Fields that are not listed use the default
+FIELD_SCALES = {
+    'sales_rev_turn': (2e10, 1.0, 1), 'net_income': (1.5e9, 1.2, -1), 'bs_tot_asset': (6e10, 1.0, 1),
+    'bs_lt_borrow': (1e10, 1.2, 1), 'bs_st_borrow': (3e9, 1.2, 1), 'cf_free_cash_flow': (1.2e9, 1.2, -1),
+    'ebitda': (4e9, 1.0, 1), 'is_eps': (4.0, 0.8, -1), 'tot_debt_to_ebitda': (2.0, 0.6, 1),
+    'ebitda_growth': (6.0, 1.0, -1), 'sales_growth': (5.0, 1.0, -1), 'pe_ratio': (18.0, 0.4, 1),
+    'cur_mkt_cap': (3e10, 1.3, 1), 'free_cash_flow_yield': (4.0, 0.6, -1),
+    'eqy_dvd_yld_12m': (2.0, 0.7, 1), 'bdvd_proj_12m_yld': (2.1, 0.7, 1), 'cpn': (4.0, 0.4, 1),
+    'px_volume': (3e6, 1.0, 1),
+}
+DEFAULT_SCALE = (10.0, 1.0, 1)
+
+# Define the market fields, which have a value per day rather than per fiscal period
+MARKET_FIELDS = {'cur_mkt_cap', 'pe_ratio', 'free_cash_flow_yield', 'eqy_dvd_yld_12m',
+                 'bdvd_proj_12m_yld', 'cpn', 'px_volume'}
+
+# Define the fields that are ratios, which are not converted between currencies
+RATIO_FIELDS = {'tot_debt_to_ebitda', 'pe_ratio', 'is_eps', 'ebitda_growth', 'sales_growth',
+                'free_cash_flow_yield', 'eqy_dvd_yld_12m', 'bdvd_proj_12m_yld', 'cpn'}
+
+# Define the number of members and the exchange codes of the indices used in the examples
+INDEX_SIZES = {'INDU Index': 30, 'SPX Index': 500, 'BE500 Index': 500, 'UKX Index': 100, 'MXWO Index': 1650}
+INDEX_EXCHANGES = {
+    'INDU Index': ['US'], 'SPX Index': ['US'], 'UKX Index': ['LN'],
+    'BE500 Index': ['LN', 'FP', 'GR', 'IM', 'SM', 'NA', 'SW'],
+    'MXWO Index': ['US', 'US', 'US', 'LN', 'FP', 'GR', 'JT', 'CN', 'AU', 'SW'],
+}
+CURRENCIES = {'US': 'USD', 'LN': 'GBP', 'FP': 'EUR', 'GR': 'EUR', 'IM': 'EUR', 'SM': 'EUR',
+              'NA': 'EUR', 'SW': 'CHF', 'JT': 'JPY', 'CN': 'CAD', 'AU': 'AUD', 'SS': 'SEK',
+              'RM': 'RUB', 'PL': 'PLN', 'LI': 'USD'}
+FX_TO_USD = {'USD': 1.0, 'EUR': 1.13, 'GBP': 1.29, 'CHF': 1.0, 'JPY': 0.009, 'CAD': 0.75,
+             'AUD': 0.71, 'SEK': 0.11, 'RUB': 0.015, 'PLN': 0.26}
+
+# Define the infix operators of the object model and the BQL text used for them
+OPERATORS = OrderedDict([
+    ('plus', '+'), ('minus', '-'), ('multiply', '*'), ('divide', '/'),
+    ('greater', '>'), ('greater_equal', '>='), ('less', '<'), ('less_equal', '<='),
+    ('equals', '=='), ('not_equals', '!='),
+])
+
+NUMPY_OPERATORS = {
+    'plus': np.add, 'minus': np.subtract, 'multiply': np.multiply, 'divide': np.divide,
+    'greater': np.greater, 'greater_equal': np.greater_equal, 'less': np.less,
+    'less_equal': np.less_equal, 'equals': np.equal, 'not_equals': np.not_equal,
+}
+
+ELEMENTWISE = {
+    'abs': np.abs, 'sign': np.sign, 'floor': np.floor, 'ceil': np.ceil, 'square': np.square,
+    'sqrt': np.sqrt, 'exp': np.exp, 'ln': np.log, 'log': np.log10, 'not': np.logical_not,
+    'pow': np.power, 'mod': np.mod,
+}
+
+AGGREGATES = {
+    'avg': np.nanmean, 'mean': np.nanmean, 'sum': np.nansum, 'min': np.nanmin, 'max': np.nanmax,
+    'median': np.nanmedian, 'count': lambda values, axis: np.sum(~np.isnan(values), axis=axis),
+    'std': lambda values, axis: np.nanstd(values, axis=axis, ddof=1),
+}
+
+RELATIVE_DATE = re.compile(r'^([-+]?\d+)([DWMQSY])$', re.IGNORECASE)
+PERIOD_FREQUENCIES = {'D': 'B', 'W': 'W-FRI', 'M': 'BME', 'Q': 'BQE', 'S': '6BME', 'Y': 'BYE'}
+
+
+class ServiceError(Exception):
+    '''Raised by the fake service for failed requests, including injected failures.'''
+
+
+# Define a function to render a Python value as it appears in BQL text
+def _render(value):
+    if isinstance(value, str):
+        return "'%s'" % value
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(_render(x) for x in value) + ']'
+    return str(value)
+
+
+# Define a function to turn strings into a stable 64-bit seed
+def _seed(*parts):
+    text = '|'.join(str(x) for x in parts).encode('utf-8')
+    return np.uint64(zlib.crc32(text)) << np.uint64(32) | np.uint64(zlib.adler32(text))
+
+
+# Define a function to mix 64-bit integers into uniform numbers in [0, 1) (splitmix64)
+def _uniform(*keys):
+    with np.errstate(over='ignore'):
+        state = np.uint64(0x9E3779B97F4A7C15)
+        for key in keys:
+            state = state ^ np.asarray(key, dtype=np.uint64)
+            state = state + np.uint64(0x9E3779B97F4A7C15)
+            state = (state ^ (state >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            state = (state ^ (state >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            state = state ^ (state >> np.uint64(31))
+    return (state >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+# Define a function to turn uniform numbers into standard normal numbers
+def _normal(*keys):
+    u1 = np.maximum(_uniform(*keys), 1e-12)
+    u2 = _uniform(*(keys + (np.uint64(7),)))
+    return np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+
+class Item:
+    '''A node of an object model expression: a data item, a function or an operator.'''
+
+    def __init__(self, name, args=(), kwargs=None, kind='func'):
+        self.name = name
+        self.args = tuple(args)
+        self.kwargs = OrderedDict(kwargs or {})
+        self.kind = kind
+
+    def __str__(self):
+        if self.kind == 'operator':
+            return '(%s%s%s)' % (_render(self.args[0]), OPERATORS[self.name], _render(self.args[1]))
+        if self.kind == 'attribute':
+            return '%s.%s' % (_render(self.args[0]), self.args[1])
+        parts = [_render(x) for x in self.args]
+        parts += ['%s=%s' % (key, _render(value)) for key, value in self.kwargs.items()]
+        return '%s(%s)' % (self.name, ','.join(parts))
+
+    __repr__ = __str__
+    __hash__ = object.__hash__
+
+    # Define the operators, each of which returns a new expression node
+    def _operator(name, reflected=False):
+        def method(self, other):
+            args = (other, self) if reflected else (self, other)
+            return Item(name, args, kind='operator')
+        return method
+
+    __add__, __radd__ = _operator('plus'), _operator('plus', True)
+    __sub__, __rsub__ = _operator('minus'), _operator('minus', True)
+    __mul__, __rmul__ = _operator('multiply'), _operator('multiply', True)
+    __truediv__, __rtruediv__ = _operator('divide'), _operator('divide', True)
+    __gt__, __ge__ = _operator('greater'), _operator('greater_equal')
+    __lt__, __le__ = _operator('less'), _operator('less_equal')
+    __eq__, __ne__ = _operator('equals'), _operator('not_equals')
+    del _operator
+
+    # Define method chaining, e.g. px_last().group(sector).avg()
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: Item(name.rstrip('_'), (self,) + args, kwargs)
+
+    # Define attribute access, e.g. tot_debt['period_end_date']
+    def __getitem__(self, name):
+        return Item('attribute', (self, name), kind='attribute')
+
+
+class _Namespace:
+    '''Creates expression nodes from attribute names, e.g. bq.data.px_last().'''
+
+    def __init__(self, kind):
+        self._kind = kind
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: Item(name.rstrip('_'), args, kwargs, kind=self._kind)
+
+
+class Request:
+    '''A request for one or more data items over a security universe.'''
+
+    def __init__(self, universe, items, with_params=None):
+        self.universe = universe
+        if isinstance(items, dict):
+            self.items = OrderedDict(items)
+        elif isinstance(items, (list, tuple)):
+            self.items = OrderedDict((str(item), item) for item in items)
+        else:
+            self.items = OrderedDict([(str(items), items)])
+        self.with_params = dict(with_params or {})
+
+    def to_string(self):
+        fields = ','.join('%s' % item for item in self.items.values())
+        text = 'get(%s) for(%s)' % (fields, _render(self.universe))
+        if self.with_params:
+            text += ' with(%s)' % ','.join('%s=%s' % (k, _render(v)) for k, v in self.with_params.items())
+        return text
+
+
+class SingleItemResponse:
+    '''The response for one data item, converted to a DataFrame with df().'''
+
+    def __init__(self, name, frame):
+        self.name = name
+        self._frame = frame
+
+    def df(self):
+        return self._frame.copy()
+
+
+# Define a function to combine all of the items of a response into one DataFrame
+def combined_df(response):
+    return pd.concat([item.df() for item in response], axis=1)
+
+
+class _Values:
+    '''
+    The value of an expression: a 2-D array with one row per ID (a security or a group)
+    and one column per date or period on the time axis, plus extra output columns.
+    '''
+
+    def __init__(self, ids, data, axis_name=None, times=None, columns=None, codes=None):
+        self.ids = ids
+        self.data = data
+        self.axis_name = axis_name
+        self.times = times
+        self.columns = columns if columns is not None else OrderedDict()
+        # For aggregated groups, the group of every cell of the grouped values and those values
+        self.codes = codes
+        self.source = None
+        # The name of the output column when the values are used as a group() key
+        self.key_name = None
+        self.dropna = False
+
+    def like(self, data):
+        return _Values(self.ids, data, self.axis_name, self.times, self.columns, self.codes)
+
+
+class _Grouped:
+    def __init__(self, values, codes, labels, keys):
+        self.values = values
+        self.codes = codes
+        self.labels = labels
+        self.keys = keys
+
+
+class _Range:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+
+class Service:
+    '''A fake bql.Service that generates deterministic synthetic data.'''
+
+    def __init__(self, today='2019-02-26', members_per_index=200, index_sizes=None,
+                 latency=0.0, latency_per_row=0.0, failure_rate=0.0, seed=0):
+        self.data = _Namespace('data')
+        self.func = _Namespace('func')
+        self.univ = _Namespace('univ')
+        # Relative dates such as '-1Y' and '0D' are resolved against this date
+        self.today = pd.Timestamp(today).normalize()
+        self.members_per_index = members_per_index
+        self.index_sizes = dict(INDEX_SIZES, **(index_sizes or {}))
+        # Keep the simulated latency, in seconds per request and per returned row,
+        # and the probability that a request fails
+        self.latency = latency
+        self.latency_per_row = latency_per_row
+        self.failure_rate = failure_rate
+        self.failures = np.random.default_rng(seed)
+        self.forced_failures = 0
+        self.lock = threading.Lock()
+        # Keep a log of every executed request so that round trips can be counted
+        self.executed = []
+        # Parse string interface requests into the object model
+        self.parser = QueryParser(self, Request)
+
+    @property
+    def calls(self):
+        return len(self.executed)
+
+    # Define a method to make the next `count` requests fail
+    def fail_next(self, count=1):
+        self.forced_failures += count
+
+    # ------------------------------------------------------------------ universes
+
+    # Define a method to resolve a universe into a list of security IDs
+    def securities(self, universe):
+        if isinstance(universe, str):
+            return [universe]
+        if isinstance(universe, (list, tuple)):
+            return [str(x) for x in universe]
+        if isinstance(universe, Item) and universe.name in ('members', 'bonds', 'loans', 'filter', 'list'):
+            return getattr(self, '_univ_' + universe.name)(*universe.args, **universe.kwargs)
+        raise ServiceError('Unsupported universe: %s' % universe)
+
+    def _univ_list(self, securities, **kwargs):
+        return self.securities(securities)
+
+    def _univ_members(self, index, dates=None, **kwargs):
+        size = self.index_sizes.get(index, self.members_per_index)
+        exchanges = INDEX_EXCHANGES.get(index, ['US'])
+        letters = (_uniform(_seed(index), np.arange(size * 4, dtype=np.uint64)) * 26).astype(int).reshape(size, 4)
+        members = OrderedDict()
+        for position in range(size):
+            ticker = ''.join(chr(65 + x) for x in letters[position, :2 + position % 3])
+            # Two random tickers can collide, so number the later ones
+            if ticker in members:
+                ticker = '%s%d' % (ticker, position)
+            members[ticker] = '%s %s Equity' % (ticker, exchanges[position % len(exchanges)])
+        return list(members.values())
+
+    def _univ_bonds(self, issuers, **kwargs):
+        issuers = issuers if isinstance(issuers, (list, tuple)) else [issuers]
+        bonds = []
+        for issuer in issuers:
+            count = 6 + int(_uniform(_seed(issuer, 'bonds')) * 20)
+            ticker = issuer.split()[0]
+            for position in range(count):
+                coupon = 1 + int(_uniform(_seed(issuer, position)) * 32) / 4.0
+                bonds.append('%s %.2f %02d/15/%d Corp' % (ticker, coupon, 1 + position % 12, 2020 + position))
+        return bonds
+
+    def _univ_loans(self, issuers, **kwargs):
+        issuers = issuers if isinstance(issuers, (list, tuple)) else [issuers]
+        return ['%s TL%s Corp' % (issuer.split()[0], letter) for issuer in issuers for letter in 'ABC']
+
+    def _univ_filter(self, universe, criteria, **kwargs):
+        ids = self.securities(universe)
+        mask = self.evaluate(criteria, ids, {})
+        keep = np.asarray(mask.data[:, -1], dtype=object)
+        keep = np.array([bool(x) and x == x for x in keep])
+        return [security for security, kept in zip(ids, keep) if kept]
+
+    # ------------------------------------------------------------------ dates
+
+    def resolve_date(self, text):
+        if isinstance(text, pd.Timestamp):
+            return text
+        match = RELATIVE_DATE.match(str(text).strip())
+        if match:
+            count, unit = int(match.group(1)), match.group(2).upper()
+            if unit == 'D':
+                return self.today + pd.offsets.BDay(count) if count else self.today
+            months = {'W': None, 'M': 1, 'Q': 3, 'S': 6, 'Y': 12}[unit]
+            if months is None:
+                return self.today + pd.DateOffset(weeks=count)
+            return self.today + pd.DateOffset(months=count * months)
+        return pd.Timestamp(str(text)).normalize()
+
+    def _dates(self, settings):
+        dates = settings.get('dates')
+        if dates is None and ('start' in settings or 'end' in settings):
+            dates = _Range(settings.get('start', '0D'), settings.get('end', '0D'))
+        frequency = str(settings.get('per', settings.get('frq', 'D'))).upper()[-1:]
+        if isinstance(dates, _Range):
+            start, end = self.resolve_date(dates.start), self.resolve_date(dates.end)
+            return pd.date_range(start, end, freq=PERIOD_FREQUENCIES.get(frequency, 'B'))
+        date = self.resolve_date(dates if dates is not None else '0D')
+        return pd.DatetimeIndex([date])
+
+    def _periods(self, settings):
+        period_type = str(settings.get('fa_period_type', 'A')).upper()
+        reference = settings.get('fa_period_reference')
+        offset = settings.get('fa_period_offset')
+        as_of = settings.get('as_of_date')
+        anchor = self.resolve_date(as_of) if isinstance(as_of, str) else self.today
+        step = {'A': 12, 'S': 6, 'Q': 3}.get(period_type, 12)
+
+        def period_end(text):
+            text = str(text)
+            if re.match(r'^\d{4}$', text):
+                return pd.Timestamp(int(text), 12, 31)
+            match = re.match(r'^(\d{4})([QS])(\d)$', text.upper())
+            if match:
+                months = 3 if match.group(2) == 'Q' else 6
+                return pd.Timestamp(int(match.group(1)), int(match.group(3)) * months, 1) + pd.offsets.MonthEnd(0)
+            return self.resolve_date(text) + pd.offsets.MonthEnd(0)
+
+        # The current period is the last one that ended before the anchor date
+        current = (anchor - pd.DateOffset(months=1)) + pd.offsets.MonthEnd(0)
+        current = current - pd.DateOffset(months=(current.month % step)) + pd.offsets.MonthEnd(0)
+        if isinstance(reference, _Range):
+            start, end = period_end(reference.start), period_end(reference.end)
+            # A range that starts with a year starts with the first period of that year
+            if re.match(r'^\d{4}$', str(reference.start)):
+                start = pd.Timestamp(int(reference.start), step, 1) + pd.offsets.MonthEnd(0)
+        elif reference is not None:
+            start = end = period_end(reference)
+        elif isinstance(offset, _Range):
+            start = current + pd.DateOffset(months=step * int(offset.start)) + pd.offsets.MonthEnd(0)
+            end = current + pd.DateOffset(months=step * int(offset.end)) + pd.offsets.MonthEnd(0)
+        elif offset is not None:
+            start = end = current + pd.DateOffset(months=step * int(offset)) + pd.offsets.MonthEnd(0)
+        else:
+            start = end = current
+        periods = pd.date_range(start, end, freq='%dME' % step)
+        return periods if len(periods) else pd.DatetimeIndex([end])
+
+    # ------------------------------------------------------------------ data items
+
+    def _security_seeds(self, ids):
+        return np.array([_seed(security) for security in ids], dtype=np.uint64)
+
+    def _currency(self, ids, settings):
+        currency = settings.get('currency')
+        if currency:
+            return np.full(len(ids), str(currency).upper(), dtype=object)
+        return np.array([CURRENCIES.get(str(x).split()[-2] if len(str(x).split()) > 2 else 'US', 'USD')
+                         for x in ids], dtype=object)
+
+    def _fx(self, currencies):
+        return np.array([1.0 / FX_TO_USD.get(currency, 1.0) for currency in currencies])
+
+    def _data(self, item, ids, params):
+        settings = dict((str(key).lower(), value) for key, value in params.items())
+        settings.update(item.kwargs)
+        for key, value in settings.items():
+            if isinstance(value, Item) and value.name == 'range':
+                settings[key] = _Range(*value.args)
+        name = item.name.lower()
+        seeds = self._security_seeds(ids)
+        field = np.uint64(_seed(name))
+
+        choices = TEXT_FIELDS.get(name, False)
+        if choices is not False:
+            if choices is None:
+                data = np.array(ids, dtype=object)
+            else:
+                data = np.array(choices, dtype=object)[(_uniform(seeds, field) * len(choices)).astype(int)]
+            return _Values(ids, data.reshape(-1, 1))
+
+        currency = self._currency(ids, settings)
+        if name in PRICE_FIELDS:
+            values = self._prices(name, seeds, field, settings, currency)
+        elif name in MARKET_FIELDS:
+            values = self._market(name, seeds, field, settings, currency)
+        else:
+            values = self._fundamentals(name, seeds, field, settings, currency)
+
+        # Apply the fill parameter along the time axis
+        fill = str(settings.get('fill', 'na')).lower()
+        if fill in ('prev', 'next') and values.data.shape[1] > 1:
+            frame = pd.DataFrame(values.data.T)
+            values.data = (frame.ffill() if fill == 'prev' else frame.bfill()).to_numpy().T
+        values.columns['CURRENCY'] = currency.reshape(-1, 1)
+        return values
+
+    def _prices(self, name, seeds, field, settings, currency):
+        dates = self._dates(settings)
+        days = (dates.values.astype('datetime64[D]').astype(np.int64)).astype(np.uint64)
+        base = np.exp(np.log(10.0) + _uniform(seeds, np.uint64(1)) * np.log(50.0))
+        drift = (_uniform(seeds, np.uint64(2)) - 0.4) * 0.0004
+        t = days.astype(np.float64)[None, :] - 17000.0
+        # A trend plus slow cycles plus daily noise, consistent across date ranges
+        phase = _uniform(seeds, np.uint64(3))[:, None] * 2 * np.pi
+        cycles = 0.15 * np.sin(t / 180.0 + phase) + 0.05 * np.sin(t / 23.0 + 2 * phase)
+        noise = 0.01 * _normal(seeds[:, None], days[None, :])
+        price = base[:, None] * np.exp(drift[:, None] * t + cycles + noise)
+        data = price * (1.0 + PRICE_FIELDS[name])
+        # About 2% of the days have no price, e.g. market holidays
+        if len(dates) > 1:
+            data[_uniform(seeds[:, None], days[None, :], np.uint64(5)) < 0.02] = np.nan
+        data = data * self._fx(currency)[:, None]
+        return _Values(None, data, 'DATE', dates)
+
+    def _market(self, name, seeds, field, settings, currency):
+        scale, spread, sign = FIELD_SCALES.get(name, DEFAULT_SCALE)
+        dates = self._dates(settings)
+        days = (dates.values.astype('datetime64[D]').astype(np.int64)).astype(np.uint64)
+        level = scale * np.exp(_normal(seeds, field) * spread)
+        if sign < 0:
+            level = level * np.where(_uniform(seeds, field, np.uint64(13)) < 0.1, -1.0, 1.0)
+        data = level[:, None] * (1.0 + 0.02 * _normal(seeds[:, None], days[None, :], field))
+        if name not in RATIO_FIELDS:
+            data = data * self._fx(currency)[:, None]
+        return _Values(None, data, 'DATE', dates)
+
+    def _fundamentals(self, name, seeds, field, settings, currency):
+        scale, spread, sign = FIELD_SCALES.get(name, DEFAULT_SCALE)
+        periods = self._periods(settings)
+        year_end = str(settings.get('fa_period_year_end', 'C')).upper()
+        if year_end == 'F':
+            # Fiscal years end 0, 3, 6 or 9 months after the calendar year
+            shift = (_uniform(seeds, np.uint64(11)) * 4).astype(int) * 3
+            period_ends = np.array([[p - pd.DateOffset(months=int(s)) + pd.offsets.MonthEnd(0) for p in periods]
+                                    for s in shift], dtype='datetime64[ns]')
+        else:
+            period_ends = np.broadcast_to(periods.values, (len(seeds), len(periods)))
+        ordinal = period_ends.astype('datetime64[M]').astype(np.int64).astype(np.uint64)
+        size = np.exp(_normal(seeds, field) * spread)
+        growth = 1.0 + 0.04 * _normal(seeds, field, np.uint64(9))
+        years = (ordinal.astype(np.float64) - 588.0) / 12.0
+        level = scale * size[:, None] * growth[:, None] ** years
+        if sign < 0:
+            level = level * np.where(_uniform(seeds, field, np.uint64(13)) < 0.1, -1.0, 1.0)[:, None]
+        data = level * (1.0 + 0.05 * _normal(seeds[:, None], ordinal, field))
+        if name not in RATIO_FIELDS:
+            data = data * self._fx(currency)[:, None]
+
+        as_of = settings.get('as_of_date')
+        if isinstance(as_of, _Range):
+            # Estimate histories: one row per day, revised at the start of every month
+            if len(periods) > 1:
+                raise ServiceError('as_of_date ranges need a single fiscal period')
+            dates = pd.bdate_range(self.resolve_date(as_of.start), self.resolve_date(as_of.end))
+            months = dates.values.astype('datetime64[M]').astype(np.int64).astype(np.uint64)
+            revisions = 1.0 + 0.02 * _normal(seeds[:, None], months[None, :], field)
+            columns = OrderedDict([('PERIOD_END_DATE', period_ends[:, :1])])
+            return _Values(None, data[:, :1] * revisions, 'AS_OF_DATE', dates, columns)
+        if 'dates' in settings and len(periods) == 1:
+            # Daily values of a fundamental field repeat the value of the latest period
+            dates = self._dates(settings)
+            return _Values(None, np.repeat(data, len(dates), axis=1), 'DATE', dates)
+        columns = OrderedDict()
+        if year_end == 'F':
+            columns['PERIOD_END_DATE'] = period_ends
+        return _Values(None, data, 'PERIOD_END_DATE', pd.DatetimeIndex(period_ends[0]), columns)
+
+    # ------------------------------------------------------------------ expressions
+
+    # Define a method to evaluate an expression for every security in the universe
+    def evaluate(self, item, ids, params):
+        values = self._evaluate(item, ids, params)
+        if isinstance(values, _Grouped):
+            values = values.values
+        if not isinstance(values, _Values):
+            values = _Values(ids, np.full((len(ids), 1), values, dtype=object if isinstance(values, str) else np.float64))
+        if values.ids is None:
+            values.ids = ids
+        return values
+
+    def _evaluate(self, item, ids, params):
+        if isinstance(item, (list, tuple)):
+            return [self._evaluate(x, ids, params) for x in item]
+        if not isinstance(item, Item):
+            return item
+        if item.kind == 'data':
+            values = self._data(item, ids, params)
+            values.ids = ids
+            # Name the key columns of a group() by this item after the field
+            values.key_name = item.name.upper()
+            return values
+        if item.kind == 'attribute':
+            source = self.evaluate(item.args[0], ids, params)
+            return self._attribute(source, item.args[1])
+
+        name = item.name.lower()
+        if name == 'range':
+            return _Range(*item.args)
+        arguments = [self._evaluate(x, ids, params) for x in item.args]
+        keywords = dict((key, self._evaluate(value, ids, params)) for key, value in item.kwargs.items())
+
+        if item.kind == 'operator' or name in ELEMENTWISE or name in ('if', 'and', 'or', 'znav', 'avail'):
+            return self._elementwise(name, arguments, ids)
+        if name == 'dropna':
+            if isinstance(arguments[0], _Grouped):
+                # Keep the grouping, so avg(dropna(group(x))) still aggregates each group;
+                # the missing cells are left out of the aggregates
+                grouped = arguments[0]
+                values = grouped.values.like(grouped.values.data)
+                values.dropna = True
+                return _Grouped(values, grouped.codes, grouped.labels, grouped.keys)
+            values = self._as_values(arguments[0], ids)
+            result = values.like(values.data)
+            result.dropna = True
+            return result
+        if name == 'group':
+            by = keywords.get('by', arguments[1] if len(arguments) > 1 else None)
+            return self._group(self._as_values(arguments[0], ids), by, ids)
+        if name == 'ungroup':
+            return self._ungroup(arguments[0])
+        if name in AGGREGATES:
+            return self._aggregate(AGGREGATES[name], arguments[0], ids)
+        if name.startswith('group') and name[5:] in AGGREGATES:
+            by = keywords.get('by', arguments[1] if len(arguments) > 1 else None)
+            grouped = self._group(self._as_values(arguments[0], ids), by, ids)
+            return self._ungroup(self._aggregate(AGGREGATES[name[5:]], grouped, ids))
+        if name == 'pct_change':
+            values = self._as_values(arguments[0], ids)
+            data = values.data.astype(np.float64)
+            change = (data[:, -1] / data[:, 0] - 1.0) * 100.0
+            return _Values(values.ids, change.reshape(-1, 1))
+        raise ServiceError('%s() is not simulated by the fake service' % item.name)
+
+    def _as_values(self, value, ids):
+        if isinstance(value, _Grouped):
+            return value.values
+        if isinstance(value, _Values):
+            return value
+        return _Values(ids, np.full((len(ids), 1), value, dtype=object if isinstance(value, str) else np.float64))
+
+    def _attribute(self, source, name):
+        column = name.upper()
+        if column == source.axis_name:
+            data = np.broadcast_to(source.times.values, source.data.shape)
+        elif column in source.columns:
+            data = np.broadcast_to(source.columns[column], source.data.shape)
+        else:
+            raise ServiceError('Unknown attribute %s' % name)
+        result = source.like(np.array(data))
+        result.key_name = column
+        return result
+
+    def _elementwise(self, name, arguments, ids):
+        # Use the argument with the longest time axis as the shape of the result
+        shaped = [x for x in arguments if isinstance(x, (_Values, _Grouped))]
+        shaped = [x.values if isinstance(x, _Grouped) else x for x in shaped]
+        template = max(shaped, key=lambda x: x.data.shape[1]) if shaped else _Values(ids, np.zeros((len(ids), 1)))
+        data = []
+        for argument in arguments:
+            if isinstance(argument, _Grouped):
+                argument = argument.values
+            if isinstance(argument, _Values):
+                if argument.data.shape[1] not in (1, template.data.shape[1]):
+                    raise ServiceError('The arguments of %s() have different dates' % name)
+                data.append(argument.data)
+            else:
+                data.append(argument)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if name in NUMPY_OPERATORS:
+                left, right = data
+                if name in ('equals', 'not_equals'):
+                    result = NUMPY_OPERATORS[name](np.asarray(left, dtype=object), right)
+                else:
+                    result = NUMPY_OPERATORS[name](np.asarray(left, dtype=np.float64),
+                                                   np.asarray(right, dtype=np.float64))
+            elif name in ELEMENTWISE:
+                result = ELEMENTWISE[name](*[np.asarray(x, dtype=np.float64) for x in data])
+            elif name == 'if':
+                condition = np.asarray(data[0], dtype=object)
+                condition = np.vectorize(lambda x: bool(x) and x == x, otypes=[bool])(condition)
+                result = np.where(condition, data[1], data[2])
+            elif name in ('and', 'or'):
+                # Missing values are false, as in if()
+                function = np.logical_and if name == 'and' else np.logical_or
+                truth = np.vectorize(lambda x: bool(x) and x == x, otypes=[bool])
+                result = function(*[truth(np.asarray(x, dtype=object)) for x in data])
+            elif name == 'znav':
+                result = np.nan_to_num(np.asarray(data[0], dtype=np.float64), nan=0.0)
+            else:
+                result = np.asarray(data[0], dtype=np.float64).copy()
+                for value in data[1:]:
+                    result = np.where(np.isnan(result), value, result)
+        result = np.broadcast_to(result, (len(template.data), template.data.shape[1]))
+        return template.like(np.array(result))
+
+    def _group(self, values, by, ids):
+        keys = by if isinstance(by, list) else ([by] if by is not None else [])
+        keys = [self._as_values(key, ids) for key in keys]
+        shape = values.data.shape
+        if not keys:
+            codes, labels = np.zeros(values.data.size, dtype=np.intp), [('Group',)]
+            names = []
+        else:
+            key_codes, uniques = [], []
+            for key in keys:
+                flat = np.broadcast_to(key.data, shape).ravel()
+                factor_codes, factor_uniques = pd.factorize(flat, use_na_sentinel=False)
+                key_codes.append(factor_codes)
+                uniques.append(factor_uniques)
+            combined, codes = np.unique(np.column_stack(key_codes), axis=0, return_inverse=True)
+            codes = codes.reshape(-1)
+            labels = [tuple(uniques[level][code] for level, code in enumerate(row)) for row in combined]
+            names = [key.key_name or 'GROUP_%d' % level for level, key in enumerate(keys)]
+        return _Grouped(values, codes, labels, names)
+
+    def _aggregate(self, function, value, ids):
+        if isinstance(value, _Grouped):
+            flat = np.asarray(value.values.data, dtype=np.float64).ravel()
+            order = np.argsort(value.codes, kind='mergesort')
+            starts = np.searchsorted(value.codes[order], np.arange(len(value.labels)))
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                data = np.array([function(group, axis=0) for group in np.split(flat[order], starts[1:])])
+            labels = [', '.join(str(x) for x in label) if len(label) != 1 else label[0] for label in value.labels]
+            if len(value.keys) == 1 and isinstance(labels[0], (pd.Timestamp, np.datetime64)):
+                labels = [str(pd.Timestamp(x).date()) for x in labels]
+            columns = OrderedDict((key, np.array([label[level] for label in value.labels], dtype=object).reshape(-1, 1))
+                                  for level, key in enumerate(value.keys))
+            result = _Values(labels, data.reshape(-1, 1), columns=columns, codes=value.codes)
+            result.source = value.values
+            return result
+        values = self._as_values(value, ids)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            data = function(np.asarray(values.data, dtype=np.float64), axis=1)
+        times = values.times[-1:] if values.times is not None else None
+        return _Values(values.ids, data.reshape(-1, 1), values.axis_name, times)
+
+    def _ungroup(self, value):
+        if not isinstance(value, _Values) or value.codes is None:
+            return value.values if isinstance(value, _Grouped) else value
+        source = value.source
+        data = value.data[:, 0][value.codes].reshape(source.data.shape)
+        return source.like(data)
+
+    # ------------------------------------------------------------------ execution
+
+    def _frame(self, name, values):
+        rows, times = values.data.shape
+        index = pd.Index(np.repeat(np.asarray(values.ids, dtype=object), times), name='ID')
+        columns = OrderedDict()
+        if values.axis_name is not None and values.times is not None and values.axis_name not in values.columns:
+            columns[values.axis_name] = np.tile(values.times.values, rows)
+        for column, data in values.columns.items():
+            columns[column] = np.broadcast_to(data, (rows, times)).ravel()
+        data = values.data.ravel()
+        if data.dtype == object:
+            try:
+                data = data.astype(np.float64)
+            except (TypeError, ValueError):
+                pass
+        columns[name] = data
+        frame = pd.DataFrame(columns, index=index)
+        if values.dropna:
+            frame = frame[frame[name].notna()]
+        return frame
+
+    # Define a method to execute a request and return one response item per data item
+    def execute(self, request):
+        if isinstance(request, str):
+            request = self.parser.request(request)
+        with self.lock:
+            self.executed.append(request)
+            fail = self.forced_failures > 0 or self.failures.random() < self.failure_rate
+            if self.forced_failures > 0:
+                self.forced_failures -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise ServiceError('Simulated failure of the BQL service')
+
+        ids = self.securities(request.universe)
+        response = []
+        rows = 0
+        for name, item in request.items.items():
+            frame = self._frame(name, self.evaluate(item, ids, request.with_params))
+            rows += len(frame)
+            response.append(SingleItemResponse(name, frame))
+        if self.latency_per_row:
+            time.sleep(self.latency_per_row * rows)
+        return response
@@ -0,0 +1,73 @@
+'''
+Paged Grid Data Source
+Feeds a large DataFrame to a bqwidgets DataGrid one window of rows at a time. Only
+the visible rows are formatted and sent to the front end, and new results update the
+existing grid in place instead of closing it and creating a new widget. The "More"
+button extends the window, the way scrolling to the end of the grid would.
+
+Usage:
+    grid = DataGrid(layout={'width': '700px', 'height': '200px'})
+    source = PagedGridSource(grid, page_size=100)
+    display(source.box)
+    source.set_data(factor_score)
+'''
+
+from ipywidgets import Button, HBox, Label, Layout, VBox
+
+
+# Define the default formatting of a window of rows: the index becomes a column,
+# dots in column names are replaced and numbers are rounded to 2 decimals
+def format_for_grid(frame):
+    window = frame.reset_index()
+    window.columns = [str(x).replace('.', '_') for x in window.columns.values]
+    return window.round(2)
+
+
+class PagedGridSource:
+    def __init__(self, grid, page_size=100, formatter=format_for_grid):
+        # Keep the grid widget, which is reused for every update, and the full result
+        self.grid = grid
+        self.page_size = page_size
+        self.formatter = formatter
+        self.frame = None
+        self.start = 0
+        self.stop = 0
+
+        # Create the controls to move through the rows
+        self.previous_button = Button(description='Previous', layout=Layout(width='90px'))
+        self.next_button = Button(description='Next', layout=Layout(width='90px'))
+        self.more_button = Button(description='More', layout=Layout(width='90px'))
+        self.status = Label()
+        self.previous_button.on_click(lambda sender: self.show(self.start - self.page_size))
+        self.next_button.on_click(lambda sender: self.show(self.start + self.page_size))
+        self.more_button.on_click(lambda sender: self.load_more())
+        self.controls = HBox([self.previous_button, self.next_button, self.more_button, self.status])
+        self.box = VBox([self.grid, self.controls])
+
+    # Define a method to replace the result shown in the grid, starting at the first page
+    def set_data(self, frame):
+        self.frame = frame
+        self.show(0)
+
+    # Define a method to sort the full result, not only the visible rows
+    def sort_by(self, column, ascending=True):
+        self.frame = self.frame.sort_values(column, ascending=ascending, kind='mergesort')
+        self.show(0)
+
+    # Define a method to show one page of rows starting at a given row
+    def show(self, start, stop=None):
+        if self.frame is None:
+            return
+        total = len(self.frame)
+        start = max(0, min(start, max(total - 1, 0)))
+        stop = min(total, start + self.page_size if stop is None else stop)
+        self.start, self.stop = start, stop
+        # Only the rows of the window are formatted and sent to the front end
+        self.grid.data = self.formatter(self.frame.iloc[start:stop])
+        self.previous_button.disabled = start == 0
+        self.next_button.disabled = self.more_button.disabled = stop >= total
+        self.status.value = 'Rows %d-%d of %d' % (start + 1 if total else 0, stop, total)
+
+    # Define a method to add the next page of rows to the window
+    def load_more(self):
+        self.show(self.start, self.stop + self.page_size)
@@ -0,0 +1,172 @@
+'''
+Local Grouping
+Group-by kernels and a grouping engine that computes group(), groupavg() and
+multi-level aggregations locally. The raw per-security values and the group keys,
+such as GICS_SECTOR_NAME and COUNTRY_FULL_NAME, are fetched once; every regrouping
+after that, e.g. from sector to sector x country, is computed in memory without a
+new request.
+
+Sums, means, counts and standard deviations use bincount over dense group codes,
+so they need no sorting; minimums and maximums use one sort and reduceat.
+
+Usage:
+    engine = GroupingEngine(bq, bql.Request, bq.univ.members('BE500 Index'),
+                            values={'Market Cap': bq.data.cur_mkt_cap(currency='EUR')},
+                            keys={'Sector': bq.data.gics_sector_name(),
+                                  'Country': bq.data.country_full_name()})
+    engine.aggregate('Market Cap', by='Sector', how='sum')
+    engine.pivot('Market Cap', rows='Sector', columns='Country', how='sum')
+    engine.broadcast('Market Cap', by='Sector', how='avg')     # like groupavg()
+'''
+
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from bql_toolkit.columnar import ColumnarResponse
+from bql_toolkit.combine import combined_frame
+
+# Define the aggregates that can be applied to a group
+AGGREGATES = {
+    'avg': np.nanmean, 'mean': np.nanmean, 'sum': np.nansum, 'min': np.nanmin, 'max': np.nanmax,
+    'median': np.nanmedian, 'count': lambda values, axis: np.sum(~np.isnan(values), axis=axis),
+    'std': lambda values, axis: np.nanstd(values, axis=axis, ddof=1),
+}
+
+
+# Define a function to assign a group code to every row from one or more key arrays
+def group_codes(keys, size):
+    if not keys:
+        return np.zeros(size, dtype=np.intp), [()]
+    codes = []
+    uniques = []
+    for key in keys:
+        # Categoricals are factorized from their codes, without decoding them
+        key = key if isinstance(key, pd.Categorical) else np.asarray(key)
+        key_codes, key_uniques = pd.factorize(key, use_na_sentinel=False)
+        codes.append(key_codes)
+        uniques.append(key_uniques)
+    if len(keys) == 1:
+        return codes[0], [(label,) for label in uniques[0]]
+    combined, inverse = np.unique(np.column_stack(codes), axis=0, return_inverse=True)
+    labels = [tuple(uniques[level][code] for level, code in enumerate(row)) for row in combined]
+    return inverse.reshape(-1), labels
+
+
+# Define a function to aggregate every group of the values
+def group_reduce(values, codes, count, function):
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    if function in (np.nansum, np.nanmean, AGGREGATES['count'], AGGREGATES['std']):
+        # Sums, means, counts and standard deviations use bincount, which needs no sorting
+        sums = np.bincount(codes, weights=np.where(valid, values, 0.0), minlength=count)
+        counts = np.bincount(codes, weights=valid, minlength=count)
+        if function is np.nansum:
+            return sums
+        if function is AGGREGATES['count']:
+            return counts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+            if function is np.nanmean:
+                return means
+            deviations = np.where(valid, values - means[codes], 0.0)
+            return np.sqrt(np.bincount(codes, weights=deviations * deviations, minlength=count) / (counts - 1))
+    order = np.argsort(codes, kind='mergesort')
+    starts = np.searchsorted(codes[order], np.arange(count))
+    if function in (np.nanmin, np.nanmax):
+        # Minimums and maximums reduce each run of the sorted values in one call;
+        # missing values are replaced by the identity of the reduction
+        ufunc = np.minimum if function is np.nanmin else np.maximum
+        filler = np.inf if function is np.nanmin else -np.inf
+        present = np.bincount(codes, weights=valid, minlength=count) > 0
+        reduced = ufunc.reduceat(np.where(valid, values, filler)[order], np.minimum(starts, len(values) - 1)) \
+            if len(values) else np.full(count, np.nan)
+        return np.where(present, reduced, np.nan)
+    groups = np.split(values[order], starts[1:])
+    with warnings.catch_warnings():
+        # Groups with only missing values return NaN without a warning
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.array([function(group, axis=0) if group.size else np.nan for group in groups])
+
+
+class GroupingEngine:
+    def __init__(self, bq, request_class, universe, values, keys=None, with_params=None):
+        # Keep the BQL service, the universe, the value items and the group key items,
+        # both as dictionaries of names and data items
+        self.bq = bq
+        self.request_class = request_class
+        self.universe = universe
+        self.values = OrderedDict(values)
+        self.keys = OrderedDict(keys or {})
+        self.with_params = with_params
+        self.codes = {}
+        self.fetch()
+
+    # Define a method to request the values and keys once and build the local table,
+    # with one row per ID, or per ID and date for time series and fundamentals
+    def fetch(self):
+        items = OrderedDict(self.values)
+        items.update(self.keys)
+        if self.with_params:
+            request = self.request_class(self.universe, items, with_params=self.with_params)
+        else:
+            request = self.request_class(self.universe, items)
+        response = ColumnarResponse.from_response(self.bq.execute(request), list(items))
+        self.table = combined_frame(ColumnarResponse([response[name] for name in self.values]))
+        # The group keys are per security, so they are repeated on every row of the security
+        ids = self.table.index.get_level_values('ID')
+        for name in self.keys:
+            item = response[name]
+            key = pd.Series(item.values, index=item.column('ID'))
+            self.table[name] = key[~key.index.duplicated()].reindex(ids).to_numpy()
+        self.codes.clear()
+        return self.table
+
+    # Define a method to add a derived column, from an array or a function of the table
+    def assign(self, name, values):
+        self.table[name] = values(self.table) if callable(values) else values
+        # Group codes that used the replaced column are rebuilt when they are next needed
+        self.codes = dict((by, codes) for by, codes in self.codes.items() if name not in by)
+        return self
+
+    def _column(self, name):
+        if name in self.table.columns:
+            return self.table[name].to_numpy()
+        return self.table.index.get_level_values(name).to_numpy()
+
+    # Define a method to return the group codes and labels of one or more keys; they are
+    # cached, so pivoting back to an earlier grouping costs nothing
+    def group_codes(self, by):
+        by = (by,) if isinstance(by, str) else tuple(by)
+        if by not in self.codes:
+            self.codes[by] = group_codes([self._column(name) for name in by], len(self.table))
+        return by, self.codes[by]
+
+    # Define a method to aggregate one or more values by one or more keys, like group(by).sum()
+    def aggregate(self, value, by, how='sum'):
+        by, (codes, labels) = self.group_codes(by)
+        names = [value] if isinstance(value, str) else list(value)
+        function = AGGREGATES[how]
+        data = OrderedDict((name, group_reduce(self._column(name), codes, len(labels), function)) for name in names)
+        if len(by) == 1:
+            index = pd.Index([label[0] for label in labels], name=by[0])
+        else:
+            index = pd.MultiIndex.from_tuples(labels, names=list(by))
+        frame = pd.DataFrame(data, index=index)
+        return frame[value] if isinstance(value, str) else frame
+
+    # Define a method to return the group aggregate on every row, like groupavg(by)
+    def broadcast(self, value, by, how='avg'):
+        by, (codes, labels) = self.group_codes(by)
+        reduced = group_reduce(self._column(value), codes, len(labels), AGGREGATES[how])
+        return pd.Series(reduced[codes], index=self.table.index, name=value)
+
+    # Define a method to return every value relative to its group, e.g. pe_ratio - groupavg(pe_ratio)
+    def relative(self, value, by, how='avg'):
+        return self.table[value] - self.broadcast(value, by, how)
+
+    # Define a method to aggregate by two keys and lay the result out as a table
+    def pivot(self, value, rows, columns, how='sum'):
+        return self.aggregate(value, [rows, columns], how).unstack(columns)
@@ -0,0 +1,88 @@
+'''
+Incremental Time Series Refresh
+Keeps the history of a daily field such as px_last for each security and, on each
+refresh, only requests the dates after the last stored observation plus a small
+overlap window, so that late corrections to recent bars are picked up. The cost of
+a daily refresh then scales with the number of new bars, not the length of the history.
+
+Usage:
+    prices = IncrementalSeries(bq, bql.Request, 'px_last', frq='D')
+    history = prices.refresh(['IBM US Equity', 'AAPL US Equity'], start='2015-01-01')
+    # ... the next day, only the new bars are requested
+    history = prices.refresh(['IBM US Equity', 'AAPL US Equity'], start='2015-01-01')
+'''
+
+import os
+from collections import OrderedDict
+
+import pandas as pd
+
+
+class IncrementalSeries:
+    def __init__(self, bq, request_class, field='px_last', overlap=5, path=None, **field_params):
+        # Keep the BQL service, the field to request with its parameters,
+        # and the number of business days to request again on every refresh
+        self.bq = bq
+        self.request_class = request_class
+        self.field = field
+        self.field_params = field_params
+        self.overlap = overlap
+        self.path = path
+        self.history = {}
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    # Define a method to request one date range for a group of securities
+    def _fetch(self, securities, start, end):
+        dates = self.bq.func.range(start, end)
+        item = getattr(self.bq.data, self.field)(dates=dates, **self.field_params)
+        response = self.bq.execute(self.request_class(securities, {self.field: item}))
+        frame = response[0].df().dropna(subset=[self.field])
+        frame['DATE'] = pd.to_datetime(frame['DATE'])
+        return frame
+
+    # Define a method to bring the history of the securities up to date and return it
+    def refresh(self, securities, start, end='0D'):
+        if isinstance(securities, str):
+            securities = [securities]
+
+        # Group the securities by the first date that has to be requested for them
+        groups = OrderedDict()
+        for security in securities:
+            stored = self.history.get(security)
+            if stored is None or stored.empty:
+                fetch_start = pd.Timestamp(start)
+            else:
+                fetch_start = stored['DATE'].iloc[-1] - pd.offsets.BDay(self.overlap)
+            groups.setdefault(fetch_start, []).append(security)
+
+        for fetch_start, group in groups.items():
+            fetched = self._fetch(group, fetch_start.strftime('%Y-%m-%d'), end)
+            for security, rows in fetched.groupby(level=0, sort=False):
+                stored = self.history.get(security)
+                if stored is not None:
+                    # Replace the overlap window with the newly requested rows
+                    stored = stored[stored['DATE'] < fetch_start]
+                    rows = pd.concat([stored, rows]) if not stored.empty else rows
+                self.history[security] = rows.sort_values('DATE', kind='mergesort')
+
+        if self.path is not None:
+            self.save(self.path)
+        return self.frame(securities)
+
+    # Define a method to return the stored history of the securities as one DataFrame
+    def frame(self, securities=None):
+        if securities is None:
+            securities = list(self.history)
+        frames = [self.history[security] for security in securities if security in self.history]
+        if not frames:
+            return pd.DataFrame(columns=['DATE', self.field])
+        return pd.concat(frames)
+
+    # Define methods to save and load the history as a Parquet file (requires pyarrow)
+    def save(self, path):
+        self.frame().to_parquet(path)
+
+    def load(self, path):
+        frame = pd.read_parquet(path)
+        self.history = dict((security, rows) for security, rows in frame.groupby(level=0, sort=False))
@@ -0,0 +1,137 @@
+'''
+Expression Interning
+Hash-consing for object model expressions. Factor expressions such as
+1/bq.data.tot_debt_to_ebitda() are usually rebuilt as fresh trees in every model or
+notebook cell; an ExpressionTable keeps one shared node per distinct canonical
+expression (see bql_toolkit.canonical), so semantically identical trees become the same
+object, and gives every expression a stable hash that is the same in every session.
+
+Interning works bottom-up: the children of a node are interned first, and a node whose
+children were replaced by shared ones is copied with the shared children, so the trees
+that come out of the table share every common subtree.
+
+The hash of a node is computed from its name, its options and the hashes of its
+children. It is remembered for the shared nodes of the table, so the memory used
+is bounded by the number of distinct expressions. Hashing a large factor library
+costs one step per distinct node, however often subtrees are shared.
+
+Expressions are read through the kind/args/kwargs attributes of their nodes, as built
+by bql_toolkit.fake_bql (see bql_toolkit.canonical.is_node). Item objects that do not
+expose these attributes, such as those of the bql package, cannot be taken apart into
+a tree, so interning or hashing them raises a TypeError rather than returning them
+unchanged.
+
+Usage:
+    expressions = ExpressionTable()
+    leverage = expressions.intern(1 / bq.data.tot_debt_to_ebitda())
+    expressions.intern(1 / bq.data.tot_debt_to_ebitda()) is leverage      # True
+    expressions.intern(bq.data.tot_debt_to_ebitda()) is leverage.args[1]  # True
+    expressions.digest(leverage)                                          # a stable hex string
+'''
+
+import copy
+import datetime
+import hashlib
+import numbers
+import threading
+
+from bql_toolkit.canonical import canonical_value, is_node, node_text
+
+
+class ExpressionTable:
+    def __init__(self):
+        # Keep the shared node of every digest, and the digest of every shared node; the
+        # shared nodes are kept alive by the table, so their ids cannot be reused
+        self.nodes = {}
+        self.digests = {}
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    # Define a method to return the stable hash of an expression; children are written
+    # as their own hashes, so every distinct node is only rendered once. Only the hashes
+    # of shared nodes are kept; the nodes of other trees are remembered during one call
+    def digest(self, expression):
+        _check(expression)
+        return self._digest(expression, {})
+
+    def _digest(self, expression, memo):
+        def child(value):
+            return '#' + self._digest(value, memo)
+
+        if not is_node(expression):
+            return _hash(canonical_value(expression, key=child))
+        entry = self.digests.get(id(expression))
+        if entry is not None and entry[0] is expression:
+            return entry[1]
+        digest = memo.get(id(expression))
+        if digest is None:
+            digest = memo[id(expression)] = _hash(node_text(expression, key=child))
+        return digest
+
+    # Define a method to return the shared node of an expression. The children are interned
+    # first and a node is rebuilt from its shared children, so every subtree of the result,
+    # e.g. the px_last() of a factor, is the same object in every expression of the table
+    def intern(self, expression):
+        if isinstance(expression, (list, tuple)):
+            return type(expression)(self.intern(x) for x in expression)
+        if not is_node(expression):
+            _check(expression)
+            return expression
+        entry = self.digests.get(id(expression))
+        if entry is not None and entry[0] is expression:
+            with self.lock:
+                self.hits += 1
+            return expression
+        args = tuple(self.intern(x) for x in expression.args)
+        kwargs = [(name, self.intern(value)) for name, value in expression.kwargs.items()]
+        node = expression
+        if any(new is not old for new, old in zip(args, expression.args)) \
+                or any(new is not old for (_, new), old in zip(kwargs, expression.kwargs.values())):
+            node = copy.copy(expression)
+            node.args = args
+            node.kwargs = type(expression.kwargs)(kwargs)
+        digest = self._digest(node, {})
+        with self.lock:
+            shared = self.nodes.get(digest)
+            if shared is not None:
+                self.hits += 1
+                return shared
+            self.nodes[digest] = node
+            self.digests[id(node)] = (node, digest)
+            self.misses += 1
+        return node
+
+    def __contains__(self, expression):
+        return self.digest(expression) in self.nodes
+
+    def __len__(self):
+        return len(self.nodes)
+
+    # Define a method to drop every node and hash, e.g. between factor libraries
+    def clear(self):
+        with self.lock:
+            self.nodes.clear()
+            self.digests.clear()
+
+
+# Define a function to reject values that are neither expression nodes nor plain values,
+# e.g. item objects whose children cannot be read
+def _check(value):
+    if isinstance(value, (list, tuple)):
+        for x in value:
+            _check(x)
+    elif not (value is None or is_node(value)
+              or isinstance(value, (str, numbers.Number, datetime.date))):
+        raise TypeError('Cannot intern %s: expressions are read through the kind, args and kwargs of '
+                        'their nodes, as in bql_toolkit.fake_bql' % type(value).__name__)
+
+
+# Define a function to hash canonical text into a short, stable hex string
+def _hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+# Define a function to return the stable hash of an expression without keeping a table
+def expression_hash(expression):
+    return ExpressionTable().digest(expression)
@@ -0,0 +1,229 @@
+'''
+Local Expression Evaluator
+Compiles an object model expression tree, e.g. a zscore built from bq.func.group,
+avg, std, ungroup and if_, into vectorized NumPy operations over raw data items
+that are already held locally. Once the raw fields have been fetched, a change such
+as a new winsorize limit is recomputed locally without a round trip to BQL.
+
+Each raw data item is supplied as a NumPy array keyed on its canonical expression
+(see required_fields): a 1-D array holds one value per security, and a 2-D array
+holds a time series per security, which aggregates such as avg() reduce over time.
+group() over a 2-D array groups every date of a security by the security's keys, as
+the service does, so a zscore of a time series is taken across the securities and dates
+of each group.
+Trees are read through the name/args/kwargs/kind attributes of their nodes, the form
+used by bql_toolkit.fake_bql.
+
+Usage:
+    compiled = compile_expression(winsorize(zscore(bq.data.is_eps() / bq.data.px_last()), 3))
+    compiled.fields                     # the raw data items to fetch
+    values = compiled({key: array for key, array in cached_fields.items()})
+'''
+
+import operator
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from bql_toolkit.canonical import expression_key
+from bql_toolkit.grouping import AGGREGATES, group_codes, group_reduce
+
+
+# Define the operators and element-wise functions that can be evaluated locally;
+# the aggregates and group-by kernels are shared with bql_toolkit.grouping
+OPERATORS = {
+    'plus': operator.add, 'minus': operator.sub, 'multiply': operator.mul, 'divide': operator.truediv,
+    'greater': operator.gt, 'greater_equal': operator.ge, 'less': operator.lt, 'less_equal': operator.le,
+    'equals': operator.eq, 'not_equals': operator.ne,
+}
+
+ELEMENTWISE = {
+    'abs': np.abs, 'sign': np.sign, 'floor': np.floor, 'ceil': np.ceil, 'square': np.square,
+    'sqrt': np.sqrt, 'exp': np.exp, 'ln': np.log, 'log': np.log10, 'not': np.logical_not,
+    'pow': np.power, 'mod': np.mod,
+}
+
+
+class _Grouped:
+    '''Values split into groups: the group code of every value and the group labels.'''
+
+    def __init__(self, values, codes, labels):
+        self.values = values
+        self.codes = codes
+        self.labels = labels
+
+
+class _Aggregated:
+    '''One value per group, which ungroup() broadcasts back to the securities.'''
+
+    def __init__(self, values, codes, labels, shape):
+        self.values = values
+        self.codes = codes
+        self.labels = labels
+        self.shape = shape
+
+    def ungroup(self):
+        return self.values[self.codes].reshape(self.shape)
+
+
+def _is_node(value):
+    return hasattr(value, 'kind') and hasattr(value, 'args') and hasattr(value, 'kwargs')
+
+
+# Define a function to list the raw data items an expression needs, keyed on their canonical form
+def required_fields(expression, fields=None):
+    fields = OrderedDict() if fields is None else fields
+    if _is_node(expression):
+        if expression.kind == 'data':
+            fields.setdefault(expression_key(expression), expression)
+        else:
+            for argument in list(expression.args) + list(expression.kwargs.values()):
+                required_fields(argument, fields)
+    elif isinstance(expression, (list, tuple)):
+        for argument in expression:
+            required_fields(argument, fields)
+    return fields
+
+
+class CompiledExpression:
+    '''An expression compiled into NumPy operations over locally held raw data items.'''
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.fields = required_fields(expression)
+        self.function = self._compile(expression)
+
+    # Define a method to evaluate the expression over the raw data items
+    def __call__(self, data):
+        missing = [key for key in self.fields if key not in data]
+        if missing:
+            raise KeyError('Raw data items missing for local evaluation: %s' % ', '.join(missing))
+        size = len(next(iter(data.values()))) if data else 1
+        result = self.function(data, size)
+        if isinstance(result, _Aggregated):
+            return pd.Series(result.values, index=pd.Index([label if len(label) != 1 else label[0]
+                                                             for label in result.labels]))
+        if isinstance(result, _Grouped):
+            return result.values
+        return result
+
+    def _compile(self, node):
+        if isinstance(node, (list, tuple)):
+            parts = [self._compile(x) for x in node]
+            return lambda data, size: [part(data, size) for part in parts]
+        if not _is_node(node):
+            return lambda data, size: node
+        if node.kind == 'data':
+            key = expression_key(node)
+            return lambda data, size: data[key]
+        if node.kind == 'attribute':
+            raise ValueError('Attributes such as %s are not available locally' % node)
+
+        arguments = [self._compile(x) for x in node.args]
+        keywords = dict((name, self._compile(value)) for name, value in node.kwargs.items())
+        name = node.name.lower()
+
+        if node.kind == 'operator' or name in OPERATORS:
+            function = OPERATORS[name]
+            left, right = arguments
+            return lambda data, size: _broadcast_call(function, left(data, size), right(data, size))
+        if name in ELEMENTWISE:
+            function = ELEMENTWISE[name]
+            return lambda data, size: _broadcast_call(function, *[arg(data, size) for arg in arguments])
+        if name == 'if':
+            condition, when_true, when_false = arguments
+            return lambda data, size: _broadcast_call(
+                lambda c, a, b: np.where(_truth(c), a, b),
+                condition(data, size), when_true(data, size), when_false(data, size))
+        if name == 'znav':
+            return lambda data, size: _broadcast_call(lambda x: np.nan_to_num(x, nan=0.0), arguments[0](data, size))
+        if name == 'avail':
+            return lambda data, size: _avail([arg(data, size) for arg in arguments])
+        if name in ('and', 'or'):
+            function = np.logical_and if name == 'and' else np.logical_or
+            return lambda data, size: _broadcast_call(
+                lambda *values: function(*[_truth(value) for value in values]), *[arg(data, size) for arg in arguments])
+        if name in ('dropna', 'ungroup'):
+            # Missing values are skipped by every aggregate, so dropna keeps the array as it is
+            argument = arguments[0]
+            return lambda data, size: _ungroup(argument(data, size)) if name == 'ungroup' else argument(data, size)
+        if name == 'group':
+            by = keywords.get('by', arguments[1] if len(arguments) > 1 else None)
+            return lambda data, size: _group(arguments[0](data, size), by(data, size) if by else [], size)
+        if name in AGGREGATES:
+            function = AGGREGATES[name]
+            return lambda data, size: _aggregate(function, arguments[0](data, size))
+        if name.startswith('group') and name[5:] in AGGREGATES:
+            # groupavg(by), groupsum(by), ... return the group value for every security
+            function = AGGREGATES[name[5:]]
+            by = keywords.get('by', arguments[1] if len(arguments) > 1 else None)
+            return lambda data, size: _aggregate(
+                function, _group(arguments[0](data, size), by(data, size) if by else [], size)).ungroup()
+        raise ValueError('%s() cannot be evaluated locally' % node.name)
+
+
+# Define a function to compile an expression once, so it can be evaluated many times
+def compile_expression(expression):
+    return CompiledExpression(expression)
+
+
+# Define a function to evaluate an expression once over the raw data items
+def evaluate(expression, data):
+    return compile_expression(expression)(data)
+
+
+def _ungroup(value):
+    return value.ungroup() if isinstance(value, _Aggregated) else getattr(value, 'values', value)
+
+
+def _broadcast_call(function, *values):
+    # Grouped values are broadcast back to the securities before element-wise operations
+    values = [_ungroup(value) for value in values]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return function(*values)
+
+
+# Define a function to read values as conditions, as the service does: missing values are false
+def _truth(values):
+    values = np.asarray(values)
+    if values.dtype == bool:
+        return values
+    if values.dtype.kind in 'iufc':
+        return (values == values) & (values != 0)
+    return np.vectorize(lambda x: bool(x) and x == x, otypes=[bool])(values)
+
+
+def _avail(values):
+    result = np.array(_ungroup(values[0]), dtype=np.float64)
+    for value in values[1:]:
+        result = np.where(np.isnan(result), _ungroup(value), result)
+    return result
+
+
+def _group(values, keys, size):
+    values = np.asarray(_ungroup(values))
+    if not isinstance(keys, list):
+        keys = [keys]
+    keys = [_ungroup(key) for key in keys]
+    if values.ndim == 2:
+        # A time series is grouped date by date: the keys of every security are repeated
+        # over its dates and the codes follow the flattened values
+        keys = [np.broadcast_to(np.asarray(key).reshape(len(key), -1), values.shape).ravel() for key in keys]
+        size = values.size
+    codes, labels = group_codes(keys, size)
+    return _Grouped(values, codes, labels)
+
+
+def _aggregate(function, value):
+    if isinstance(value, _Grouped):
+        reduced = group_reduce(value.values.ravel(), value.codes, len(value.labels), function)
+        return _Aggregated(reduced, value.codes, value.labels, value.values.shape)
+    value = np.asarray(value, dtype=np.float64)
+    if value.ndim == 2:
+        # A time series per security is reduced over its dates
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return function(value, axis=1)
+    return value
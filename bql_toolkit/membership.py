@@ -0,0 +1,166 @@
+'''
+Membership Cache
+Resolves universes such as bq.univ.members('INDU Index') or bq.univ.bonds('IBM US Equity')
+into their lists of security IDs once, and reuses the lists across requests in a
+session and, through a directory on disk, across sessions. Each snapshot is keyed on
+the universe and its as-of date. Snapshots pinned to a past date never change and are
+kept forever; current snapshots are refreshed after a time to live, either lazily or
+on a schedule.
+
+The IDs are held as arrays of interned strings, so a security that is a member of
+several indices or snapshots is stored once. A known list of securities can be passed
+straight to execute_chunks, the local engines or bql.Request without another round trip.
+
+Universe items of the bql package are read from their BQL text (see
+bql_toolkit.string_interface.expression_tree), both to apply an as-of date and to
+tell whether a snapshot is pinned to a past date.
+
+Usage:
+    memberships = MembershipCache(bq, bql.Request)
+    securities = memberships.resolve(bq.univ.members('SPX Index'))
+    securities_2015 = memberships.resolve(bq.univ.members('SPX Index'), as_of='2015-12-31')
+'''
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from bql_toolkit.canonical import is_node, normalize_text
+from bql_toolkit.chunking import resolve_universe
+from bql_toolkit.response_store import is_fixed_universe
+from bql_toolkit.string_interface import expression_tree
+
+
+class MembershipCache:
+    def __init__(self, bq, request_class, path=os.path.join('~', '.bql_membership'),
+                 ttl=24 * 60 * 60, clock=time.time):
+        # Keep the BQL service, the snapshot directory (None keeps snapshots in memory only)
+        # and the time to live of snapshots that are not pinned to a past date
+        self.bq = bq
+        self.request_class = request_class
+        self.path = os.path.expanduser(path) if path else None
+        self.ttl = ttl
+        self.clock = clock
+        self.snapshots = {}
+        self.universes = {}
+        self.lock = threading.Lock()
+        self.timer = None
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+
+    # Define a method to apply an as-of date to a universe function, e.g. members(index, dates=as_of);
+    # the function is built again with the service's bq.univ, from its tree or its BQL text
+    def dated(self, universe, as_of):
+        if as_of is None:
+            return universe
+        tree = universe if is_node(universe) else expression_tree(universe, universe=True)
+        if not is_node(tree) or tree.kind != 'univ':
+            raise ValueError('An as-of date can only be applied to a universe function such as members()')
+        if tree is not universe and any(is_node(x) for x in list(tree.args) + list(tree.kwargs.values())):
+            raise ValueError('An as-of date can only be applied to a bql universe function with plain '
+                             'arguments, such as members(index), not to %s' % universe)
+        kwargs = dict(tree.kwargs)
+        kwargs['dates'] = as_of
+        return getattr(self.bq.univ, tree.name)(*tree.args, **kwargs)
+
+    # Define a method to build the key of a snapshot from the universe and its as-of date
+    def key(self, universe, as_of=None):
+        return normalize_text(self.dated(universe, as_of))
+
+    # Define a method to return the IDs of a universe, from memory, disk or the service
+    def resolve(self, universe, as_of=None, refresh=False):
+        if isinstance(universe, (str, list, tuple)):
+            return _interned([universe] if isinstance(universe, str) else universe)
+        dated = self.dated(universe, as_of)
+        key = normalize_text(dated)
+        with self.lock:
+            self.universes[key] = dated
+            snapshot = None if refresh else self.snapshots.get(key)
+        if snapshot is None and not refresh:
+            snapshot = self.load(key)
+        if snapshot is None or self._expired(key, snapshot):
+            snapshot = (self.clock(), _interned(resolve_universe(self.bq, self.request_class, dated)))
+            self.save(key, snapshot)
+        with self.lock:
+            self.snapshots[key] = snapshot
+        return snapshot[1]
+
+    # Define a method to return the IDs as a list, for use as a request universe
+    def securities(self, universe, as_of=None):
+        return list(self.resolve(universe, as_of))
+
+    def _expired(self, key, snapshot):
+        # Snapshots pinned to a past date cannot change
+        if self.ttl is None or is_fixed_universe(self.universes[key]):
+            return False
+        return self.clock() - snapshot[0] > self.ttl
+
+    def _file(self, key):
+        return os.path.join(self.path, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    # Define a method to read a snapshot from disk, or return None if there is none
+    def load(self, key):
+        if not self.path:
+            return None
+        try:
+            with open(self._file(key)) as snapshot_file:
+                stored = json.load(snapshot_file)
+        except (OSError, ValueError):
+            return None
+        return stored['fetched_at'], _interned(stored['ids'])
+
+    # Define a method to write a snapshot to disk in one step
+    def save(self, key, snapshot):
+        if not self.path:
+            return
+        handle, staging = tempfile.mkstemp(dir=self.path, prefix='.staging-')
+        with os.fdopen(handle, 'w') as snapshot_file:
+            json.dump({'universe': key, 'fetched_at': snapshot[0], 'ids': list(snapshot[1])}, snapshot_file)
+        os.replace(staging, self._file(key))
+
+    # Define a method to re-resolve every snapshot of this session that has expired
+    def refresh_stale(self):
+        with self.lock:
+            stale = [key for key, snapshot in self.snapshots.items() if self._expired(key, snapshot)]
+        for key in stale:
+            self.resolve(self.universes[key], refresh=True)
+        return len(stale)
+
+    # Define a method to refresh expired snapshots in the background every `interval` seconds
+    def schedule(self, interval):
+        def run():
+            try:
+                self.refresh_stale()
+            finally:
+                if self.timer is not None:
+                    self.schedule(interval)
+        self.timer = threading.Timer(interval, run)
+        self.timer.daemon = True
+        self.timer.start()
+        return self.timer
+
+    # Define a method to stop the scheduled refresh
+    def cancel(self):
+        timer, self.timer = self.timer, None
+        if timer is not None:
+            timer.cancel()
+
+    # Define a method to drop every snapshot, in memory and on disk
+    def clear(self):
+        with self.lock:
+            self.snapshots.clear()
+        if self.path:
+            for name in os.listdir(self.path):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.path, name))
+
+
+# Define a function to hold IDs as an array of interned strings
+def _interned(ids):
+    return np.array([sys.intern(str(x)) for x in ids], dtype=object)
@@ -0,0 +1,157 @@
+'''
+Request Optimizer
+Common subexpression elimination for multi-field requests. Factor models repeat the
+same subtrees across fields, e.g. the px_last() and group() parts of every factor, so
+the request sent to BQL holds many copies of them. This pass finds the subexpressions
+that occur more than once across all of the fields of a request, by their canonical
+hash (see bql_toolkit.interning), hoists them into let(#var = ...) bindings and
+rewrites the fields to refer to the variables. The result is a string interface
+request that is shorter and lets the service evaluate each shared subtree once.
+
+A subexpression is only hoisted when that does not make the request longer, so small
+data items used twice, e.g. px_last(), stay inline.
+
+Usage:
+    text = request_text(universe, {'FCF Yield': fcf / px, 'Earnings Yield': eps / px})
+    response = execute_optimized(bq, universe, factor_items, with_params=params)
+    response[0].df()      # the response items carry the caller's names
+'''
+
+import re
+from collections import Counter, OrderedDict
+
+from bql_toolkit.batching import BatchedItem, labelled_items
+from bql_toolkit.canonical import is_node
+from bql_toolkit.interning import ExpressionTable
+
+
+# Define the BQL text of the infix operators of the object model
+OPERATOR_SYMBOLS = {
+    'plus': '+', 'minus': '-', 'multiply': '*', 'divide': '/',
+    'greater': '>', 'greater_equal': '>=', 'less': '<', 'less_equal': '<=',
+    'equals': '==', 'not_equals': '!=',
+}
+
+# Define a pattern that matches the variables created by this pass
+_VARIABLE = re.compile(r'#cse_\d+\b')
+
+
+# Define a function to render a value as BQL text; render_child renders nested values
+def to_text(value, render_child=None):
+    render_child = render_child or to_text
+    if is_node(value):
+        if value.kind == 'operator':
+            left, right = value.args
+            return '(%s%s%s)' % (render_child(left), OPERATOR_SYMBOLS[value.name], render_child(right))
+        if value.kind == 'attribute':
+            return '%s.%s' % (render_child(value.args[0]), value.args[1])
+        parts = [render_child(x) for x in value.args]
+        parts += ['%s=%s' % (name, render_child(x)) for name, x in value.kwargs.items()]
+        return '%s(%s)' % (value.name, ','.join(parts))
+    if isinstance(value, (list, tuple)):
+        return '[%s]' % ','.join(render_child(x) for x in value)
+    if isinstance(value, str):
+        return "'%s'" % value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _children(node):
+    return list(node.args) + list(node.kwargs.values())
+
+
+# Define a function to hoist the subexpressions that occur at least min_uses times across
+# the fields into variables; it returns the let() bindings and the fields as BQL text
+def hoist_common(items, min_uses=2):
+    table = ExpressionTable()
+    # Intern the fields, so that the hashes of their shared subtrees are computed once
+    items = OrderedDict((name, table.intern(item) if is_node(item) else item)
+                        for name, item in labelled_items(items).items())
+    counts = Counter()
+
+    def count(value):
+        if is_node(value):
+            counts[table.digest(value)] += 1
+            for child in _children(value):
+                count(child)
+        elif isinstance(value, (list, tuple)):
+            for child in value:
+                count(child)
+
+    for item in items.values():
+        count(item)
+    repeated = set(digest for digest, uses in counts.items() if min_uses and uses >= min_uses)
+
+    # Rewrite the fields from the top down; the first occurrence of a repeated subtree
+    # defines its variable after the variables it uses, so bindings are in dependency order
+    variables = {}
+    bindings = OrderedDict()
+
+    def rewrite(value, define=False):
+        if is_node(value) and not define:
+            digest = table.digest(value)
+            if digest in repeated:
+                if digest not in variables:
+                    body = rewrite(value, define=True)
+                    variables[digest] = '#cse_%d' % (len(variables) + 1)
+                    bindings[variables[digest]] = body
+                return variables[digest]
+        return to_text(value, rewrite)
+
+    fields = OrderedDict((name, rewrite(item)) for name, item in items.items())
+    _inline_unprofitable(bindings, fields)
+
+    # Number the remaining variables in order
+    numbers = dict((name, '#cse_%d' % (position + 1)) for position, name in enumerate(bindings))
+
+    def renumber(text):
+        return _VARIABLE.sub(lambda match: numbers[match.group()], text)
+
+    bindings = OrderedDict((numbers[name], renumber(body)) for name, body in bindings.items())
+    fields = OrderedDict((name, renumber(text)) for name, text in fields.items())
+    return bindings, fields
+
+
+# Define a function to put back the variables that do not make the request shorter, e.g.
+# a subtree that was only repeated inside one hoisted parent, until every variable pays off;
+# variables that keep the length the same are kept, as the service evaluates them once
+def _inline_unprofitable(bindings, fields):
+    while True:
+        texts = list(bindings.values()) + list(fields.values())
+        uses = Counter(match for text in texts for match in _VARIABLE.findall(text))
+        unprofitable = [name for name, body in bindings.items()
+                        if uses[name] < 2 or uses[name] * len(body) < len(body) + (uses[name] + 1) * len(name) + 2]
+        if not unprofitable:
+            return
+        name = unprofitable[-1]
+        body = bindings.pop(name)
+
+        def inline(match):
+            return body if match.group() == name else match.group()
+
+        for other in bindings:
+            bindings[other] = _VARIABLE.sub(inline, bindings[other])
+        for field in fields:
+            fields[field] = _VARIABLE.sub(inline, fields[field])
+
+
+# Define a function to build the optimized string interface request; min_uses=None
+# renders the request without hoisting, e.g. to compare payload sizes
+def request_text(universe, items, with_params=None, min_uses=2):
+    bindings, fields = hoist_common(items, min_uses)
+    text = ''
+    if bindings:
+        text += 'let(%s) ' % ''.join('%s=%s;' % binding for binding in bindings.items())
+    text += 'get(%s) for(%s)' % (','.join(fields.values()), to_text(universe))
+    if with_params:
+        text += ' with(%s)' % ','.join('%s=%s' % (name, to_text(value)) for name, value in with_params.items())
+    return text
+
+
+# Define a function to execute a request in its optimized form; the response items
+# are renamed back to the names of the caller's data items
+def execute_optimized(bq, universe, items, with_params=None, min_uses=2):
+    items = labelled_items(items)
+    response = bq.execute(request_text(universe, items, with_params, min_uses))
+    return [BatchedItem(item, name) for item, name in zip(response, items)]
@@ -0,0 +1,72 @@
+'''
+Price Panels
+Turns a time series response item, such as px_last over a date range, into a
+Date x Security panel directly. The dates and IDs are encoded once and each value is
+written straight into its cell of a dense float64 matrix, which replaces
+rename(), reset_index(), pivot() and dropna() and their copies.
+
+Usage:
+    response = bq.execute(bql.Request(universe, {'Last Price': price}))
+    panel = price_panel(response[0])
+    panel.values, panel.dates, panel.ids    # the float64 matrix and its index arrays
+    panel.frame(dropna=True)                # a DataFrame with a Date index and one column per ID
+'''
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from bql_toolkit.columnar import ColumnarItem, ColumnarResponse
+from bql_toolkit.combine import date_column, sorted_unique
+
+
+class PricePanel:
+    '''A Date x Security matrix of one field, with its dates and IDs.'''
+
+    def __init__(self, name, dates, ids, values):
+        self.name = name
+        self.dates = dates
+        self.ids = ids
+        self.values = values
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    # Define a method to keep only the dates on which every security has a value
+    def dropna(self):
+        complete = ~np.isnan(self.values).any(axis=1)
+        return PricePanel(self.name, self.dates[complete], self.ids, self.values[complete])
+
+    # Define a method to return the panel as a DataFrame, without copying the matrix
+    def frame(self, dropna=False):
+        panel = self.dropna() if dropna else self
+        return pd.DataFrame(panel.values, index=pd.DatetimeIndex(panel.dates, name='Date'),
+                            columns=pd.Index(panel.ids, name='ID'), copy=False)
+
+
+# Define a function to build the panel of one response item; name replaces the
+# generated column name, e.g. 'PX_LAST(frq=PER.D,dates=RANGE(...))'
+def price_panel(item, name=None, dropna=False):
+    if not isinstance(item, ColumnarItem):
+        item = ColumnarResponse.from_response([item])[0]
+    date_name = date_column(item)
+    if date_name is None:
+        raise ValueError('%s has no date column' % item.name)
+    day = item.columns[date_name]
+    dates = sorted_unique(day)
+    rows = np.searchsorted(dates, day)
+    values = np.full((len(dates), len(item.ids.categories)), np.nan)
+    values[rows, item.ids.codes] = item.columns[item.value_name]
+    panel = PricePanel(name or item.name, dates.view('datetime64[ns]'), item.ids.categories, values)
+    return panel.dropna() if dropna else panel
+
+
+# Define a function to build one panel per item of a response, keyed on the item names
+# or on the names given
+def price_panels(response, names=None, dropna=False):
+    if not isinstance(response, ColumnarResponse):
+        response = ColumnarResponse.from_response(response, names)
+    names = names or response.names
+    return OrderedDict((name, price_panel(item, name, dropna)) for name, item in zip(names, response))
@@ -0,0 +1,71 @@
+'''
+Scatter Plot Helpers
+Vectorized axis bounds and a downsampling step for large scatter plots. Above a
+point budget, the points are thinned to one point per cell of a grid laid over the
+chart, which keeps the shape of the cloud, while the outliers and any selected
+names are always kept.
+'''
+
+import numpy as np
+
+
+# Define a function to calculate the axis bounds of a series, padded by a tenth of its range
+def axis_bounds(values, padding=0.1):
+    values = np.asarray(values, dtype=np.float64)
+    low, high = np.nanmin(values), np.nanmax(values)
+    distance = high - low
+    return low - distance * padding, high + distance * padding
+
+
+# Define a function to pick about `budget` points to draw: the outliers of each axis,
+# the points whose positions are in `keep`, one point per cell of a grid, and an
+# even sample of the other points
+def downsample_points(x, y, budget=2000, keep=None, outliers=0.02):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    size = x.shape[0]
+    if size <= budget:
+        return np.arange(size)
+
+    # Keep the most extreme points on each axis; missing values sort last, so the
+    # extremes are taken over the points that can be drawn
+    valid = ~(np.isnan(x) | np.isnan(y))
+    positions = np.flatnonzero(valid)
+    if positions.size == 0:
+        return np.asarray(keep if keep is not None else [], dtype=np.intp)
+    count = max(1, int(budget * outliers / 4))
+    order_x = positions[np.argsort(x[positions], kind='mergesort')]
+    order_y = positions[np.argsort(y[positions], kind='mergesort')]
+    kept = [order_x[:count], order_x[-count:], order_y[:count], order_y[-count:]]
+    if keep is not None:
+        kept.append(np.asarray(keep, dtype=np.intp))
+
+    # Keep one point per cell of a grid over the chart
+    cells = int(np.sqrt(budget))
+    x_low, x_high = x[positions].min(), x[positions].max()
+    y_low, y_high = y[positions].min(), y[positions].max()
+    x_scaled = np.where(valid, (x - x_low) / ((x_high - x_low) or 1.0), 0.0)
+    y_scaled = np.where(valid, (y - y_low) / ((y_high - y_low) or 1.0), 0.0)
+    x_cell = np.clip((x_scaled * cells).astype(np.intp), 0, cells - 1)
+    y_cell = np.clip((y_scaled * cells).astype(np.intp), 0, cells - 1)
+    _, first = np.unique((x_cell * cells + y_cell)[valid], return_index=True)
+    kept.append(positions[first])
+
+    required = np.unique(np.concatenate(kept[:-1]))
+    gridded = np.union1d(required, kept[-1])
+    if gridded.size > budget:
+        # Thin the grid points evenly if the grid alone is over the budget
+        return np.union1d(required, _even_sample(np.setdiff1d(gridded, required), budget - required.size))
+    # Fill the rest of the budget evenly from the other points,
+    # so that dense areas of the chart keep their density
+    others = np.setdiff1d(positions, gridded, assume_unique=True)
+    return np.union1d(gridded, _even_sample(others, budget - gridded.size))
+
+
+# Define a function to take `count` evenly spaced positions from an array of positions
+def _even_sample(positions, count):
+    if count <= 0:
+        return positions[:0]
+    if positions.size <= count:
+        return positions
+    return positions[np.linspace(0, positions.size - 1, count).astype(np.intp)]
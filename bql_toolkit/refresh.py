@@ -0,0 +1,87 @@
+'''
+Refresh Controller
+Debounces user input and runs a fetch-and-score function on a background worker,
+so the notebook stays responsive while a large universe is being scored. Every new
+request supersedes the previous ones: a request that has not started yet is
+cancelled, and the result of a request that was already running is ignored, so only
+the latest result is applied to the chart and grid.
+
+Usage:
+    refresh = RefreshController(work=lambda u, m: get_scores(u, m, params), apply=show_scores)
+    button_update.on_click(lambda sender: refresh.request(dropdown_universe.value, dropdown_model.value))
+'''
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshController:
+    def __init__(self, work, apply, delay=0.3, on_error=None, on_busy=None):
+        # Keep the function that fetches and scores, the function that applies its result,
+        # and the time to wait for further input before starting the work
+        self.work = work
+        self.apply = apply
+        self.delay = delay
+        self.on_error = on_error
+        self.on_busy = on_busy
+        self.generation = 0
+        self.timer = None
+        self.future = None
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='refresh')
+
+    # Define a method to ask for a refresh; only the last request within the delay is run
+    def request(self, *args, **kwargs):
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self._submit, (generation, args, kwargs))
+            self.timer.daemon = True
+            self.timer.start()
+        self._busy(True)
+        return generation
+
+    # Define a method to drop every pending and running request
+    def cancel(self):
+        with self.lock:
+            self.generation += 1
+            if self.timer is not None:
+                self.timer.cancel()
+            if self.future is not None:
+                self.future.cancel()
+        self._busy(False)
+
+    def _submit(self, generation, args, kwargs):
+        with self.lock:
+            if generation != self.generation:
+                return
+            # A queued request that has not started yet is cancelled outright
+            if self.future is not None:
+                self.future.cancel()
+            self.future = self.pool.submit(self._run, generation, args, kwargs)
+
+    def _run(self, generation, args, kwargs):
+        try:
+            result = self.work(*args, **kwargs)
+            # Results of superseded requests are ignored
+            if generation == self.generation:
+                self.apply(result)
+        except Exception as error:
+            if generation == self.generation:
+                if self.on_error is not None:
+                    self.on_error(error)
+                else:
+                    logger.exception('Refresh failed')
+        finally:
+            # The busy state is always cleared, even when the work or apply fails
+            if generation == self.generation:
+                self._busy(False)
+
+    def _busy(self, busy):
+        if self.on_busy is not None:
+            self.on_busy(busy)
@@ -0,0 +1,209 @@
+'''
+Response Store
+A persistent on-disk store for BQL responses that can never change, such as
+point-in-time requests with an as_of_date in the past or date ranges that have
+ended. The dates are read from the options of the data items and the with_params;
+items that are not expression trees, such as those of the bql package, are read from
+their BQL text (see bql_toolkit.string_interface.expression_tree).
+Each response item is written as a Parquet file under a directory named after the
+canonical request, and served straight from disk in later sessions. Requests with
+relative dates ('-1Y', '0D'), without a date, or reaching into the future, e.g. a
+forward fa_period_reference without an as_of_date, are always sent to the service,
+unless a relative_ttl is given.
+
+Parquet support requires the pyarrow package.
+
+Usage:
+    store = ResponseStore(bq, bql.Request)
+    response = store.execute(security, {'Sales in Billions': sales})
+    response[0].df()
+'''
+
+import datetime
+import hashlib
+import json
+import numbers
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from bql_toolkit.batching import labelled_items
+from bql_toolkit.canonical import expression_key, is_node, params_key, universe_key
+from bql_toolkit.string_interface import expression_tree
+
+
+# Define the pattern of an absolute date, e.g. '2016-06-30'
+ABSOLUTE_DATE = re.compile(r"^\d{4}-\d{1,2}-\d{1,2}$")
+
+# Define the options that pin a data item or a universe in time
+DATE_OPTIONS = ('dates', 'fa_period_reference', 'start', 'end')
+
+
+# Define a function to read an absolute date option, or return None for a relative
+# date such as '-1Y' or anything else that moves with today
+def _absolute_date(value):
+    if isinstance(value, (datetime.date, pd.Timestamp)):
+        return pd.Timestamp(value).normalize()
+    if isinstance(value, str) and ABSOLUTE_DATE.match(value.strip()):
+        return pd.Timestamp(value.strip())
+    return None
+
+
+# Define a function to list the dates of an option value: a date, a range() or a list of dates
+def _option_dates(value):
+    if is_node(value) and str(value.name).lower() == 'range':
+        return [_absolute_date(x) for x in value.args]
+    if isinstance(value, (list, tuple)):
+        return [_absolute_date(x) for x in value]
+    return [_absolute_date(value)]
+
+
+# Define a function to decide whether the options of a data item or universe pin it in time:
+# an explicit absolute as_of_date before today, or only absolute dates that are all before
+# today. A forward period or a range that ends in the future is still changing
+def _options_fixed(options, today):
+    options = dict((str(name).lower(), value) for name, value in options.items())
+    if 'as_of_date' in options:
+        as_of = _absolute_date(options['as_of_date'])
+        return as_of is not None and as_of < today
+    dates = [date for name in DATE_OPTIONS if name in options for date in _option_dates(options[name])]
+    return bool(dates) and all(date is not None and date < today for date in dates)
+
+
+# Define a function to decide whether every data item and universe function in an
+# expression is pinned in time, using the with_params as defaults for their options
+def _expression_fixed(expression, with_params, today):
+    if isinstance(expression, (list, tuple)):
+        return all(_expression_fixed(x, with_params, today) for x in expression)
+    if not is_node(expression):
+        # Plain values, e.g. numbers and tickers, never change; other items are read from
+        # their BQL text, and text that cannot be read is never treated as fixed
+        if expression is None or isinstance(expression, (str, numbers.Number, datetime.date)):
+            return True
+        try:
+            return _expression_fixed(expression_tree(expression), with_params, today)
+        except TypeError:
+            return False
+    if expression.kind == 'data':
+        options = dict(with_params)
+        options.update(expression.kwargs)
+        return _options_fixed(options, today)
+    if expression.kind == 'univ' and str(expression.name).lower() != 'list' \
+            and not _options_fixed(expression.kwargs, today):
+        return False
+    return all(_expression_fixed(x, with_params, today)
+               for x in list(expression.args) + list(expression.kwargs.values()))
+
+
+# Define a function to decide whether a universe always resolves to the same securities:
+# a list of securities, or a universe function pinned to a past date
+def is_fixed_universe(universe, today=None):
+    today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today)
+    if universe_key(universe)[0] == 'securities':
+        return True
+    try:
+        return _expression_fixed(expression_tree(universe, universe=True), {}, today)
+    except TypeError:
+        return False
+
+
+# Define a function to decide whether a request always returns the same data: the universe
+# and every data item must be pinned to the past, on their own or through the with_params
+def is_immutable(universe, items, with_params=None, today=None):
+    today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today)
+    if not is_fixed_universe(universe, today):
+        return False
+    return all(_expression_fixed(item, with_params or {}, today) for item in items.values())
+
+
+class StoredItem:
+    '''A response item read back from the store.'''
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+    def df(self):
+        return pd.read_parquet(self.path, memory_map=True)
+
+
+class ResponseStore:
+    def __init__(self, bq, request_class, path=os.path.join('~', '.bql_response_store'),
+                 ttl=None, relative_ttl=0):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError('ResponseStore requires the pyarrow package to read and write Parquet files')
+        # Keep the BQL service, the store directory and the expiry settings:
+        # ttl applies to immutable responses (None keeps them forever) and
+        # relative_ttl to all other responses (0 never stores them)
+        self.bq = bq
+        self.request_class = request_class
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+        self.relative_ttl = relative_ttl
+        os.makedirs(self.path, exist_ok=True)
+
+    # Define a method to build the key of a request from its canonical form
+    def key(self, universe, items, with_params=None):
+        canonical = (universe_key(universe),
+                     [(name, expression_key(item)) for name, item in items.items()],
+                     params_key(with_params))
+        return hashlib.sha256(repr(canonical).encode('utf-8')).hexdigest()
+
+    # Define a method to read a stored response, or return None if it is missing or expired
+    def load(self, key, max_age):
+        directory = os.path.join(self.path, key)
+        try:
+            with open(os.path.join(directory, 'meta.json')) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if max_age is not None and time.time() - meta['stored_at'] > max_age:
+            return None
+        return [StoredItem(name, os.path.join(directory, '%d.parquet' % position))
+                for position, name in enumerate(meta['names'])]
+
+    # Define a method to write a response, replacing any previous version in one step
+    def save(self, key, response, immutable):
+        staging = tempfile.mkdtemp(dir=self.path, prefix='.staging-')
+        names = []
+        for position, item in enumerate(response):
+            item.df().to_parquet(os.path.join(staging, '%d.parquet' % position))
+            names.append(item.name)
+        with open(os.path.join(staging, 'meta.json'), 'w') as meta_file:
+            json.dump({'names': names, 'stored_at': time.time(), 'immutable': immutable}, meta_file)
+        directory = os.path.join(self.path, key)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+        return self.load(key, None)
+
+    # Define a method to execute a request, serving it from disk when possible
+    def execute(self, universe, items, with_params=None):
+        items = labelled_items(items)
+        immutable = is_immutable(universe, items, with_params)
+        max_age = self.ttl if immutable else self.relative_ttl
+        if max_age == 0:
+            return list(self.bq.execute(self._request(universe, items, with_params)))
+
+        key = self.key(universe, items, with_params)
+        stored = self.load(key, max_age)
+        if stored is not None:
+            return stored
+        response = self.bq.execute(self._request(universe, items, with_params))
+        return self.save(key, response, immutable)
+
+    # Define a method to delete every stored response
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path, exist_ok=True)
+
+    def _request(self, universe, items, with_params):
+        if with_params:
+            return self.request_class(universe, items, with_params=with_params)
+        return self.request_class(universe, items)
@@ -0,0 +1,135 @@
+'''
+Local Factor Scoring Engine
+Computes the zscore, winsorize, weighted composite score and percent rank of a
+raw factor matrix in one vectorized pass. The factor matrix is a contiguous
+NumPy array with securities as rows and factors as columns.
+'''
+
+import numpy as np
+import pandas as pd
+
+
+# Define a function to pick the raw factor columns out of a BQL response
+def response_columns(response, names):
+    columns = {}
+    for item in response:
+        frame = item.df()
+        for name in names:
+            if name in frame.columns:
+                columns[name] = frame[name]
+    missing = [name for name in names if name not in columns]
+    if missing:
+        raise KeyError('Factors missing from the response: %s' % ', '.join(missing))
+    return columns
+
+
+# Define a function to collect the raw factor columns into one contiguous
+# float64 matrix without concatenating DataFrames
+def factor_matrix(columns, names):
+    # Align on the union of the securities only when the items disagree
+    index = columns[names[0]].index
+    for name in names[1:]:
+        if not columns[name].index.equals(index):
+            index = index.union(columns[name].index)
+
+    values = np.empty((len(index), len(names)), dtype=np.float64)
+    for position, name in enumerate(names):
+        column = columns[name]
+        if not column.index.equals(index):
+            column = column.reindex(index)
+        values[:, position] = pd.to_numeric(column, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    return index, values
+
+
+# Define a function to calculate a percent rank with average ties,
+# matching pandas rank(pct=True) and returning 0 for missing values
+def percent_rank(values):
+    values = np.asarray(values, dtype=np.float64)
+    ranks = np.zeros(values.shape[0], dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(values))
+    if valid.size == 0:
+        return ranks
+    order = valid[np.argsort(values[valid], kind='mergesort')]
+    sorted_values = values[order]
+    # Find the start of each run of tied values and give the run its average rank
+    starts = np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+    counts = np.diff(np.r_[starts, sorted_values.size])
+    ranks[order] = np.repeat(starts + (counts + 1) / 2.0, counts) / valid.size
+    return ranks
+
+
+# Define a function to standardize the raw factor matrix: a zscore across the
+# universe followed by a winsorize at +/- limit, with missing values set to 0.
+# Infinite values, e.g. 1/tot_debt_to_ebitda() for a company without debt, are missing
+def standardize(values, limit=3):
+    values = np.array(values, dtype=np.float64, order='C', ndmin=2)
+    valid = np.isfinite(values)
+    count = valid.sum(axis=0)
+    filled = np.where(valid, values, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = filled.sum(axis=0) / count
+        # Sample standard deviation of the non-missing values, as BQL std() returns
+        deviation = np.where(valid, values - mean, 0.0)
+        std = np.sqrt((deviation * deviation).sum(axis=0) / (count - 1))
+        deviation /= std
+    np.clip(deviation, -limit, limit, out=deviation)
+    deviation[~valid | ~np.isfinite(deviation)] = 0.0
+    return deviation
+
+
+# Define a function to run the full scoring pass and return the standardized
+# factors, the weighted composite score and its percent rank
+def score_factors(values, weights, limit=3):
+    standardized = standardize(values, limit)
+    composite = standardized @ np.asarray(weights, dtype=np.float64)
+    return standardized, composite, percent_rank(composite)
+
+
+# Define a function to score several models at once from one standardized factor matrix:
+# the weights matrix has one row per factor and one column per model
+def score_models(standardized, weights_matrix):
+    composite = standardized @ np.asarray(weights_matrix, dtype=np.float64)
+    rank = np.column_stack([percent_rank(column) for column in composite.T]) if composite.size else composite
+    return composite, rank
+
+
+class FactorScores:
+    '''
+    The result of a scoring pass. It keeps the standardized factor matrix, so that
+    a change of weights only recomputes the composite score and its percent rank.
+    '''
+
+    def __init__(self, index, names, standardized, weights):
+        self.index = index
+        self.names = list(names)
+        self.standardized = standardized
+        self.reweight(weights)
+
+    # Define a constructor that runs the full scoring pass on a raw factor matrix
+    @classmethod
+    def from_matrix(cls, index, names, values, weights, limit=3):
+        return cls(index, names, standardize(values, limit), weights)
+
+    # Define a method to apply new factor weights, given as a list in factor order
+    # or as a dictionary with a weight for every factor name
+    def reweight(self, weights):
+        if isinstance(weights, dict):
+            unknown = [name for name in weights if name not in self.names]
+            if unknown:
+                raise KeyError('Weights given for unknown factors: %s' % ', '.join(map(str, unknown)))
+            missing = [name for name in self.names if name not in weights]
+            if missing:
+                raise KeyError('No weights given for the factors: %s' % ', '.join(missing))
+            weights = [weights[name] for name in self.names]
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.composite = self.standardized @ self.weights
+        self.rank = percent_rank(self.composite)
+        return self
+
+    # Define a method to return the scores as a DataFrame with the factors,
+    # the 'Factor Score' and the '% Rank' as columns
+    def to_frame(self):
+        frame = pd.DataFrame(self.standardized, index=self.index, columns=self.names)
+        frame['Factor Score'] = self.composite
+        frame['% Rank'] = self.rank
+        return frame
@@ -0,0 +1,109 @@
+'''
+Local Screening
+Evaluates bq.univ.filter() criteria locally. The screening fields of the base
+universe, such as cur_mkt_cap, pe_ratio and gics_sector_name, are fetched once into a
+compact columnar table: numbers as float64 arrays and text as pandas Categoricals.
+Criteria built with the object model, including and_(), or_(), comparisons and
+group-relative criteria such as pe_ratio < pe_ratio.groupavg(sector), are then
+compiled into vectorized boolean masks by bql_toolkit.local_eval. Changing a threshold
+re-runs the mask in milliseconds; only fields that have not been fetched yet cost a
+request.
+
+Criteria that are not expression trees, such as items of the bql package, are read
+from their BQL text (see bql_toolkit.string_interface.expression_tree), and their fields
+are requested as a string interface request. Criteria whose text cannot be parsed
+raise a TypeError before anything is requested.
+
+Usage:
+    screen = ScreeningEngine(bq, bql.Request, bq.univ.members('MXWO Index'))
+    criteria = bq.func.and_(bq.data.cur_mkt_cap(currency='USD') >= 50 * 10 ** 9,
+                            bq.data.pe_ratio() < bq.data.pe_ratio().groupavg(bq.data.gics_sector_name()))
+    filtered_univ = screen.screen(criteria)     # a list of IDs for follow-up requests
+'''
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from bql_toolkit.canonical import expression_key
+from bql_toolkit.columnar import ColumnarResponse, Encoded
+from bql_toolkit.local_eval import compile_expression, required_fields
+from bql_toolkit.optimizer import request_text
+from bql_toolkit.string_interface import expression_tree
+
+
+class ScreeningEngine:
+    def __init__(self, bq, request_class, universe, fields=None, with_params=None):
+        # Keep the BQL service, the base universe and the parameters of the screening fields
+        self.bq = bq
+        self.request_class = request_class
+        self.universe = universe
+        self.with_params = with_params
+        self.ids = None
+        self.columns = OrderedDict()
+        self.compiled = {}
+        if fields:
+            self.fetch(fields.values() if isinstance(fields, dict) else fields)
+
+    # Define a method to request the data items that are not in the table yet, in one request
+    def fetch(self, items):
+        items = list(items)
+        trees = expression_tree(items)
+        self._fetch(required_fields(trees), any(tree is not item for tree, item in zip(trees, items)))
+
+    def _fetch(self, fields, as_text=False):
+        missing = OrderedDict((key, item) for key, item in fields.items() if key not in self.columns)
+        if not missing:
+            return
+        if as_text:
+            # Fields read from the text of items are requested as text, as the service
+            # cannot take the trees they were read into
+            request = request_text(self.universe, missing, self.with_params, min_uses=None)
+        elif self.with_params:
+            request = self.request_class(self.universe, missing, with_params=self.with_params)
+        else:
+            request = self.request_class(self.universe, missing)
+        response = ColumnarResponse.from_response(self.bq.execute(request), list(missing))
+        if self.ids is None:
+            self.ids = pd.Index(response[0].ids.categories, name='ID')
+        for key, item in zip(missing, response):
+            self.columns[key] = self._align(item)
+
+    # Define a method to place the values of a response item on the rows of the universe;
+    # for a time series the last value of each security is kept
+    def _align(self, item):
+        rows = self.ids.get_indexer(item.ids.categories)[item.ids.codes]
+        found = rows >= 0
+        value = item.columns[item.value_name]
+        if isinstance(value, Encoded):
+            codes = np.full(len(self.ids), -1, dtype=np.int32)
+            codes[rows[found]] = value.codes[found]
+            return pd.Categorical.from_codes(codes, value.categories)
+        column = np.full(len(self.ids), np.nan)
+        column[rows[found]] = value[found]
+        return column
+
+    # Define a method to evaluate criteria as a boolean mask over the universe;
+    # compiled criteria are cached, so a repeated screen only runs the NumPy operations
+    def mask(self, criteria):
+        key = expression_key(criteria)
+        if key not in self.compiled:
+            tree = expression_tree(criteria)
+            self.compiled[key] = (compile_expression(tree), tree is not criteria)
+        compiled, as_text = self.compiled[key]
+        self._fetch(compiled.fields, as_text)
+        result = np.asarray(compiled(self.columns))
+        if result.dtype != bool:
+            # Missing values never pass a screen
+            result = np.nan_to_num(result.astype(np.float64), nan=0.0) != 0
+        return result
+
+    # Define a method to return the IDs that pass the criteria, for use as a request universe
+    def screen(self, criteria):
+        mask = self.mask(criteria)
+        return list(self.ids[mask])
+
+    # Define a method to return the screening table as a DataFrame, one column per data item
+    def table(self):
+        return pd.DataFrame(self.columns, index=self.ids)
@@ -0,0 +1,515 @@
+'''
+String Interface Parser
+Parses string interface queries such as
+    let(#date_range = RANGE(2017-06-05, 2017-06-09);)
+    get(PX_LAST(dates=#date_range), PX_HIGH(dates=#date_range))
+    for(['AAPL US Equity'])
+into the same universe, data items and with_params that the object model builds, e.g.
+bq.data.px_last(dates=bq.func.range('2017-06-05', '2017-06-09')). String and object
+model requests then share canonical keys, so they are cached, batched and deduplicated
+together.
+
+Parsed queries are compiled into plans and cached. The cache key is the query with its
+literals (strings, numbers and dates) taken out, so queries generated from one template,
+e.g. for different tickers or date ranges, are parsed once and only have their values
+substituted. Templates can also name their parameters in braces, e.g. {ticker}.
+
+Usage:
+    parser = QueryParser(bq, bql.Request)
+    request = parser.request("get(PX_LAST(dates=RANGE(-2Y,0D),per='Q')) for (['VOD LN Equity'])")
+    response = bq.execute(request)
+
+    template = "get(PX_LAST(dates=RANGE({start}, {end}))) for({universe})"
+    universe, items, with_params = parser.parts(template, start='2017-01-01', end='2017-12-31',
+                                                universe=['IBM US Equity'])
+    executor.execute_many([parser.parts(query) for query in queries])    # a BatchingExecutor
+
+Items that cannot be read as trees, such as those of the bql package, are read back from
+their BQL text by expression_tree, so the toolkit can inspect them:
+    expression_tree(bq.data.px_last(dates=bq.func.range('2017-01-01', '2017-12-31')))
+'''
+
+import datetime
+import keyword
+import numbers
+import operator
+import re
+import threading
+from collections import OrderedDict
+
+from bql_toolkit.canonical import expression_key, is_node, params_key, universe_key
+
+
+# Define the tokens of the string interface; anything else is an error
+_TOKEN = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<string>'[^']*'|"[^"]*")
+  | (?P<date>\d{4}-\d{1,2}-\d{1,2}(?![\w-]))
+  | (?P<reldate>\d+[dwmqsy](?!\w))
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?(?![\w.]))
+  | (?P<param>\{\w+\})
+  | (?P<var>\#\w+)
+  | (?P<name>[a-z_]\w*)
+  | (?P<symbol>>=|<=|==|!=|[-+*/<>=(),;.\[\]])
+  | (?P<error>.)
+''', re.VERBOSE | re.IGNORECASE)
+
+# Define the tokens that are lifted out of a query as the values of its plan
+LITERALS = ('string', 'date', 'reldate', 'number', 'option')
+
+# Define the names that are functions (bq.func) rather than data items (bq.data)
+FUNCTIONS = {
+    'range', 'avg', 'mean', 'sum', 'min', 'max', 'median', 'count', 'std', 'var', 'skew', 'kurt',
+    'product', 'wavg', 'first', 'last', 'value', 'percentile', 'rank', 'cut', 'zscore', 'winsorize',
+    'dropna', 'znav', 'avail', 'fill', 'if', 'and', 'or', 'not', 'in', 'matches', 'between',
+    'group', 'ungroup', 'groupavg', 'groupsum', 'groupmin', 'groupmax', 'groupcount', 'groupstd',
+    'groupmedian', 'grouprank', 'groupzscore', 'pct_change', 'pct_diff', 'diff', 'net', 'cumsum',
+    'cumprod', 'rolling', 'abs', 'sign', 'floor', 'ceil', 'round', 'square', 'sqrt', 'exp', 'ln',
+    'log', 'pow', 'mod', 'today', 'correlation', 'beta',
+}
+
+# Define the functions that build a universe (bq.univ) in a for() clause
+UNIVERSES = {'list', 'members', 'bonds', 'loans', 'filter', 'equitiesuniv', 'fundsuniv', 'holdings'}
+
+OPERATORS = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv,
+    '>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+    '==': operator.eq, '=': operator.eq, '!=': operator.ne,
+}
+
+
+# Define a function to split a query into tokens, each a (kind, text) pair
+def tokenize(text):
+    tokens = []
+    for match in _TOKEN.finditer(text):
+        kind = match.lastgroup
+        if kind == 'space':
+            continue
+        if kind == 'error':
+            raise ValueError('Unexpected %r at position %d of %s' % (match.group(), match.start(), text))
+        tokens.append((kind, match.group()))
+    # A bare name given as an option value, e.g. fill=prev or currency=USD, is a string
+    # rather than a data item
+    for position in range(2, len(tokens)):
+        if tokens[position][0] == 'name' and tokens[position - 1] == ('symbol', '=') \
+                and tokens[position - 2][0] == 'name' \
+                and (tokens[position + 1][1] if position + 1 < len(tokens) else '') in (',', ')'):
+            tokens[position] = ('option', tokens[position][1])
+    return tokens
+
+
+# Define a function to take the literals out of the tokens: the skeleton that is left is
+# the key of the query's plan and the literals are the values substituted into it
+def skeleton(tokens):
+    key = []
+    values = []
+    for kind, text in tokens:
+        if kind in LITERALS:
+            key.append(kind)
+            values.append(_literal_value(kind, text))
+        elif kind in ('name', 'var'):
+            key.append(text.lower())
+        else:
+            key.append(text)
+    return tuple(key), values
+
+
+def _literal_value(kind, text):
+    if kind == 'string':
+        return text[1:-1]
+    if kind == 'reldate':
+        return text.upper()
+    if kind == 'number':
+        number = float(text)
+        return int(number) if number.is_integer() and not re.search('[.e]', text, re.IGNORECASE) else number
+    if kind == 'date':
+        # Dates may be written without leading zeros, e.g. 2017-6-5; they are passed on as 2017-06-05
+        try:
+            return datetime.date(*map(int, text.split('-'))).isoformat()
+        except ValueError:
+            raise ValueError('Invalid date %s' % text)
+    return text
+
+
+class QueryPlan:
+    '''A parsed query, compiled into functions that rebuild its object model request.'''
+
+    def __init__(self, lets, fields, universe, with_params, parameters):
+        self.lets = lets
+        self.fields = fields
+        self.universe = universe
+        self.with_params = with_params
+        self.parameters = parameters
+
+    # Define a method to build the universe, data items and with_params from the values of
+    # the literals and the named parameters, without parsing the query again
+    def bind(self, bq, values=(), params=None):
+        params = params or {}
+        missing = self.parameters.difference(params)
+        if missing:
+            raise ValueError('No value was given for the parameters %s' % ', '.join(sorted(missing)))
+        variables = {}
+        for name, node in self.lets:
+            variables[name] = node(bq, values, params, variables)
+        items = OrderedDict()
+        for alias, node in self.fields:
+            item = node(bq, values, params, variables)
+            items[alias or str(item)] = item
+        universe = self.universe(bq, values, params, variables)
+        with_params = OrderedDict((name, node(bq, values, params, variables)) for name, node in self.with_params)
+        return universe, items, with_params
+
+
+class _Parser:
+    '''A recursive descent parser that compiles the tokens of one query into a QueryPlan.'''
+
+    def __init__(self, tokens, text):
+        self.tokens = tokens
+        self.text = text
+        self.position = 0
+        self.slot = 0
+        self.variables = set()
+        self.parameters = set()
+
+    def peek(self, offset=0):
+        position = self.position + offset
+        return self.tokens[position] if position < len(self.tokens) else ('end', '')
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def at(self, text):
+        kind, token = self.peek()
+        return kind in ('symbol', 'name') and token.lower() == text
+
+    def expect(self, text):
+        if not self.at(text):
+            self.error('expected %r' % text)
+        return self.take()
+
+    def error(self, message):
+        kind, token = self.peek()
+        raise ValueError('Cannot parse %s: %s, found %r' % (' '.join(self.text.split()), message, token or 'end'))
+
+    # Define the grammar of a query: let(), get(), for() and with() clauses in any order
+    def query(self):
+        lets, fields, universe, with_params = [], None, None, []
+        while self.peek()[0] != 'end':
+            kind, clause = self.take()
+            clause = clause.lower()
+            self.expect('(')
+            if clause == 'let':
+                while not self.at(')'):
+                    kind, name = self.take()
+                    if kind != 'var':
+                        self.position -= 1
+                        self.error('expected a #variable')
+                    self.expect('=')
+                    lets.append((name.lower(), self.expression()))
+                    self.variables.add(name.lower())
+                    if not self.at(')'):
+                        self.expect(';')
+            elif clause == 'get':
+                fields = self.fields()
+            elif clause == 'for':
+                universe = self.universe()
+            elif clause == 'with':
+                with_params = self.arguments()[1]
+            else:
+                self.position -= 2
+                self.error('expected a let(), get(), for() or with() clause')
+            self.expect(')')
+        if fields is None or universe is None:
+            raise ValueError('Cannot parse %s: a query needs get() and for() clauses' % ' '.join(self.text.split()))
+        return QueryPlan(lets, fields, universe, with_params, self.parameters)
+
+    def fields(self):
+        fields = []
+        while True:
+            node = self.expression()
+            alias = None
+            if self.at('as'):
+                self.take()
+                kind, alias = self.take()
+                if kind != 'var':
+                    self.position -= 1
+                    self.error('expected a #name after as')
+                alias = alias[1:]
+            fields.append((alias, node))
+            if not self.at(','):
+                return fields
+            self.take()
+
+    def universe(self):
+        kind, name = self.peek()
+        if kind == 'name' and name.lower() in UNIVERSES and self.peek(1)[1] == '(':
+            self.take()
+            self.expect('(')
+            # The first argument is itself a universe, e.g. filter(members('INDU Index'), ...)
+            first = self.universe()
+            rest, kwargs = [], []
+            if self.at(','):
+                self.take()
+                rest, kwargs = self.arguments()
+            self.expect(')')
+            return _call('univ', name.lower(), [first] + rest, kwargs)
+        return self.expression()
+
+    # Define a method to parse the arguments of a call, up to the closing parenthesis
+    def arguments(self):
+        args, kwargs = [], []
+        while not self.at(')'):
+            kind, name = self.peek()
+            if kind == 'name' and self.peek(1) == ('symbol', '='):
+                self.position += 2
+                kwargs.append((name.lower(), self.expression()))
+            else:
+                args.append(self.expression())
+            if not self.at(')'):
+                self.expect(',')
+        return args, kwargs
+
+    # Define the operators from the lowest to the highest precedence
+    def expression(self):
+        node = self.comparison()
+        while self.at('and') or self.at('or'):
+            name = self.take()[1].lower()
+            node = _call('func', name, [node, self.comparison()], [])
+        return node
+
+    def comparison(self):
+        node = self.additive()
+        while self.peek()[1] in ('>', '>=', '<', '<=', '==', '=', '!='):
+            node = _operator(self.take()[1], node, self.additive())
+        return node
+
+    def additive(self):
+        node = self.multiplicative()
+        while self.peek()[1] in ('+', '-') and self.peek()[0] == 'symbol':
+            node = _operator(self.take()[1], node, self.multiplicative())
+        return node
+
+    def multiplicative(self):
+        node = self.unary()
+        while self.peek()[1] in ('*', '/') and self.peek()[0] == 'symbol':
+            node = _operator(self.take()[1], node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek() == ('symbol', '-'):
+            self.take()
+            return _negate(self.unary())
+        if self.peek() == ('symbol', '+'):
+            self.take()
+            return self.unary()
+        return self.postfix()
+
+    def postfix(self):
+        node = self.primary()
+        while self.at('.'):
+            self.take()
+            kind, name = self.take()
+            if kind != 'name':
+                self.position -= 1
+                self.error('expected a name after .')
+            if self.at('('):
+                self.take()
+                args, kwargs = self.arguments()
+                self.expect(')')
+                node = _method(node, name.lower(), args, kwargs)
+            else:
+                node = _attribute(node, name.lower())
+        return node
+
+    def primary(self):
+        kind, text = self.peek()
+        if kind in LITERALS:
+            self.take()
+            self.slot += 1
+            return _literal(self.slot - 1)
+        if kind == 'var':
+            if text.lower() not in self.variables:
+                self.error('%s is not defined in let()' % text)
+            self.take()
+            return _variable(text.lower())
+        if kind == 'param':
+            self.take()
+            self.parameters.add(text[1:-1])
+            return _parameter(text[1:-1])
+        if text == '(':
+            self.take()
+            node = self.expression()
+            self.expect(')')
+            return node
+        if text == '[':
+            self.take()
+            elements = []
+            while not self.at(']'):
+                elements.append(self.expression())
+                if not self.at(']'):
+                    self.expect(',')
+            self.take()
+            return _list(elements)
+        if kind == 'name':
+            self.take()
+            name = text.lower()
+            namespace = 'func' if name in FUNCTIONS else 'data'
+            if not self.at('('):
+                return _call(namespace, name, [], [])
+            self.take()
+            args, kwargs = self.arguments()
+            self.expect(')')
+            return _call(namespace, name, args, kwargs)
+        self.error('expected a value')
+
+
+# Define the nodes of a plan; each one is a function of (bq, values, params, variables)
+
+def _literal(slot):
+    return lambda bq, values, params, variables: values[slot]
+
+
+def _parameter(name):
+    return lambda bq, values, params, variables: params[name]
+
+
+def _variable(name):
+    return lambda bq, values, params, variables: variables[name]
+
+
+def _list(elements):
+    return lambda bq, values, params, variables: [node(bq, values, params, variables) for node in elements]
+
+
+def _python_name(name):
+    # Names that are Python keywords, e.g. if() and and(), have a trailing underscore
+    return name + '_' if keyword.iskeyword(name) else name
+
+
+def _call(namespace, name, args, kwargs):
+    name = _python_name(name)
+
+    def call(bq, values, params, variables):
+        function = getattr(getattr(bq, namespace), name)
+        return function(*[node(bq, values, params, variables) for node in args],
+                        **dict((key, node(bq, values, params, variables)) for key, node in kwargs))
+    return call
+
+
+def _method(target, name, args, kwargs):
+    name = _python_name(name)
+
+    def method(bq, values, params, variables):
+        function = getattr(target(bq, values, params, variables), name)
+        return function(*[node(bq, values, params, variables) for node in args],
+                        **dict((key, node(bq, values, params, variables)) for key, node in kwargs))
+    return method
+
+
+def _attribute(target, name):
+    return lambda bq, values, params, variables: target(bq, values, params, variables)[name]
+
+
+def _operator(symbol, left, right):
+    function = OPERATORS[symbol]
+    return lambda bq, values, params, variables: function(left(bq, values, params, variables),
+                                                          right(bq, values, params, variables))
+
+
+def _negate(operand):
+    def negate(bq, values, params, variables):
+        value = operand(bq, values, params, variables)
+        if isinstance(value, str):
+            # A negative relative date, e.g. -2Y
+            return value[1:] if value.startswith('-') else '-' + value
+        return -value if isinstance(value, (int, float)) else -1 * value
+    return negate
+
+
+class QueryParser:
+    def __init__(self, bq, request_class, max_plans=1000):
+        # Keep the BQL service whose namespaces build the object model, and a
+        # least recently used cache of compiled plans
+        self.bq = bq
+        self.request_class = request_class
+        self.max_plans = max_plans
+        self.plans = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Define a method to return the compiled plan of a query and the values of its literals
+    def plan(self, text):
+        tokens = tokenize(text)
+        key, values = skeleton(tokens)
+        with self.lock:
+            plan = self.plans.get(key)
+            if plan is not None:
+                self.plans.move_to_end(key)
+                self.hits += 1
+                return plan, values
+        plan = _Parser(tokens, text).query()
+        with self.lock:
+            self.misses += 1
+            self.plans[key] = plan
+            while len(self.plans) > self.max_plans:
+                self.plans.popitem(last=False)
+        return plan, values
+
+    # Define a method to return the universe, data items and with_params of a query,
+    # as used by execute_chunks, BatchingExecutor and ResponseStore
+    def parts(self, text, **params):
+        plan, values = self.plan(text)
+        return plan.bind(self.bq, values, params)
+
+    # Define a method to return a query as an object model request
+    def request(self, text, **params):
+        universe, items, with_params = self.parts(text, **params)
+        if with_params:
+            return self.request_class(universe, items, with_params=with_params)
+        return self.request_class(universe, items)
+
+    # Define a method to return the canonical key of a query, which equals the key of the
+    # same request built with the object model
+    def key(self, text, **params):
+        universe, items, with_params = self.parts(text, **params)
+        return (universe_key(universe), tuple(expression_key(item) for item in items.values()),
+                params_key(with_params))
+
+
+_TREES = {}
+
+
+# Define a function to return the parser that builds expression trees from BQL text with
+# the nodes of the simulator, which only describe the expressions
+def _tree_parser():
+    parser = _TREES.get('parser')
+    if parser is None:
+        from bql_toolkit import fake_bql
+        parser = _TREES['parser'] = QueryParser(fake_bql.Service(), fake_bql.Request)
+    return parser
+
+
+# Define a function to read a value as an expression tree (see bql_toolkit.canonical.is_node).
+# Trees and plain values are returned as they are; other items, such as those of the bql
+# package, do not expose their children and are read back from their BQL text. A value
+# whose text is not a BQL expression raises a TypeError. Universes are read as the
+# argument of a for() clause
+def expression_tree(value, universe=False):
+    if isinstance(value, (list, tuple)):
+        return value if universe else [expression_tree(x) for x in value]
+    if is_node(value) or value is None or isinstance(value, (str, numbers.Number, datetime.date)):
+        return value
+    text = str(value)
+    try:
+        tree_universe, items, _ = _tree_parser().parts(
+            "get(id()) for(%s)" % text if universe else "get(%s) for('ID')" % text)
+    except ValueError as error:
+        raise TypeError('Cannot read %s as an expression: %s' % (type(value).__name__, error))
+    if universe:
+        return tree_universe
+    if len(items) != 1:
+        raise TypeError('Cannot read %s as an expression: %r is not a single expression' % (type(value).__name__, text))
+    return next(iter(items.values()))
@@ -0,0 +1,141 @@
+'''
+Stage Timing
+Opt-in instrumentation for the stages of a BQL workflow: request build, bq.execute,
+.df() conversion, concat, score/rank and render. Each stage records its wall time,
+row count and bytes. The records can be summarized, turned into a histogram,
+written as JSON lines or sent to the 'bql_toolkit.timing' logger.
+
+Timing is off by default and costs next to nothing until it is enabled.
+
+Usage:
+    from bql_toolkit.timing import timer
+    timer.enable()
+    # ... click 'Generate Scores' a few times
+    timer.summary()
+'''
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# Define a function to estimate the size in bytes of a DataFrame, Series or array
+def size_of(data):
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(index=True).sum())
+    if isinstance(data, pd.Series):
+        return int(data.memory_usage(index=True))
+    return int(getattr(data, 'nbytes', 0))
+
+
+class _Stage:
+    '''One timed stage; rows and nbytes can be set inside the with block.'''
+
+    def __init__(self, timer, name, rows, nbytes):
+        self.timer = timer
+        self.name = name
+        self.rows = rows
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.started = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.record(self.name, time.perf_counter() - self.start, self.rows, self.nbytes,
+                          self.started, exc_info[0] is None)
+        return False
+
+
+class _NullStage:
+    '''The stage used while timing is disabled: it records nothing.'''
+
+    rows = nbytes = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class StageTimer:
+    def __init__(self, enabled=False, max_records=10000, log=False):
+        # Keep the most recent records in memory; log=True also sends each one to the logger
+        self.enabled = enabled
+        self.log = log
+        self.records = deque(maxlen=max_records)
+        self.lock = threading.Lock()
+
+    def enable(self, log=None):
+        self.enabled = True
+        if log is not None:
+            self.log = log
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+    # Define a method to time a stage: with timer.stage('bq.execute') as stage: ...
+    def stage(self, name, rows=None, nbytes=None):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, rows, nbytes)
+
+    # Define a method to store one record
+    def record(self, name, seconds, rows=None, nbytes=None, started=None, ok=True):
+        entry = {'stage': name, 'seconds': seconds, 'rows': rows, 'bytes': nbytes,
+                 'started': started if started is not None else time.time(), 'ok': ok}
+        with self.lock:
+            self.records.append(entry)
+        if self.log:
+            logger.info(json.dumps(entry))
+
+    # Define a method to return the records as a DataFrame
+    def frame(self):
+        with self.lock:
+            return pd.DataFrame(list(self.records), columns=['stage', 'seconds', 'rows', 'bytes', 'started', 'ok'])
+
+    # Define a method to summarize the wall time, rows and bytes of every stage
+    def summary(self):
+        frame = self.frame()
+        grouped = frame.groupby('stage', sort=False)
+        summary = grouped['seconds'].describe(percentiles=[0.5, 0.9, 0.99])
+        summary['total'] = grouped['seconds'].sum()
+        summary['rows'] = grouped['rows'].mean()
+        summary['bytes'] = grouped['bytes'].mean()
+        return summary
+
+    # Define a method to return a histogram of the wall times of one stage
+    def histogram(self, name, bins=20):
+        frame = self.frame()
+        return np.histogram(frame.loc[frame['stage'] == name, 'seconds'].to_numpy(dtype=np.float64), bins=bins)
+
+    # Define a method to write the records as one JSON object per line
+    def export(self, path):
+        with self.lock:
+            records = list(self.records)
+        with open(path, 'w') as output:
+            for entry in records:
+                output.write(json.dumps(entry) + '\n')
+
+
+# Define the shared timer used by the toolkit and the example notebooks
+timer = StageTimer()
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# Make the bql_toolkit package in the project root importable
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bql_toolkit import fake_bql as bql
+
+
+@pytest.fixture
+def bq():
+    return bql.Service()
@@ -0,0 +1,41 @@
+import numpy as np
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.batch_scoring import model_weights, score_all, score_model
+from bql_toolkit.factor_cache import FactorCache
+
+PARAMS = {'fill': 'PREV', 'currency': 'USD'}
+
+
+def factor_model(bq):
+    return {
+        'Value Model': {
+            'P/E': {'expression': bq.data.pe_ratio(), 'weights': -1.0},
+            'Yield': {'expression': bq.data.is_eps() / bq.data.px_last(), 'weights': 0.5},
+        },
+        'Quality Model': {
+            'P/E': {'expression': bq.data.pe_ratio(), 'weights': -0.5},
+            'ROE': {'expression': bq.data.return_com_eqy(), 'weights': 1.0},
+        },
+    }
+
+
+def test_shared_factors_are_one_column(bq):
+    factors, models, weights = model_weights(factor_model(bq))
+    assert list(factors) == ['P/E', 'Yield', 'ROE']
+    assert models == ['Value Model', 'Quality Model']
+    np.testing.assert_array_equal(weights, [[-1.0, -0.5], [0.5, 0.0], [0.0, 1.0]])
+
+
+def test_score_all_matches_scoring_each_model(bq):
+    model = factor_model(bq)
+    universes = {'INDU': bq.univ.members('INDU Index'), 'SPX': bq.univ.members('SPX Index')}
+    scores = score_all(FactorCache(bq, bql.Request), universes, model, PARAMS)
+    assert bq.calls == 2
+    for universe_name, universe in universes.items():
+        for model_name, model_factors in model.items():
+            expected = score_model(FactorCache(bq, bql.Request), universe, model_factors, PARAMS).to_frame()
+            rows = scores[(scores['Universe'] == universe_name) & (scores['Model'] == model_name)]
+            assert list(rows['ID']) == list(expected.index)
+            np.testing.assert_allclose(rows['Factor Score'], expected['Factor Score'])
+            np.testing.assert_allclose(rows['% Rank'], expected['% Rank'])
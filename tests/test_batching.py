@@ -0,0 +1,59 @@
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.batching import BatchingExecutor
+
+UNIVERSE = ['IBM US Equity', 'AAPL US Equity']
+
+
+def executor(bq, **kwargs):
+    return BatchingExecutor(bq, bql.Request, window=None, **kwargs)
+
+
+def test_requests_for_one_universe_are_merged(bq):
+    batcher = executor(bq)
+    sales, assets = batcher.execute_many([
+        (UNIVERSE, {'Sales': bq.data.sales_rev_turn()}),
+        (UNIVERSE, {'Assets': bq.data.bs_tot_asset()}),
+    ])
+    assert bq.calls == 1
+    assert batcher.round_trips == 1
+    assert 'Sales' in sales[0].df().columns
+    assert 'Assets' in assets[0].df().columns
+
+
+def test_duplicate_items_are_sent_once(bq):
+    batcher = executor(bq)
+    first, second = batcher.execute_many([
+        (UNIVERSE, {'Price': bq.data.px_last()}),
+        (UNIVERSE, {'Last': bq.data.px_last(), 'High': bq.data.px_high()}),
+    ])
+    assert len(bq.executed[-1].items) == 2
+    assert first[0].df()['Price'].equals(second[0].df()['Last'])
+
+
+def test_different_universes_are_not_merged(bq):
+    executor(bq).execute_many([
+        (['IBM US Equity'], {'Price': bq.data.px_last()}),
+        (['AAPL US Equity'], {'Price': bq.data.px_last()}),
+    ])
+    assert bq.calls == 2
+
+
+def test_failed_merge_falls_back_to_single_requests(bq):
+    batcher = executor(bq)
+    bq.fail_next()
+    sales, assets = batcher.execute_many([
+        (UNIVERSE, {'Sales': bq.data.sales_rev_turn()}),
+        (UNIVERSE, {'Assets': bq.data.bs_tot_asset()}),
+    ])
+    assert bq.calls == 3
+    assert batcher.round_trips == 3
+    assert 'Sales' in sales[0].df().columns
+    assert 'Assets' in assets[0].df().columns
+
+
+def test_merged_requests_are_limited_by_data_items(bq):
+    batcher = executor(bq, max_items=3)
+    fields = ['px_last', 'px_high', 'px_low', 'px_open', 'px_volume']
+    batcher.execute_many([(UNIVERSE, {name: getattr(bq.data, name)()}) for name in fields])
+    assert [len(request.items) for request in bq.executed] == [3, 2]
+    assert batcher.round_trips == 2
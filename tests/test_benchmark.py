@@ -0,0 +1,20 @@
+import pytest
+
+from bql_toolkit.benchmark import BENCHMARKS, make_service, run_cell
+
+
+@pytest.mark.parametrize('name', list(BENCHMARKS))
+def test_benchmarks_run_the_script_cells(name):
+    benchmark, uses_history = BENCHMARKS[name]
+    assert benchmark(make_service(30), 1 if uses_history else None) >= 0
+
+
+def test_cells_use_the_scripts_definitions():
+    bq = make_service(30)
+    cell = run_cell(bq, 'BQuant_Factor_Scoring/Factor_Scoring_Workflow.py', '# Define the limit used to winsorize',
+                    '#2.2 Visualization Class')
+    assert cell['model_list'] == ['Value Model', 'Growth Model']
+    assert cell['params'] == {'dates': '-1Y', 'fill': 'PREV', 'Currency': 'USD'}
+    cell = run_cell(bq, 'BQuant_Intro_and_Quick_Example.py', '# Define a list of securities', '# Define the date range',
+                    universe=['IBM US Equity'])
+    assert cell['universe'] == ['IBM US Equity']
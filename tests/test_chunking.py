@@ -0,0 +1,61 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.chunking import execute_chunks, resolve_universe
+
+
+class Counting:
+    '''Wraps a service and records the largest number of requests in flight at once.'''
+
+    def __init__(self, bq):
+        self.bq = bq
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def execute(self, request):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            return self.bq.execute(request)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def test_universes_resolve_to_ids(bq):
+    assert resolve_universe(bq, bql.Request, 'IBM US Equity') == ['IBM US Equity']
+    securities = resolve_universe(bq, bql.Request, bq.univ.members('SPX Index'))
+    assert len(securities) == len(set(securities)) > 0
+    assert bq.calls == 1
+
+
+def test_chunks_match_one_request(bq):
+    universe = bq.univ.members('SPX Index')
+    items = {'Price': bq.data.px_last(fill='prev'), 'Sector': bq.data.gics_sector_name()}
+    securities = resolve_universe(bq, bql.Request, universe)
+    frames = list(execute_chunks(bq, bql.Request, securities, items, chunk_size=30, max_workers=3))
+    assert len(frames) == -(-len(securities) // 30)
+    response = bq.execute(bql.Request(universe, items))
+    expected = pd.concat([item.df() for item in response], axis=1)
+    result = pd.concat(frames).loc[expected.index]
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_requests_in_flight_are_bounded():
+    bq = Counting(bql.Service(latency=0.01))
+    securities = ['SEC%d US Equity' % number for number in range(40)]
+    frames = list(execute_chunks(bq, bql.Request, securities, {'Price': bq.bq.data.px_last()},
+                                 chunk_size=4, max_workers=3))
+    assert len(frames) == 10
+    assert bq.peak <= 3
+
+
+def test_failures_are_raised(bq):
+    bq.fail_next()
+    with pytest.raises(bql.ServiceError):
+        list(execute_chunks(bq, bql.Request, ['IBM US Equity'], {'Price': bq.data.px_last()}))
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.columnar import ColumnarResponse, Encoded, encode_column
+
+
+@pytest.fixture
+def response(bq):
+    dates = bq.func.range('2018-01-01', '2018-03-30')
+    items = {'Last Price': bq.data.px_last(dates=dates, frq='D'), 'High': bq.data.px_high(dates=dates, frq='D'),
+             'Sector': bq.data.gics_sector_name()}
+    return bq.execute(bql.Request(bq.univ.members('INDU Index'), items))
+
+
+def test_items_convert_back_to_the_same_frames(response):
+    columnar = ColumnarResponse.from_response(response)
+    assert columnar.names == ['Last Price', 'High', 'Sector']
+    for item in response:
+        # Dates come back as datetime64[ns], whatever resolution the response used
+        pd.testing.assert_frame_equal(columnar[item.name].df(), item.df(), check_dtype=False)
+    frame = columnar['Sector'].df(categorical=True)
+    assert isinstance(frame.index, pd.CategoricalIndex)
+    assert list(frame['Sector'].astype(object)) == list(response[2].df()['Sector'])
+
+
+def test_identical_columns_are_stored_once(response):
+    columnar = ColumnarResponse.from_response(response)
+    price, high = columnar['Last Price'], columnar['High']
+    assert price.ids is high.ids
+    assert price.columns['DATE'] is high.columns['DATE']
+    separate = sum(ColumnarResponse.from_response([item]).nbytes for item in response)
+    assert columnar.nbytes < separate
+
+
+def test_columns_are_read_only_views(response):
+    item = ColumnarResponse.from_response(response)['Last Price']
+    assert np.shares_memory(item.values, item.columns['Last Price'])
+    with pytest.raises(ValueError):
+        item.values[0] = 0.0
+    assert item.dates().dtype == np.dtype('datetime64[ns]')
+
+
+def test_missing_text_is_encoded_as_minus_one():
+    column = encode_column(pd.Series(['a', None, 'b', 'a']))
+    assert isinstance(column, Encoded)
+    assert list(column.codes) == [0, -1, 1, 0]
+    assert list(column.decode()) == ['a', None, 'b', 'a']
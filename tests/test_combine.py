@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.combine import combined_frame
+
+
+def test_combined_frame_matches_concat(bq):
+    dates = bq.func.range('2017-06-01', '2017-06-30')
+    items = {'Last': bq.data.px_last(dates=dates), 'High': bq.data.px_high(dates=dates),
+             'Low': bq.data.px_low(dates=dates)}
+    response = bq.execute(bql.Request(['AAPL US Equity', 'IBM US Equity'], items))
+    expected = pd.concat([item.df().set_index('DATE', append=True)[item.name] for item in response], axis=1)
+    combined = combined_frame(response)
+    assert list(combined.columns) == list(items)
+    assert len(combined) == len(expected)
+    np.testing.assert_array_equal(combined.reindex(expected.index).to_numpy(), expected.to_numpy())
@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.concurrency import AsyncExecutor
+
+
+def requests(bq):
+    return [bql.Request([security], {'Price': bq.data.px_last()})
+            for security in ['IBM US Equity', 'AAPL US Equity', 'MSFT US Equity', 'GE US Equity']]
+
+
+def test_responses_are_in_request_order(bq):
+    with AsyncExecutor(bq) as executor:
+        responses = asyncio.run(executor.gather(requests(bq)))
+        assert [response[0].df().index[0] for response in responses] == \
+            ['IBM US Equity', 'AAPL US Equity', 'MSFT US Equity', 'GE US Equity']
+        assert [response[0].df().equals(expected[0].df()) for response, expected in
+                zip(executor.execute_all(requests(bq)), responses)] == [True] * 4
+
+
+def test_requests_run_concurrently():
+    bq = bql.Service(latency=0.1)
+    with AsyncExecutor(bq, max_concurrency=4) as executor:
+        start = time.perf_counter()
+        executor.execute_all(requests(bq))
+        assert time.perf_counter() - start < 0.3
+
+
+def test_failures_can_be_returned(bq):
+    bq.fail_next()
+    with AsyncExecutor(bq, max_concurrency=1) as executor:
+        responses = asyncio.run(executor.gather(requests(bq), return_exceptions=True))
+    assert isinstance(responses[0], bql.ServiceError)
+    assert all(isinstance(response, list) for response in responses[1:])
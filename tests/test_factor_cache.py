@@ -0,0 +1,64 @@
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.factor_cache import FactorCache
+
+UNIVERSE = ['IBM US Equity', 'AAPL US Equity', 'MSFT US Equity']
+PARAMS = {'fill': 'PREV', 'currency': 'USD'}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_factors_shared_by_models_are_fetched_once(bq):
+    cache = FactorCache(bq, bql.Request)
+    value = cache.fetch(UNIVERSE, {'P/E': bq.data.pe_ratio(), 'P/B': bq.data.px_to_book_ratio()}, PARAMS)
+    growth = cache.fetch(UNIVERSE, {'PE Ratio': bq.data.PE_RATIO(), 'EPS': bq.data.is_eps()}, PARAMS)
+    assert bq.calls == 2
+    assert len(bq.executed[-1].items) == 1
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert growth['PE Ratio'].equals(value['P/E'].rename('PE Ratio'))
+    assert list(growth) == ['PE Ratio', 'EPS']
+
+
+def test_columns_match_a_direct_request(bq):
+    factors = {'P/E': bq.data.pe_ratio(), 'Same P/E': bq.data.pe_ratio(), 'EPS': bq.data.is_eps()}
+    columns = FactorCache(bq, bql.Request).fetch(UNIVERSE, factors, PARAMS)
+    assert len(bq.executed[-1].items) == 2
+    response = bq.execute(bql.Request(UNIVERSE, {'P/E': bq.data.pe_ratio(), 'EPS': bq.data.is_eps()},
+                                      with_params=PARAMS))
+    for item in response:
+        assert columns[item.name].equals(item.df()[item.name])
+    assert columns['Same P/E'].equals(columns['P/E'].rename('Same P/E'))
+
+
+def test_universes_and_params_are_kept_apart(bq):
+    cache = FactorCache(bq, bql.Request)
+    cache.fetch(UNIVERSE, {'P/E': bq.data.pe_ratio()}, PARAMS)
+    cache.fetch(UNIVERSE[:2], {'P/E': bq.data.pe_ratio()}, PARAMS)
+    cache.fetch(UNIVERSE, {'P/E': bq.data.pe_ratio()}, {'fill': 'PREV', 'currency': 'EUR'})
+    assert bq.calls == 3
+
+
+def test_entries_expire_and_are_evicted(bq):
+    clock = Clock()
+    cache = FactorCache(bq, bql.Request, ttl=60, max_entries=2, clock=clock)
+    cache.fetch(UNIVERSE, {'P/E': bq.data.pe_ratio()})
+    clock.now = 61
+    cache.fetch(UNIVERSE, {'P/E': bq.data.pe_ratio()})
+    assert bq.calls == 2
+    cache.fetch(UNIVERSE, {'EPS': bq.data.is_eps(), 'P/B': bq.data.px_to_book_ratio()})
+    assert len(cache.entries) == 2
+    cache.fetch(UNIVERSE, {'P/E': bq.data.pe_ratio()})
+    assert bq.calls == 4
+
+
+def test_optimized_requests_return_the_same_columns(bq):
+    factors = {'Yield': 1 / bq.data.pe_ratio(), 'Margin': bq.data.is_eps() / bq.data.pe_ratio()}
+    plain = FactorCache(bq, bql.Request).fetch(UNIVERSE, factors, PARAMS)
+    optimized = FactorCache(bq, bql.Request, optimize=True).fetch(UNIVERSE, factors, PARAMS)
+    for name in factors:
+        assert optimized[name].equals(plain[name])
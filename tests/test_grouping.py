@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.grouping import GroupingEngine, group_codes
+
+
+@pytest.fixture
+def items(bq):
+    return {
+        'universe': bq.univ.members('BE500 Index'),
+        'cap': bq.data.cur_mkt_cap(currency='EUR'),
+        'sector': bq.data.gics_sector_name(),
+        'country': bq.data.country_full_name(),
+    }
+
+
+@pytest.fixture
+def engine(bq, items):
+    return GroupingEngine(bq, bql.Request, items['universe'], values={'Market Cap': items['cap']},
+                          keys={'Sector': items['sector'], 'Country': items['country']})
+
+
+def service_values(bq, items, expression):
+    frame = bq.execute(bql.Request(items['universe'], {'Value': expression}))[0].df()
+    return frame['Value']
+
+
+def test_group_codes_follow_the_keys():
+    codes, labels = group_codes([np.array(['a', 'b', 'a']), np.array([1, 1, 1])], 3)
+    assert [labels[code] for code in codes] == [('a', 1), ('b', 1), ('a', 1)]
+    codes, labels = group_codes([], 3)
+    assert list(codes) == [0, 0, 0] and labels == [()]
+
+
+def test_aggregates_match_the_service(bq, items, engine):
+    for how in ('sum', 'avg', 'max', 'count'):
+        expected = service_values(bq, items, getattr(items['cap'].group(items['sector']), how)())
+        result = engine.aggregate('Market Cap', by='Sector', how=how)
+        np.testing.assert_allclose(result.reindex(expected.index), expected)
+
+
+def test_two_keys_match_the_service(bq, items, engine):
+    expected = service_values(bq, items, bq.func.group(items['cap'], [items['sector'], items['country']]).avg())
+    result = engine.aggregate('Market Cap', by=['Sector', 'Country'], how='avg')
+    assert len(result) == len(expected)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy())
+
+
+def test_broadcast_matches_groupavg(bq, items, engine):
+    expected = service_values(bq, items, items['cap'].groupavg(items['sector']))
+    result = engine.broadcast('Market Cap', by='Sector').droplevel('DATE')
+    np.testing.assert_allclose(result.reindex(expected.index), expected)
+
+
+def test_regrouping_sends_no_request(bq, engine):
+    engine.aggregate('Market Cap', by='Sector')
+    engine.pivot('Market Cap', rows='Sector', columns='Country', how='sum')
+    engine.relative('Market Cap', by='Country')
+    assert bq.calls == 1
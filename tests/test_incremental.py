@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.incremental import IncrementalSeries
+
+UNIVERSE = ['IBM US Equity', 'AAPL US Equity']
+
+
+def series(bq, **kwargs):
+    return IncrementalSeries(bq, bql.Request, 'px_last', frq='D', **kwargs)
+
+
+def test_refresh_requests_only_the_new_bars(bq):
+    prices = series(bq)
+    prices.refresh(UNIVERSE, start='2018-01-01', end='2018-06-29')
+    history = prices.refresh(UNIVERSE, start='2018-01-01', end='2018-12-31')
+    dates = bq.executed[-1].items['px_last'].kwargs['dates']
+    assert dates.args == ('2018-06-22', '2018-12-31')
+    assert history.equals(series(bq).refresh(UNIVERSE, start='2018-01-01', end='2018-12-31'))
+
+
+def test_new_securities_are_requested_from_the_start(bq):
+    prices = series(bq)
+    prices.refresh(UNIVERSE[:1], start='2018-01-01', end='2018-06-29')
+    history = prices.refresh(UNIVERSE, start='2018-01-01', end='2018-06-29')
+    assert bq.calls == 3
+    assert history.loc['AAPL US Equity', 'DATE'].iloc[0] == pd.Timestamp('2018-01-01')
+    assert history.equals(series(bq).refresh(UNIVERSE, start='2018-01-01', end='2018-06-29'))
+
+
+def test_history_is_saved_and_loaded(bq, tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'px_last.parquet')
+    history = series(bq, path=path).refresh(UNIVERSE, start='2018-01-01', end='2018-06-29')
+    assert series(bq, path=path).frame(UNIVERSE).equals(history)
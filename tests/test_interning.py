@@ -0,0 +1,48 @@
+import datetime
+
+import pytest
+
+from bql_toolkit.canonical import expression_key, params_key
+from bql_toolkit.interning import ExpressionTable, expression_hash
+
+
+def test_canonical_keys_ignore_spelling(bq):
+    first = bq.data.px_last(dates=bq.func.range('2017-6-5', '2017-06-09'), per='q')
+    second = bq.data.PX_LAST(per='Q', dates=bq.func.range(datetime.date(2017, 6, 5), '2017-06-09'))
+    assert expression_key(first) == expression_key(second)
+    assert params_key({'Currency': 'usd', 'dates': '-1y'}) == params_key({'dates': '-1Y', 'currency': 'USD'})
+    assert expression_key(bq.data.px_last(dates='-1Y')) != expression_key(bq.data.px_last(dates='-2Y'))
+
+
+def test_equal_expressions_are_one_shared_node(bq):
+    expressions = ExpressionTable()
+    leverage = expressions.intern(1 / bq.data.tot_debt_to_ebitda())
+    assert expressions.intern(1 / bq.data.tot_debt_to_ebitda()) is leverage
+    assert expressions.intern(bq.data.tot_debt_to_ebitda()) is leverage.args[1]
+
+
+def test_subtrees_are_shared_across_expressions(bq):
+    expressions = ExpressionTable()
+    fcf_yield = expressions.intern(bq.data.cf_free_cash_flow() / bq.data.px_last())
+    earnings_yield = expressions.intern(bq.data.is_eps() / bq.data.px_last())
+    assert earnings_yield.args[1] is fcf_yield.args[1]
+    assert fcf_yield.args[1] is expressions.intern(bq.data.px_last())
+    assert len(expressions) == 5
+
+
+def test_digests_are_stable_and_bounded(bq):
+    expressions = ExpressionTable()
+    leverage = expressions.intern(1 / bq.data.tot_debt_to_ebitda())
+    assert expressions.digest(leverage) == expression_hash(1 / bq.data.tot_debt_to_ebitda())
+    assert expressions.digest(leverage) != expression_hash(2 / bq.data.tot_debt_to_ebitda())
+    for days in range(100):
+        expressions.digest(bq.data.px_last(dates='-%dD' % days))
+    assert len(expressions.digests) == len(expressions.nodes) == 2
+
+
+def test_items_that_cannot_be_read_raise(bq):
+    expressions = ExpressionTable()
+    with pytest.raises(TypeError):
+        expressions.intern(object())
+    with pytest.raises(TypeError):
+        expressions.digest(object())
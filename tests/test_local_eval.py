@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.local_eval import compile_expression
+
+
+def zscore(bq, factor):
+    group = bq.func.group(factor)
+    avg = bq.func.ungroup(bq.func.avg(bq.func.dropna(group)))
+    std = bq.func.ungroup(bq.func.std(bq.func.dropna(group)))
+    return (factor - avg) / std
+
+
+def test_zscore_matches_the_service(bq):
+    factor = bq.data.is_eps() / bq.data.px_last()
+    universe = bq.univ.members('INDU Index')
+    compiled = compile_expression(zscore(bq, factor))
+    response = bq.execute(bql.Request(universe, dict(compiled.fields, Score=zscore(bq, factor))))
+    data = dict((item.name, item.df()[item.name].to_numpy(dtype=np.float64)) for item in response[:-1])
+    np.testing.assert_allclose(compiled(data), response[-1].df()['Score'].to_numpy())
+
+
+def test_time_series_are_grouped_date_by_date(bq):
+    price = bq.data.px_last(dates=bq.func.range('2018-01-01', '2018-01-10'))
+    universe = ['IBM US Equity', 'AAPL US Equity', 'MSFT US Equity']
+    compiled = compile_expression(zscore(bq, price))
+    raw, score = [item.df() for item in bq.execute(bql.Request(universe, {'Raw': price, 'Score': zscore(bq, price)}))]
+    values = raw['Raw'].to_numpy().reshape(len(universe), -1)
+    result = compiled({list(compiled.fields)[0]: values})
+    assert result.shape == values.shape
+    np.testing.assert_allclose(result.ravel(), score['Score'].to_numpy())
+
+
+def test_missing_conditions_are_false(bq):
+    eps = bq.data.is_eps()
+    missing = (eps - eps) / (eps - eps)
+    universe = ['IBM US Equity', 'AAPL US Equity']
+    expressions = {'If': bq.func.if_(missing, 1, 0), 'And': bq.func.and_(missing, eps == eps),
+                   'Or': bq.func.or_(missing, eps != eps)}
+    response = bq.execute(bql.Request(universe, dict(expressions, EPS=eps)))
+    data = {'is_eps()': response[-1].df()['EPS'].to_numpy(dtype=np.float64)}
+    for item in response[:-1]:
+        local = np.asarray(compile_expression(expressions[item.name])(data), dtype=np.float64)
+        np.testing.assert_array_equal(local, item.df()[item.name].to_numpy(dtype=np.float64))
+        assert not local.any()
+
+
+def test_unsupported_functions_raise_value_error(bq):
+    with pytest.raises(ValueError):
+        compile_expression(bq.func.pct_change(bq.data.px_last()))
@@ -0,0 +1,58 @@
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.membership import MembershipCache
+
+
+class TextItem:
+    '''An item that only exposes its BQL text, as the items of the bql package do.'''
+
+    def __init__(self, item):
+        self.text = str(item)
+
+    def __str__(self):
+        return self.text
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_snapshots_are_reused_in_memory_and_on_disk(bq, tmp_path):
+    universe = bq.univ.members('INDU Index')
+    memberships = MembershipCache(bq, bql.Request, path=str(tmp_path))
+    securities = memberships.resolve(universe)
+    assert len(securities) == 30
+    memberships.resolve(universe)
+    assert bq.calls == 1
+    again = MembershipCache(bq, bql.Request, path=str(tmp_path)).resolve(universe)
+    assert bq.calls == 1
+    assert list(again) == list(securities)
+    assert again[0] is securities[0]
+
+
+def test_current_snapshots_expire_and_dated_snapshots_do_not(bq):
+    clock = Clock()
+    memberships = MembershipCache(bq, bql.Request, path=None, ttl=60, clock=clock)
+    universe = bq.univ.members('INDU Index')
+    memberships.resolve(universe)
+    memberships.resolve(universe, as_of='2015-12-31')
+    assert bq.calls == 2
+    clock.now += 120
+    assert memberships.refresh_stale() == 1
+    memberships.resolve(universe, as_of='2015-12-31')
+    assert bq.calls == 3
+
+
+def test_as_of_dates_apply_to_universes_read_from_text(bq):
+    clock = Clock()
+    memberships = MembershipCache(bq, bql.Request, path=None, ttl=60, clock=clock)
+    universe = TextItem(bq.univ.members('INDU Index'))
+    dated = memberships.dated(universe, '2015-12-31')
+    assert str(dated) == str(bq.univ.members('INDU Index', dates='2015-12-31'))
+    memberships.resolve(universe, as_of='2015-12-31')
+    clock.now += 120
+    memberships.resolve(universe, as_of='2015-12-31')
+    assert bq.calls == 1
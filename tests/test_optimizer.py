@@ -0,0 +1,47 @@
+import numpy as np
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.optimizer import execute_optimized, hoist_common, request_text
+
+PARAMS = {'fill': 'PREV', 'currency': 'USD'}
+
+
+def zscore(bq, factor):
+    group = bq.func.group(factor)
+    avg = bq.func.ungroup(bq.func.avg(bq.func.dropna(group)))
+    std = bq.func.ungroup(bq.func.std(bq.func.dropna(group)))
+    return (factor - avg) / std
+
+
+def factors(bq):
+    price = bq.data.px_last(fill='prev')
+    return {
+        'Earnings Yield': zscore(bq, bq.data.is_eps() / price),
+        'FCF Yield': zscore(bq, bq.data.cf_free_cash_flow() / price),
+        'Sales Yield': zscore(bq, bq.data.sales_rev_turn() / price),
+    }
+
+
+def test_repeated_subtrees_are_hoisted(bq):
+    bindings, fields = hoist_common(factors(bq))
+    assert bindings['#cse_1'] == "px_last(fill='prev')"
+    assert bindings['#cse_2'] == '(is_eps()/#cse_1)'
+    assert fields['Earnings Yield'].count('#cse_2') == 3
+    assert len(request_text('SPX Index', factors(bq))) < len(request_text('SPX Index', factors(bq), min_uses=None))
+
+
+def test_small_items_stay_inline(bq):
+    bindings, fields = hoist_common({'A': bq.data.px_last() + 1, 'B': bq.data.px_last() * 2})
+    assert not bindings
+    assert fields == {'A': '(px_last()+1)', 'B': '(px_last()*2)'}
+
+
+def test_optimized_request_matches_the_object_model_request(bq):
+    universe = bq.univ.members('SPX Index')
+    optimized = execute_optimized(bq, universe, factors(bq), with_params=PARAMS)
+    expected = bq.execute(bql.Request(universe, factors(bq), with_params=PARAMS))
+    assert [item.name for item in optimized] == [item.name for item in expected]
+    for item, reference in zip(optimized, expected):
+        frame, reference = item.df(), reference.df()
+        assert list(frame.index) == list(reference.index)
+        np.testing.assert_allclose(frame[item.name], reference[item.name])
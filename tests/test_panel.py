@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.panel import price_panel, price_panels
+
+
+@pytest.fixture
+def response(bq):
+    dates = bq.func.range('2018-01-01', '2018-03-30')
+    items = {'Last Price': bq.data.px_last(dates=dates, frq='D'), 'Volume': bq.data.px_volume(dates=dates, frq='D')}
+    return bq.execute(bql.Request(bq.univ.members('INDU Index'), items))
+
+
+def pivoted(item, dropna=False):
+    # The panel as the notebooks built it, with reset_index() and pivot()
+    frame = item.df().reset_index().pivot(index='DATE', columns='ID', values=item.name)
+    return frame.dropna() if dropna else frame
+
+
+def test_panel_matches_a_pivot(response):
+    for dropna in (False, True):
+        panel = price_panel(response[0], dropna=dropna)
+        expected = pivoted(response[0], dropna)
+        frame = panel.frame()[expected.columns]
+        assert panel.shape == expected.shape
+        np.testing.assert_array_equal(frame.index.to_numpy(), expected.index.to_numpy(dtype='datetime64[ns]'))
+        np.testing.assert_array_equal(frame.to_numpy(), expected.to_numpy())
+
+
+def test_panels_are_named_after_the_items(response):
+    panels = price_panels(response, names=['Price', 'Volume'])
+    assert list(panels) == ['Price', 'Volume']
+    assert panels['Price'].name == 'Price'
+    np.testing.assert_array_equal(panels['Price'].values, price_panel(response[0]).values)
+
+
+def test_items_without_dates_raise(bq):
+    response = bq.execute(bql.Request(['IBM US Equity'], {'Sector': bq.data.gics_sector_name()}))
+    with pytest.raises(ValueError):
+        price_panel(response[0])
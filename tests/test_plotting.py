@@ -0,0 +1,15 @@
+import numpy as np
+
+from bql_toolkit.plotting import downsample_points
+
+
+def test_outliers_are_kept_and_missing_points_are_not():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=10000)
+    y = rng.normal(size=10000)
+    x[::3] = np.nan
+    kept = downsample_points(x, y, budget=500)
+    assert len(kept) == 500
+    assert not np.isnan(x[kept]).any()
+    assert np.nanargmax(x) in kept and np.nanargmin(x) in kept
+    assert np.nanargmax(np.where(np.isnan(x), np.nan, y)) in kept
@@ -0,0 +1,38 @@
+import threading
+
+from bql_toolkit.refresh import RefreshController
+
+
+def test_failed_apply_is_reported_and_clears_busy():
+    done = threading.Event()
+    errors, busy = [], []
+
+    def apply(result):
+        raise ValueError(result)
+
+    def on_busy(state):
+        busy.append(state)
+        if not state:
+            done.set()
+
+    refresh = RefreshController(work=lambda value: value, apply=apply, delay=0.01,
+                                on_error=errors.append, on_busy=on_busy)
+    refresh.request('scores')
+    assert done.wait(5)
+    assert busy == [True, False]
+    assert [str(error) for error in errors] == ['scores']
+
+
+def test_only_the_latest_request_is_applied():
+    done = threading.Event()
+    applied = []
+
+    def apply(result):
+        applied.append(result)
+        done.set()
+
+    refresh = RefreshController(work=lambda value: value, apply=apply, delay=0.05)
+    for value in range(5):
+        refresh.request(value)
+    assert done.wait(5)
+    assert applied == [4]
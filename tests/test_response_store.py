@@ -0,0 +1,71 @@
+import numpy as np
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.response_store import ResponseStore, is_fixed_universe, is_immutable
+
+TODAY = '2019-02-26'
+SECURITY = ['IBM US Equity']
+
+
+def test_past_date_range_is_immutable(bq):
+    price = bq.data.px_last(dates=bq.func.range('2017-01-01', '2017-12-31'))
+    assert is_immutable(SECURITY, {'Price': price}, today=TODAY)
+
+
+def test_range_ending_in_the_future_is_not_immutable(bq):
+    price = bq.data.px_last(dates=bq.func.range('2018-01-01', '2019-12-31'))
+    assert not is_immutable(SECURITY, {'Price': price}, today=TODAY)
+
+
+def test_relative_dates_are_not_immutable(bq):
+    price = bq.data.px_last(dates=bq.func.range('-1Y', '0D'))
+    assert not is_immutable(SECURITY, {'Price': price}, today=TODAY)
+    assert not is_immutable(SECURITY, {'Price': bq.data.px_last()}, today=TODAY)
+
+
+def test_forward_estimate_needs_a_past_as_of_date(bq):
+    forward = bq.data.is_eps(fa_period_reference='2020', fa_period_type='A')
+    assert not is_immutable(SECURITY, {'EPS': forward}, today=TODAY)
+    point_in_time = bq.data.is_eps(fa_period_reference='2020', fa_period_type='A', as_of_date='2018-06-30')
+    assert is_immutable(SECURITY, {'EPS': point_in_time}, today=TODAY)
+
+
+def test_dates_are_read_from_the_with_params(bq):
+    with_params = {'dates': bq.func.range('2017-01-01', '2017-12-31')}
+    assert is_immutable(SECURITY, {'Price': bq.data.px_last()}, with_params, today=TODAY)
+
+
+def test_universe_must_be_fixed(bq):
+    assert not is_fixed_universe(bq.univ.members('SPX Index'), today=TODAY)
+    assert is_fixed_universe(bq.univ.members('SPX Index', dates='2015-12-31'), today=TODAY)
+    price = bq.data.px_last(dates=bq.func.range('2017-01-01', '2017-12-31'))
+    assert not is_immutable(bq.univ.members('SPX Index'), {'Price': price}, today=TODAY)
+
+
+def test_immutable_responses_are_served_from_disk(bq, tmp_path):
+    store = ResponseStore(bq, bql.Request, path=str(tmp_path))
+    items = {'Price': bq.data.px_last(dates=bq.func.range('2017-01-01', '2017-01-31'))}
+    first = store.execute(SECURITY, items)[0].df()
+    second = store.execute(SECURITY, items)[0].df()
+    assert bq.calls == 1
+    np.testing.assert_array_equal(first['Price'].to_numpy(), second['Price'].to_numpy())
+
+
+class TextItem:
+    '''An item that only exposes its BQL text, as the items of the bql package do.'''
+
+    def __init__(self, item):
+        self.text = str(item)
+
+    def __str__(self):
+        return self.text
+
+
+def test_items_are_read_from_their_text(bq):
+    point_in_time = bq.data.sales_rev_turn(fa_period_reference='2014', fa_period_type='A',
+                                           as_of_date='2016-06-30') / 1000000000
+    assert is_immutable(SECURITY, {'Sales': TextItem(point_in_time)}, today=TODAY)
+    assert not is_immutable(SECURITY, {'Sales': TextItem(bq.data.sales_rev_turn())}, today=TODAY)
+    assert not is_immutable(SECURITY, {'Sales': object()}, today=TODAY)
+    assert is_fixed_universe(TextItem(bq.univ.members('SPX Index', dates='2015-12-31')), today=TODAY)
+    assert not is_fixed_universe(TextItem(bq.univ.members('SPX Index')), today=TODAY)
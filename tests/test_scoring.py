@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.scoring import FactorScores, standardize
+
+
+def zscore(bq, factor):
+    group = bq.func.group(factor)
+    avg = bq.func.ungroup(bq.func.avg(bq.func.dropna(group)))
+    std = bq.func.ungroup(bq.func.std(bq.func.dropna(group)))
+    return (factor - avg) / std
+
+
+def winsorize(bq, factor, limit):
+    return bq.func.if_(factor >= limit, limit, bq.func.if_(factor <= -limit, -limit, factor))
+
+
+def test_standardize_matches_the_service_zscore(bq):
+    factor = bq.data.is_eps() / bq.data.px_last()
+    request = bql.Request(bq.univ.members('SPX Index'), {'Raw': factor, 'Score': winsorize(bq, zscore(bq, factor), 3)},
+                          with_params={'dates': '-1Y', 'fill': 'PREV', 'currency': 'USD'})
+    raw, score = [item.df() for item in bq.execute(request)]
+    standardized = standardize(raw[['Raw']].to_numpy())[:, 0]
+    present = raw['Raw'].notna().to_numpy()
+    assert present.any()
+    np.testing.assert_allclose(standardized[present], score['Score'].to_numpy()[present])
+    assert (standardized[~present] == 0).all()
+
+
+def test_reweight_recomputes_the_composite_score():
+    values = np.array([[1.0, 4.0], [2.0, 3.0], [3.0, 1.0], [4.0, 2.0]])
+    scores = FactorScores.from_matrix(list('abcd'), ['Value', 'Growth'], values, [1.0, 0.0])
+    assert scores.rank.argmax() == 3
+    scores.reweight({'Value': 0.0, 'Growth': 1.0})
+    np.testing.assert_allclose(scores.composite, scores.standardized[:, 1])
+    assert scores.rank.argmax() == 0
+
+
+def test_reweight_rejects_unknown_and_missing_factors():
+    scores = FactorScores.from_matrix(list('abc'), ['Value', 'Growth'], np.eye(3, 2), [0.5, 0.5])
+    with pytest.raises(KeyError):
+        scores.reweight({'Value': 0.5, 'Growth': 0.3, 'Momentum': 0.2})
+    with pytest.raises(KeyError):
+        scores.reweight({'Value': 1.0})
+
+
+def test_infinite_values_are_missing():
+    values = np.array([[0.5], [1.0], [np.inf], [2.0], [3.0]])
+    standardized = standardize(values)
+    finite = np.array([0.5, 1.0, 2.0, 3.0])
+    expected = (finite - finite.mean()) / finite.std(ddof=1)
+    np.testing.assert_allclose(standardized[[0, 1, 3, 4], 0], expected)
+    assert standardized[2, 0] == 0
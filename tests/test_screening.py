@@ -0,0 +1,56 @@
+import pytest
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.screening import ScreeningEngine
+
+
+class TextItem:
+    '''An item that only exposes its BQL text, as the items of the bql package do.'''
+
+    def __init__(self, item):
+        self.text = str(item)
+
+    def __str__(self):
+        return self.text
+
+
+def criteria(bq, low, high):
+    market_cap = bq.data.cur_mkt_cap(currency='USD')
+    pe_ratio = bq.data.pe_ratio()
+    return bq.func.and_(market_cap >= low, market_cap <= high).and_(
+        pe_ratio < pe_ratio.groupavg(bq.data.gics_sector_name()))
+
+
+def filtered(bq, universe, screen):
+    response = bq.execute(bql.Request(bq.univ.filter(universe, screen), {'ID': bq.data.id()}))
+    return sorted(response[0].df().index)
+
+
+def test_screen_matches_the_service_filter(bq):
+    universe = bq.univ.members('SPX Index')
+    screen = ScreeningEngine(bq, bql.Request, universe)
+    for low, high in [(20e9, 200e9), (50e9, 60e9)]:
+        assert sorted(screen.screen(criteria(bq, low, high))) == filtered(bq, universe, criteria(bq, low, high))
+
+
+def test_new_thresholds_need_no_request(bq):
+    screen = ScreeningEngine(bq, bql.Request, bq.univ.members('SPX Index'))
+    screen.screen(criteria(bq, 20e9, 200e9))
+    calls = bq.calls
+    screen.screen(criteria(bq, 40e9, 70e9))
+    assert bq.calls == calls
+
+
+def test_items_are_read_from_their_text(bq):
+    universe = bq.univ.members('SPX Index')
+    screen = ScreeningEngine(bq, bql.Request, universe)
+    securities = screen.screen(TextItem(criteria(bq, 20e9, 200e9)))
+    assert bq.calls == 1
+    assert sorted(securities) == filtered(bq, universe, criteria(bq, 20e9, 200e9))
+
+
+def test_unreadable_criteria_raise_before_any_request(bq):
+    screen = ScreeningEngine(bq, bql.Request, bq.univ.members('SPX Index'))
+    with pytest.raises(TypeError):
+        screen.screen(object())
+    assert bq.calls == 0
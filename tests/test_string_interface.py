@@ -0,0 +1,53 @@
+import pytest
+
+from bql_toolkit import fake_bql as bql
+from bql_toolkit.canonical import expression_key, params_key, universe_key
+from bql_toolkit.string_interface import QueryParser
+
+
+@pytest.fixture
+def parser(bq):
+    return QueryParser(bq, bql.Request)
+
+
+def keys(universe, items, with_params=None):
+    return universe_key(universe), [expression_key(item) for item in items], params_key(with_params)
+
+
+def test_string_and_object_model_requests_share_keys(bq, parser):
+    dates = bq.func.range('2017-06-05', '2017-06-09')
+    expected = keys(['AAPL US Equity'], [bq.data.px_last(dates=dates), bq.data.px_high(dates=dates)])
+    universe, items, with_params = parser.parts("""
+        let(#date_range = RANGE(2017-06-05, 2017-06-09);)
+        get(PX_LAST(dates=#date_range), PX_HIGH(dates=#date_range))
+        for(['AAPL US Equity'])""")
+    assert keys(universe, items.values(), with_params) == expected
+
+
+def test_expressions_and_with_params_share_keys(bq, parser):
+    expression = bq.data.is_eps() / bq.data.px_last(fill='prev')
+    expected = keys(bq.univ.members('INDU Index'), [expression], {'currency': 'USD'})
+    universe, items, with_params = parser.parts(
+        "get(IS_EPS / PX_LAST(fill=prev)) for(members('INDU Index')) with(currency=USD)")
+    assert keys(universe, items.values(), with_params) == expected
+
+
+def test_bare_option_values_are_strings(bq, parser):
+    universe, items, with_params = parser.parts("get(px_last(fill=prev, currency=USD)) for('IBM US Equity')")
+    assert list(items.values())[0].kwargs == {'fill': 'prev', 'currency': 'USD'}
+
+
+def test_templates_are_parsed_once(parser):
+    template = "get(PX_LAST(dates=RANGE({start}, {end}))) for(['IBM US Equity'])"
+    parser.parts(template, start='2017-01-01', end='2017-12-31')
+    parser.parts(template, start='2018-01-01', end='2018-12-31')
+    assert (parser.misses, parser.hits) == (1, 1)
+
+
+def test_dates_without_leading_zeros(bq, parser):
+    expected = keys(['AAPL US Equity'], [bq.data.px_last(dates=bq.func.range('2017-06-05', '2017-06-09'))])
+    universe, items, with_params = parser.parts("get(PX_LAST(dates=RANGE(2017-6-5, 2017-6-9))) for(['AAPL US Equity'])")
+    assert keys(universe, items.values(), with_params) == expected
+    assert list(items.values())[0].kwargs['dates'].args == ('2017-06-05', '2017-06-09')
+    with pytest.raises(ValueError):
+        parser.parts("get(PX_LAST(dates=RANGE(2017-6-31, 2017-7-9))) for(['AAPL US Equity'])")
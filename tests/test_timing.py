@@ -0,0 +1,32 @@
+import json
+
+import numpy as np
+import pytest
+
+from bql_toolkit.timing import StageTimer, size_of
+
+
+def test_disabled_timer_records_nothing():
+    timer = StageTimer()
+    with timer.stage('bq.execute') as stage:
+        stage.rows = 10
+    assert len(timer.records) == 0
+
+
+def test_stages_are_recorded_and_summarized(tmp_path):
+    timer = StageTimer(enabled=True, max_records=3)
+    for rows in range(4):
+        with timer.stage('concat', rows=rows) as stage:
+            stage.nbytes = size_of(np.zeros(rows))
+    with pytest.raises(KeyError):
+        with timer.stage('score/rank'):
+            raise KeyError('missing factor')
+    frame = timer.frame()
+    assert list(frame['stage']) == ['concat', 'concat', 'score/rank']
+    assert list(frame['ok']) == [True, True, False]
+    summary = timer.summary()
+    assert summary.loc['concat', 'count'] == 2
+    assert summary.loc['concat', 'rows'] == 2.5
+    path = tmp_path / 'timing.jsonl'
+    timer.export(str(path))
+    assert [json.loads(line)['bytes'] for line in path.read_text().splitlines()] == [16, 24, None]